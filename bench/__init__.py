@@ -0,0 +1,13 @@
+"""
+Benchmarks for Tredev
+
+corpus.py generates synthetic parse corpora at any scale, run.py times
+the stages of the annotation pipeline on them and writes the results as
+JSON, so runs of different versions can be compared. Run from the
+repository root:
+
+    PYTHONPATH=lib python -m bench.run --sentences 1000 100000 -o out.json
+
+load_time.py and nodes_memory.py are standalone scripts comparing
+session formats and node stores.
+"""
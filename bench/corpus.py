@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+"""
+Generate a synthetic corpus of Penn Treebank style parse trees
+
+Trees are produced by a small random grammar (clauses, noun phrases with
+modifiers, prepositional phrases, coordination) over a synthetic
+vocabulary, and written one tree per line like the files in
+sample/parses.
+
+Usage: corpus.py out_dir n_sentences [sentences_per_file] [seed]
+"""
+
+import os
+import random
+import sys
+from os.path import join
+
+
+# part-of-speech tags with the number of distinct words per tag; words
+# are the tag in lower case followed by a number, e.g. "nn17"
+vocab_sizes = {"DT": 10, "JJ": 2000, "NN": 10000, "NNS": 5000, "PRP": 10,
+               "IN": 50, "VBZ": 1000, "VBD": 1000, "CC": 3, "RB": 500}
+
+# a few real words, so patterns like those in sample/ have matches
+extra_words = {"NN": ["increase", "decrease", "change"], "IN": ["in", "of"]}
+
+
+class TreeGenerator(object):
+
+    def __init__(self, seed=0, max_depth=8):
+        self.random = random.Random(seed)
+        self.max_depth = max_depth
+        self.words = dict((tag, ["{}{}".format(tag.lower(), i)
+                                 for i in range(size)] +
+                           extra_words.get(tag, []))
+                          for tag, size in vocab_sizes.items())
+
+    def word(self, tag):
+        # Zipf-like word frequencies: low numbers are frequent
+        words = self.words[tag]
+        i = int(len(words) * self.random.random() ** 3)
+        return "({} {})".format(tag, words[i])
+
+    def tree(self):
+        return "(ROOT {})".format(self.clause(0))
+
+    def clause(self, depth):
+        parts = [self.noun_phrase(depth + 1), self.verb_phrase(depth + 1)]
+        if depth == 0:
+            parts.append("(. .)")
+        return "(S {})".format(" ".join(parts))
+
+    def noun_phrase(self, depth):
+        r = self.random.random()
+        if depth >= self.max_depth or r < 0.15:
+            return "(NP {})".format(self.word("PRP"))
+        if r < 0.3:
+            # noun phrase with prepositional phrase attached
+            return "(NP {} {})".format(self.noun_phrase(depth + 1),
+                                       self.prep_phrase(depth + 1))
+        if r < 0.35:
+            return "(NP {} {} {})".format(self.noun_phrase(depth + 1),
+                                          self.word("CC"),
+                                          self.noun_phrase(depth + 1))
+        parts = [self.word("DT")]
+        while self.random.random() < 0.3:
+            parts.append(self.word("JJ"))
+        parts.append(self.word(self.random.choice(("NN", "NNS"))))
+        return "(NP {})".format(" ".join(parts))
+
+    def verb_phrase(self, depth):
+        parts = [self.word(self.random.choice(("VBZ", "VBD")))]
+        r = self.random.random()
+        if depth < self.max_depth:
+            if r < 0.6:
+                parts.append(self.noun_phrase(depth + 1))
+            elif r < 0.7:
+                parts.append("(SBAR {})".format(self.clause(depth + 1)))
+            if self.random.random() < 0.4:
+                parts.append(self.prep_phrase(depth + 1))
+        if self.random.random() < 0.1:
+            parts.append("(ADVP {})".format(self.word("RB")))
+        return "(VP {})".format(" ".join(parts))
+
+    def prep_phrase(self, depth):
+        return "(PP {} {})".format(self.word("IN"),
+                                   self.noun_phrase(depth + 1))
+
+
+def write_corpus(out_dir, n_sentences, sentences_per_file=1000, seed=0):
+    """
+    Write n_sentences synthetic parse trees to files in out_dir
+
+    Returns
+    -------
+    list of file names
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    generator = TreeGenerator(seed)
+    fnames = []
+    for file_n, first in enumerate(range(0, n_sentences, sentences_per_file)):
+        fname = join(out_dir, "synth_{:06d}.txt".format(file_n))
+        with open(fname, "w", encoding="utf-8") as outf:
+            for i in range(min(sentences_per_file, n_sentences - first)):
+                outf.write(generator.tree() + "\n")
+        fnames.append(fname)
+    return fnames
+
+
+def main(out_dir, n_sentences, sentences_per_file=1000, seed=0):
+    fnames = write_corpus(out_dir, int(n_sentences), int(sentences_per_file),
+                          int(seed))
+    print("# wrote {} sentences to {} files in {}".format(
+        n_sentences, len(fnames), out_dir))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print(__doc__)
+        sys.exit(1)
+    main(*sys.argv[1:])
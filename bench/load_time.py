@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark session load time of pickle versus columnar format
+
+Usage: load_time.py [parse_dir]
+"""
+
+import shutil
+import sys
+import tempfile
+import time
+from os.path import join
+
+from tredev import Tredev
+
+
+def best_time(func, repeat=3):
+    times = []
+    for i in range(repeat):
+        start = time.time()
+        func()
+        times.append(time.time() - start)
+    return min(times)
+
+
+def main(parse_dir="../sample/parses"):
+    labels = "change", "increase", "decrease"
+    td = Tredev.from_parses(parse_dir, labels)
+    node_id = td.nodes.index[-1]
+    tmp_dir = tempfile.mkdtemp()
+    
+    try:
+        print("{:10s} {:>10s} {:>16s}".format("format", "load (s)", 
+                                              "first use (s)"))
+        for name, columnar in ("pickle", False), ("columnar", True):
+            path_prefix = join(tmp_dir, name)
+            td.save(path_prefix, columnar=columnar)
+            load_secs = best_time(lambda: Tredev.load(path_prefix, parse_dir))
+            # load followed by a first lookup, which pages in data
+            use_secs = best_time(lambda: Tredev.load(path_prefix, parse_dir)
+                                 .nodes.get_sentence(node_id))
+            print("{:10s} {:10.4f} {:16.4f}".format(name, load_secs, 
+                                                    use_secs))
+        print("# {} nodes".format(len(td.nodes)))
+    finally:
+        shutil.rmtree(tmp_dir)
+        
+        
+if __name__ == "__main__":
+    main(*sys.argv[1:])
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark memory per node of Nodes versus CompactNodes
+
+Usage: nodes_memory.py [parse_dir]
+"""
+
+import sys
+import time
+
+from tredev.nodes import Nodes, CompactNodes
+
+
+def nodes_nbytes(nodes):
+    # memory_usage(deep=True) counts the children lists, but not the int
+    # objects they contain
+    return (nodes.memory_usage(deep=True, index=True).sum() +
+            sum(sys.getsizeof(child_id) 
+                for children in nodes["children"] for child_id in children))
+
+
+def main(parse_dir="../sample/parses"):
+    start = time.time()
+    nodes = Nodes.from_parses(parse_dir)
+    nodes_time = time.time() - start
+    
+    start = time.time()
+    compact = CompactNodes.from_parses(parse_dir)
+    compact_time = time.time() - start
+    
+    n = len(nodes)
+    print("{:14s} {:>12s} {:>14s} {:>10s}".format(
+        "store", "bytes", "bytes/node", "load (s)"))
+    for name, nbytes, secs in (("Nodes", nodes_nbytes(nodes), nodes_time),
+                               ("CompactNodes", compact.nbytes(), 
+                                compact_time)):
+        print("{:14s} {:12d} {:14.1f} {:10.3f}".format(
+            name, nbytes, nbytes / n, secs))
+    print("# {} nodes in {} trees".format(n, len(compact.tree_offsets)))
+        
+        
+if __name__ == "__main__":
+    main(*sys.argv[1:])
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+
+"""
+Time the stages of the Tredev pipeline on synthetic corpora
+
+For each corpus size, a corpus is generated with bench.corpus and the
+following stages are timed (best of --repeat runs, in seconds):
+
+    nodes_from_parses          Nodes.from_parses
+    compact_nodes_from_parses  CompactNodes.from_parses
+    annots_from_nodes          Annotations.from_nodes (dense)
+    sparse_annots_from_nodes   SparseAnnotations.from_nodes
+    get_matches                tredev.tregex.get_matches with a stub
+                               tregex.sh printing precomputed matches
+    score_pat                  Scores.score_pat of one pattern
+    rescore                    Tredev.rescore of all patterns (stub),
+                               each with distinct text and the same
+                               matches, so none are deduplicated
+    rescore_native             Tredev.rescore with the native backend
+    report                     Tredev.report
+    save, load                 Tredev.save and Tredev.load (columnar)
+    annotate_display           showing one match in Tredev.annotate,
+                               averaged over the first matches
+
+The stub tregex.sh needs no Java, so get_matches and rescore measure the
+Python side only: starting a process, parsing its output and scoring.
+
+Usage: PYTHONPATH=lib python -m bench.run [--sentences N [N ...]]
+           [--labels L] [--patterns P] [--repeat R] [-o out.json]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import stat
+import subprocess
+import sys
+import tempfile
+import time
+from os.path import dirname, join
+
+import numpy as np
+import pandas as pd
+
+from tredev import Tredev, native
+from tredev.annots import Annotations, SparseAnnotations
+from tredev.nodes import Nodes, CompactNodes
+from tredev.patterns import Patterns
+from tredev.scores import Scores
+from tredev.tregex import get_matches
+
+from bench.corpus import write_corpus
+
+
+# pattern whose matches the stub prints for every pattern
+stub_pattern = "NP > PP"
+
+
+def stub_patterns(n):
+    """
+    n patterns with distinct text and the matches of stub_pattern, so
+    rescore matches each of them instead of a single deduplicated one
+    """
+    # no label of the synthetic corpus is "none<i>"
+    return ["{} !<< /^none{}$/".format(stub_pattern, i) for i in range(n)]
+
+stub_script = """#!{python}
+# stub for tregex.sh: prints precomputed matches, whatever the pattern
+import sys
+with open({matches_path!r}) as inf:
+    sys.stdout.write(inf.read())
+"""
+
+
+def timed(func, repeat=1):
+    """
+    Best wall time of repeat calls of func, and result of the last call
+    """
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def write_stub(stub_dir, matches):
+    matches_path = join(stub_dir, "matches.txt")
+    with open(matches_path, "w") as outf:
+        for tree_n, node_n in matches:
+            outf.write("{}:{}\n".format(tree_n, node_n))
+    exec_path = join(stub_dir, "tregex.sh")
+    with open(exec_path, "w") as outf:
+        outf.write(stub_script.format(python=sys.executable,
+                                      matches_path=matches_path))
+    os.chmod(exec_path, os.stat(exec_path).st_mode | stat.S_IEXEC)
+    return exec_path
+
+
+def annotate_fraction(annots, fraction, seed=0):
+    """
+    Randomly set a fraction of nodes to positive or negative for each
+    label
+    """
+    rng = np.random.RandomState(seed)
+    node_ids = annots.index.values
+    n = int(len(node_ids) * fraction)
+    for code, label in enumerate(annots.columns):
+        sel = rng.choice(len(node_ids), n, replace=False)
+        values = rng.choice([annots.positive, annots.negative], n)
+        annots.cells[label].update(zip(node_ids[sel].tolist(),
+                                       values.tolist()))
+
+
+def run_scale(work_dir, n_sentences, n_labels, n_patterns, repeat=1,
+              sentences_per_file=1000, seed=0, max_display=100):
+    parse_dir = join(work_dir, "parses")
+    write_corpus(parse_dir, n_sentences, sentences_per_file, seed)
+    labels = ["label{}".format(i) for i in range(n_labels)]
+    stages = {}
+
+    stages["nodes_from_parses"], nodes = timed(
+        lambda: Nodes.from_parses(parse_dir), repeat)
+    stages["compact_nodes_from_parses"], compact = timed(
+        lambda: CompactNodes.from_parses(parse_dir), repeat)
+    stages["annots_from_nodes"], dense = timed(
+        lambda: Annotations.from_nodes(compact, labels), repeat)
+    del dense
+    stages["sparse_annots_from_nodes"], annots = timed(
+        lambda: SparseAnnotations.from_nodes(compact, labels), repeat)
+    annotate_fraction(annots, 0.01, seed)
+
+    # stub matcher on the path, so Tredev finds it as tregex.sh
+    stub_dir = join(work_dir, "stub")
+    os.makedirs(stub_dir)
+    matches = native.get_matches(stub_pattern, native.TreeIndex(compact))
+    exec_path = write_stub(stub_dir, matches)
+    old_path = os.environ["PATH"]
+    os.environ["PATH"] = stub_dir + os.pathsep + old_path
+    td = None
+
+    try:
+        stages["get_matches"], matches = timed(
+            lambda: get_matches(stub_pattern, parse_dir, exec_path), repeat)
+        stages["score_pat"], score = timed(
+            lambda: Scores().score_pat(annots[labels[0]],
+                                     compact.get_node_ids(matches)),
+            repeat)
+
+        td = Tredev(compact, annots, Patterns(), Scores(), parse_dir)
+        # the stub ignores the pattern, so it cannot match candidate trees
+        td.prefilter = False
+        for i, pattern in enumerate(stub_patterns(n_patterns)):
+            td.add("p{}".format(i), pattern, labels[i % n_labels],
+                   score=False)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            stages["rescore"], result = timed(td.rescore, repeat)
+            td.backend = "native"
+            stages["rescore_native"], result = timed(td.rescore, repeat)
+            td.backend = "tregex"
+            stages["report"], result = timed(td.report, repeat)
+
+            path_prefix = join(work_dir, "session")
+            stages["save"], result = timed(lambda: td.save(path_prefix),
+                                           repeat)
+            stages["load"], loaded = timed(
+                lambda: Tredev.load(path_prefix, parse_dir), repeat)
+
+            n_display = min(max_display, len(matches))
+            secs, result = timed(lambda: [td._show_match(matches, n,
+                                                         labels[0])
+                                          for n in range(n_display)], repeat)
+            stages["annotate_display"] = secs / max(n_display, 1)
+    finally:
+        os.environ["PATH"] = old_path
+        if td is not None and td.journal is not None:
+            td.journal.close()
+
+    return dict(sentences=n_sentences,
+                files=len(os.listdir(parse_dir)),
+                nodes=len(compact),
+                labels=n_labels,
+                patterns=n_patterns,
+                matches=len(matches),
+                stages=stages)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=dirname(__file__),
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Time Tredev pipeline stages on synthetic corpora")
+    parser.add_argument("--sentences", type=int, nargs="+",
+                        default=[1000, 10000],
+                        help="corpus sizes in sentences")
+    parser.add_argument("--labels", type=int, default=3,
+                        help="number of annotation labels")
+    parser.add_argument("--patterns", type=int, default=10,
+                        help="number of patterns rescored")
+    parser.add_argument("--sentences-per-file", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="report best of this many runs per stage")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output",
+                        help="JSON output file (default: standard output)")
+    args = parser.parse_args(args)
+
+    results = dict(commit=git_commit(),
+                   time=time.strftime("%Y-%m-%dT%H:%M:%S"),
+                   python=platform.python_version(),
+                   numpy=np.__version__,
+                   pandas=pd.__version__,
+                   runs=[])
+
+    for n_sentences in args.sentences:
+        work_dir = tempfile.mkdtemp(prefix="tredev_bench_")
+        try:
+            run = run_scale(work_dir, n_sentences, args.labels,
+                            args.patterns, args.repeat,
+                            args.sentences_per_file, args.seed)
+        finally:
+            shutil.rmtree(work_dir)
+        results["runs"].append(run)
+        print("# {} sentences, {} nodes: {:.2f}s".format(
+            n_sentences, run["nodes"], sum(run["stages"].values())),
+            file=sys.stderr)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as outf:
+            outf.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
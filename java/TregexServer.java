@@ -0,0 +1,127 @@
+import java.io.BufferedReader;
+import java.io.File;
+import java.io.IOException;
+import java.io.InputStreamReader;
+import java.io.OutputStreamWriter;
+import java.io.PrintWriter;
+import java.util.ArrayList;
+import java.util.List;
+
+import edu.stanford.nlp.trees.DiskTreebank;
+import edu.stanford.nlp.trees.Tree;
+import edu.stanford.nlp.trees.Treebank;
+import edu.stanford.nlp.trees.tregex.TregexMatcher;
+import edu.stanford.nlp.trees.tregex.TregexParseException;
+import edu.stanford.nlp.trees.tregex.TregexPattern;
+
+/**
+ * Persistent Tregex worker used by tredev.worker.TregexWorker
+ *
+ * Loads all trees from the given file or directory once, then reads one
+ * pattern per line from stdin. For every pattern, writes the matching
+ * nodes as "tree_n:node_n" lines (numbered like "tregex.sh -x"), followed
+ * by an empty line. A failed query is answered with a line starting with
+ * "ERROR".
+ *
+ * A line "#BATCH n" followed by n pattern lines matches all n patterns in
+ * a single pass over the trees and answers each pattern, in order, as
+ * above.
+ */
+public class TregexServer {
+
+  private static final String BATCH_PREFIX = "#BATCH ";
+
+  public static void main(String[] args) throws IOException {
+    if (args.length != 1) {
+      System.err.println("usage: TregexServer <parse file or directory>");
+      System.exit(1);
+    }
+
+    Treebank treebank = new DiskTreebank(
+        new TregexPattern.TRegexTreeReaderFactory(), "UTF-8");
+    treebank.loadPath(new File(args[0]));
+    List<Tree> trees = new ArrayList<>();
+    for (Tree tree : treebank) {
+      trees.add(tree);
+    }
+
+    BufferedReader in = new BufferedReader(
+        new InputStreamReader(System.in, "UTF-8"));
+    PrintWriter out = new PrintWriter(
+        new OutputStreamWriter(System.out, "UTF-8"));
+    String line;
+
+    while ((line = in.readLine()) != null) {
+      if (line.startsWith(BATCH_PREFIX)) {
+        int n = Integer.parseInt(line.substring(BATCH_PREFIX.length()).trim());
+        List<String> patterns = new ArrayList<>();
+        for (int i = 0; i < n; i++) {
+          patterns.add(in.readLine());
+        }
+        matchBatch(patterns, trees, out);
+        continue;
+      }
+      try {
+        TregexPattern pattern = TregexPattern.compile(line);
+        int treeNumber = 0;
+        for (Tree tree : trees) {
+          treeNumber++;
+          TregexMatcher matcher = pattern.matcher(tree);
+          while (matcher.findNextMatchingNode()) {
+            out.println(treeNumber + ":" + matcher.getMatch().nodeNumber(tree));
+          }
+        }
+      } catch (TregexParseException | IllegalArgumentException e) {
+        out.println("ERROR " + String.valueOf(e.getMessage()).replace('\n', ' '));
+      }
+      out.println();
+      out.flush();
+    }
+  }
+
+  /**
+   * Match all patterns against each tree in turn, so the trees are
+   * traversed only once, and write one answer per pattern.
+   */
+  private static void matchBatch(List<String> patterns, List<Tree> trees,
+                                 PrintWriter out) {
+    int n = patterns.size();
+    TregexPattern[] compiled = new TregexPattern[n];
+    String[] errors = new String[n];
+    StringBuilder[] answers = new StringBuilder[n];
+
+    for (int i = 0; i < n; i++) {
+      answers[i] = new StringBuilder();
+      try {
+        compiled[i] = TregexPattern.compile(patterns.get(i));
+      } catch (TregexParseException | IllegalArgumentException e) {
+        errors[i] = String.valueOf(e.getMessage()).replace('\n', ' ');
+      }
+    }
+
+    int treeNumber = 0;
+    for (Tree tree : trees) {
+      treeNumber++;
+      for (int i = 0; i < n; i++) {
+        if (compiled[i] == null) {
+          continue;
+        }
+        TregexMatcher matcher = compiled[i].matcher(tree);
+        while (matcher.findNextMatchingNode()) {
+          answers[i].append(treeNumber).append(':')
+              .append(matcher.getMatch().nodeNumber(tree)).append('\n');
+        }
+      }
+    }
+
+    for (int i = 0; i < n; i++) {
+      if (errors[i] != null) {
+        out.println("ERROR " + errors[i]);
+      } else {
+        out.print(answers[i]);
+      }
+      out.println();
+    }
+    out.flush();
+  }
+}
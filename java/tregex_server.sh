@@ -0,0 +1,10 @@
+#!/bin/sh
+# Start a persistent Tregex worker for tredev (see tredev.worker)
+#
+# Requires stanford-tregex.jar; set TREGEX_HOME to the directory containing
+# it and compile once with
+#   javac -cp "$TREGEX_HOME/stanford-tregex.jar" TregexServer.java
+
+scriptdir=`dirname $0`
+
+java -mx2g -cp "$TREGEX_HOME/stanford-tregex.jar:$scriptdir" TregexServer "$@"
@@ -2,14 +2,37 @@
 Main Tredev class
 """
 
+import cProfile
+import pstats
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
+from os.path import exists
+from subprocess import CalledProcessError
+
+import numpy as np
 import pandas as pd
 
-from tredev.nodes import Nodes
-from tredev.annots import Annotations 
-from tredev.tregex import get_matches
+from tredev.nodes import Nodes, CompactNodes, read_files, has_legacy_ids
+from tredev.annots import Annotations, SparseAnnotations
+from tredev.coverage import Coverage
+from tredev.tregex import (get_matches, get_batch_matches, linked_dir, 
+                           trees_dir, MatchStream)
+from tredev.files import Files
+from tredev import native
+from tredev.prefilter import LabelIndex
+from tredev.render import MatchRenderer
 from tredev.getch import getch
 from tredev.scores import Scores
+from tredev.sample import Sample, Estimates
+from tredev.tracker import ScoreTracker
 from tredev.patterns import Patterns
+from tredev.revisions import Revisions
+from tredev.worker import TregexWorker
+from tredev.cache import MatchCache
+from tredev.journal import Journal
+from tredev import session
+from tredev import timing
 
 try:
     import nltk
@@ -34,15 +57,38 @@ class Tredev(object):
     of instances.
     """
 
-    def __init__(self, nodes, annots, patterns, scores, parse_dir):
+    backends = "tregex", "native"
+    
+    # number of journaled annotation changes after which save rewrites the
+    # annotation matrix
+    compact_every = 10000
+    
+    # match patterns only against trees containing their literal labels 
+    # (see tredev.prefilter)
+    prefilter = True
+    
+    # number of following matches rendered in the background while 
+    # annotating, and number of rendered matches and trees kept (see 
+    # tredev.render)
+    prefetch = 8
+    render_cache_size = 1000
+    
+    # sample of trees for estimated scores (see set_sample)
+    sample_fraction = 0.1
+    sample_seed = 0
+    sample_stratified = True
+
+    def __init__(self, nodes, annots, patterns, scores, parse_dir,
+                 backend="tregex", files=None, n_shards=1):
         """
         Initialize Tredev data for given parse trees and annotation labels
         
         Parameters
         ----------
-        nodes: tredev.nodes.Nodes instance
+        nodes: tredev.nodes.Nodes or tredev.nodes.CompactNodes instance
             nodes in all parse trees
-        annots: tredev.annots.Annotations instance
+        annots: tredev.annots.SparseAnnotations or 
+                tredev.annots.Annotations instance
             annotations associated to nodes
         patterns: tredev.patterns.Patterns instance
             tree matching patterns
@@ -50,20 +96,62 @@ class Tredev(object):
             pattern matching scores
         parse_dir: str
             directory with files containing parse trees
+        backend: str, optional
+            pattern matching backend: "tregex" calls tregex.sh (or the
+            persistent worker), "native" uses the in-process engine in
+            tredev.native and falls back to tregex.sh for unsupported syntax
+        files: tredev.files.Files instance, optional
+            registry of parse files and their tree numbers; by default all
+            files in parse_dir in sorted order
+        n_shards: int, optional
+            number of tregex.sh processes that each match a pattern against
+            part of the corpus in parallel (tregex backend without worker);
+            can be changed at any time through the attribute n_shards
             
         Comments
         --------
         You probably want to use the method Tredev.from_parses or Tredev.load
+        
+        Scores of patterns scored in this session are kept current on every
+        annotation change (see tredev.tracker), so they need no rescore 
+        after annotating.
         """
+        if backend not in self.backends:
+            raise ValueError("unknown backend '{}'".format(backend))
         self.nodes = nodes
         self.annots = annots
         self.patterns = patterns
         self.scores = scores
         self.parse_dir = parse_dir
         self.nodes_saved = False
+        self.annots_saved = False
+        self.journal = None
+        self.worker = None
+        self.backend = backend
+        self.n_shards = n_shards
+        self._index = None
+        self._label_index = None
+        self._renderer = None
+        self.sample = None
+        self.estimates = Estimates()
+        self.revisions = Revisions()
+        # pattern name -> background run computing its exact scores
+        self._exact_runs = {}
+        # guards scores and estimates against background runs
+        self._lock = threading.RLock()
+        self.cache = None
+        # one lock for scores and annotation changes, so they are always
+        # taken in the same order
+        self.tracker = ScoreTracker(scores, self._lock)
+        self.tracker.attach(annots)
+        if files is None:
+            files = Files.from_parse_dir(parse_dir)
+        self.files = files
+        self._update_tree_map()
     
     @classmethod
-    def load(cls, path_prefix, parse_dir):
+    @timing.timed("tredev.load")
+    def load(cls, path_prefix, parse_dir, backend="tregex"):
         """
         Load Tredev data files
         
@@ -73,25 +161,96 @@ class Tredev(object):
             common file path prefix for all data files
         parse_dir: str
             directory with files containing parse trees
+        backend: str, optional
+            pattern matching backend, "tregex" or "native"
             
         Comments
         --------
         Reads the data files 
-        <path_prefix>_nodes.pkl
-        <path_prefix>_annots.pkl
+        <path_prefix>_nodes/ and <path_prefix>_annots/ (columnar format)
+        or <path_prefix>_nodes.pkl and <path_prefix>_annots.pkl (pickles)
         <path_prefix>_patterns.pkl
         <path_prefix>_scores.pkl
+        <path_prefix>_estimates.pkl
+        <path_prefix>_revisions.pkl
+        <path_prefix>_files.pkl
+        <path_prefix>_annots.journal
+        
+        Nodes and annotations in columnar format are memory-mapped (see 
+        tredev.session), so loading takes constant time. Whichever format 
+        was saved last is read. Nodes are then tredev.nodes.CompactNodes.
+        Annotations are always tredev.annots.SparseAnnotations; dense
+        annotations of older sessions are converted.
+        
+        Annotation changes recorded in the journal since the last full save
+        are replayed, and further changes are appended to it.
+        
+        Sessions saved with legacy node ids (tree_n * 1000 + node_n) are 
+        converted to consecutive node ids by reading their trees again from
+        parse_dir (see tredev.session.migrate) and saved right away.
+        
+        Pattern matches are cached in the directory <path_prefix>_cache.
+        Patterns with cached matches are rescored from them once their 
+        label is first annotated or reported, so their scores are kept 
+        current from then on.
+        
+        Sessions saved without a files registry are assumed to contain all
+        files in parse_dir.
         """
-        tredev = cls(pd.read_pickle(path_prefix + "_nodes.pkl"),
-                     pd.read_pickle(path_prefix + "_annots.pkl"),
+        files_path = path_prefix + "_files.pkl"
+        if session.is_columnar(path_prefix):
+            nodes = session.load_nodes(path_prefix)
+            annots = session.load_annots(path_prefix)
+        else:
+            nodes = pd.read_pickle(path_prefix + "_nodes.pkl")
+            annots = pd.read_pickle(path_prefix + "_annots.pkl")
+        journal_path = path_prefix + "_annots.journal"
+        if exists(journal_path):
+            journal = Journal(journal_path, annots.columns)
+            try:
+                n = journal.replay(annots)
+            finally:
+                journal.close()
+            if n:
+                print("# replayed {} annotation changes".format(n))
+        files = pd.read_pickle(files_path) if exists(files_path) else None
+        legacy = has_legacy_ids(annots.index)
+        if legacy:
+            nodes, annots = session.migrate(nodes, annots, parse_dir, files)
+        elif isinstance(annots, Annotations):
+            # dense annotations of older sessions
+            annots = SparseAnnotations.from_frame(annots)
+        tredev = cls(nodes,
+                     annots,
                      pd.read_pickle(path_prefix + "_patterns.pkl"),
                      pd.read_pickle(path_prefix + "_scores.pkl"),
-                     parse_dir)
-        tredev.nodes_saved = True
+                     parse_dir,
+                     backend,
+                     files)
+        if legacy:
+            # rewrite nodes and annotations, replacing the journal of
+            # legacy ids
+            tredev.save(path_prefix, session.is_columnar(path_prefix))
+            print("# converted session to consecutive node ids")
+        else:
+            tredev.nodes_saved = True
+            tredev.annots_saved = True
+            tredev._open_journal(path_prefix)
+        if isinstance(tredev.nodes, Nodes) and not tredev.nodes.has_spans():
+            # nodes saved before token spans were introduced
+            tredev.nodes.add_spans()
+            tredev.nodes_saved = False
+        if exists(path_prefix + "_estimates.pkl"):
+            tredev.estimates = pd.read_pickle(path_prefix + "_estimates.pkl")
+        if exists(path_prefix + "_revisions.pkl"):
+            tredev.revisions = pd.read_pickle(path_prefix + "_revisions.pkl")
+        tredev.enable_cache(path_prefix)
+        for label in tredev.patterns["label"].unique():
+            tredev.tracker.defer(label, partial(tredev._track_cached, label))
         return tredev
         
     @classmethod
-    def from_parses(cls, parse_dir, labels):
+    def from_parses(cls, parse_dir, labels, backend="tregex", compact=False):
         """
         Initialize Tredev data for given parse trees and annotation labels
         
@@ -101,12 +260,20 @@ class Tredev(object):
             directory with files containing parse trees
         labels: sequence
             annotation labels
+        backend: str, optional
+            pattern matching backend, "tregex" or "native"
+        compact: bool, optional
+            store nodes as tredev.nodes.CompactNodes arrays instead of a
+            Nodes DataFrame, which takes much less memory on large corpora
         """
-        nodes = Nodes.from_parses(parse_dir)
-        return cls.from_nodes(parse_dir, labels, nodes)
+        if compact:
+            nodes = CompactNodes.from_parses(parse_dir)
+        else:
+            nodes = Nodes.from_parses(parse_dir)
+        return cls.from_nodes(parse_dir, labels, nodes, backend)
     
     @classmethod    
-    def from_nodes(cls, parse_dir, labels, nodes):
+    def from_nodes(cls, parse_dir, labels, nodes, backend="tregex"):
         """
         Initialize Tredev data for given parse trees, annotation labels
         and nodes
@@ -119,14 +286,18 @@ class Tredev(object):
             annotation labels
         nodes: tredev.nodes.Nodes instance
             nodes in all parse trees
+        backend: str, optional
+            pattern matching backend, "tregex" or "native"
         """
         return cls(nodes,
-                   Annotations.from_nodes(nodes, labels),
+                   SparseAnnotations.from_nodes(nodes, labels),
                    Patterns(),
                    Scores(),
-                   parse_dir)
+                   parse_dir,
+                   backend)
     
-    def save(self, path_prefix):
+    @timing.timed("tredev.save")
+    def save(self, path_prefix, columnar=True):
         """
         Save Tredev data files
         
@@ -134,27 +305,206 @@ class Tredev(object):
         ----------
         path_prefix: str
             common file path prefix for all data files
+        columnar: bool, optional
+            save nodes and annotations in memory-mappable columnar format
+            instead of pickles
             
         Comments
         --------
         Writes the data files 
-        <path_prefix>_nodes.pkl
-        <path_prefix>_annots.pkl
+        <path_prefix>_nodes/ and <path_prefix>_annots/ (columnar format)
+        or <path_prefix>_nodes.pkl and <path_prefix>_annots.pkl (pickles)
         <path_prefix>_patterns.pkl
         <path_prefix>_scores.pkl
+        <path_prefix>_estimates.pkl
+        <path_prefix>_revisions.pkl
+        <path_prefix>_files.pkl
+        <path_prefix>_annots.journal
         
+        and enables the match cache in <path_prefix>_cache, if not enabled
+        yet
         
+        In columnar format, annotation changes since the previous save to 
+        the same path_prefix are already in the journal, which is only 
+        synced to disk. The annotation matrix is rewritten, and the journal
+        emptied, once the journal holds compact_every changes.
         """
         # The nodes file is written only once, because it does not change
         # during annotation
-        if not self.nodes_saved:
-            self.nodes.to_pickle(path_prefix + "_nodes.pkl")
-            self.nodes_saved = True
-        self.annots.to_pickle(path_prefix + "_annots.pkl")
+        journal_path = path_prefix + "_annots.journal"
+        if columnar:
+            if not self.nodes_saved or not session.is_columnar(path_prefix):
+                session.save_nodes(self.nodes, path_prefix)
+                self.annots_saved = False
+            if (self.annots_saved and self.journal is not None and
+                    self.journal.path == journal_path and
+                    len(self.journal) < self.compact_every):
+                self.journal.sync()
+            else:
+                session.save_annots(self.annots, path_prefix)
+                self._open_journal(path_prefix, reset=True)
+        else:
+            if not self.nodes_saved or not exists(path_prefix + "_nodes.pkl"):
+                self.nodes.to_pickle(path_prefix + "_nodes.pkl")
+            self.annots.to_pickle(path_prefix + "_annots.pkl")
+            self._open_journal(path_prefix, reset=True)
+        self.nodes_saved = True
+        self.annots_saved = True
         self.patterns.to_pickle(path_prefix + "_patterns.pkl")
         self.scores.to_pickle(path_prefix + "_scores.pkl")
+        self.estimates.to_pickle(path_prefix + "_estimates.pkl")
+        self.revisions.to_pickle(path_prefix + "_revisions.pkl")
+        self.files.to_pickle(path_prefix + "_files.pkl")
+        if self.cache is None:
+            self.enable_cache(path_prefix)
         
-    def add(self, name, pattern, label, comment="", score=True):
+    def _open_journal(self, path_prefix, reset=False):
+        # append all further annotation changes to the journal of 
+        # path_prefix
+        if self.journal is not None:
+            self.journal.close()
+        self.journal = Journal(path_prefix + "_annots.journal", 
+                               self.annots.columns)
+        if reset:
+            self.journal.reset()
+        self.annots.journal = self.journal
+        
+    def enable_cache(self, path_prefix, max_bytes=2 ** 30):
+        """
+        Enable persistent cache of pattern matches
+        
+        Parameters
+        ----------
+        path_prefix: str
+            common file path prefix for all data files
+        max_bytes: int
+            maximum size of cache, least recently used entries are removed
+            
+        Comments
+        --------
+        Matches are stored in the directory <path_prefix>_cache, keyed on 
+        pattern text, backend and a fingerprint of the files in parse_dir,
+        so they are reused across sessions until parse files change.
+        """
+        self.cache = MatchCache(path_prefix + "_cache", self.parse_dir,
+                                max_bytes, self.backend)
+        
+    @property
+    def cache_hits(self):
+        return self.cache.hits if self.cache is not None else 0
+    
+    @property
+    def cache_misses(self):
+        return self.cache.misses if self.cache is not None else 0
+        
+    def start_worker(self, exec_path="tregex_server.sh", options=[]):
+        """
+        Start a persistent Tregex worker
+        
+        Parameters
+        ----------
+        exec_path: str
+            worker executable, e.g. java/tregex_server.sh
+        options: list
+            extra command line options passed to the worker
+            
+        Comments
+        --------
+        The worker loads the parse trees once and then answers all pattern
+        queries of add, rescore, annotate and reannotate, instead of
+        launching tregex.sh for every pattern. It is restarted automatically
+        if it crashes. Call stop_worker to terminate it.
+        """
+        self.stop_worker()
+        self.worker = TregexWorker(self.parse_dir, exec_path=exec_path,
+                                   options=options)
+        self.worker.start()
+        
+    def stop_worker(self):
+        """
+        Stop the persistent Tregex worker, if any
+        """
+        if self.worker:
+            self.worker.stop()
+            self.worker = None
+        
+    def add_parses(self, rescore=True, n_jobs=1, verbose=False):
+        """
+        Add new parse files from parse_dir to the corpus
+        
+        Parameters
+        ----------
+        rescore: bool, optional
+            update matches and scores of all patterns
+        n_jobs: int, optional
+            number of processes parsing files in parallel
+        verbose: bool, optional
+            print progress of parsing
+            
+        Comments
+        --------
+        Files in parse_dir that are not registered yet are parsed and their
+        trees are appended to nodes and annotations, numbered after all 
+        existing trees. Tree numbers and annotations of existing trees 
+        never change, even if new files sort before existing ones.
+        
+        If the match cache is enabled, cached matches of each pattern are
+        extended by matching the new files only; other patterns are 
+        matched against the full corpus. Prints a report of updated scores.
+        """
+        fnames = self.files.new_files(self.parse_dir)
+        if not fnames:
+            print("*** no new parse files ***")
+            return
+        
+        # cached matches under the fingerprint of the old corpus
+        old_matches = {}
+        if self.cache is not None and rescore:
+            for pattern in self.patterns["pattern"].unique():
+                matches = self.cache.get(pattern)
+                if matches is not None:
+                    old_matches[pattern] = matches
+        
+        label_codes, label_vocab, parent, tree_sizes, file_sizes = read_files(
+            fnames, n_jobs, verbose)
+        first_tree = self.files.total_trees() + 1
+        
+        self.nodes = self.nodes.append_arrays(label_codes, label_vocab, 
+                                              parent, tree_sizes, first_tree)
+        self.nodes_saved = False
+        self._index = None
+        self._label_index = None
+        self._renderer = None
+        self.annots = self.annots.append_index(
+            self.nodes.index[-len(parent):])
+        self.tracker.attach(self.annots)
+        self.annots_saved = False
+        self.files.add_files(fnames, file_sizes, first_tree)
+        self._update_tree_map()
+        print("# added {} files with {} trees".format(len(fnames), 
+                                                       len(tree_sizes)))
+        
+        if self.worker:
+            # worker has to reload the corpus
+            self.worker.restart()
+        
+        if not rescore:
+            return
+        
+        if self.cache is not None:
+            self.cache.update_fingerprint()
+            new_nodes = Nodes.from_arrays(label_vocab[label_codes], parent,
+                                          tree_sizes, first_tree)
+            with linked_dir(fnames) as new_dir:
+                for pattern, matches in old_matches.items():
+                    matches = matches + self._find_new_matches(
+                        pattern, new_dir, new_nodes, first_tree)
+                    self.cache.put(pattern, matches)
+                    
+        self.rescore()
+        
+    def add(self, name, pattern, label, comment="", score=True, 
+            estimate=False, background=False):
         """
         Add a new pattern
         
@@ -170,14 +520,203 @@ class Tredev(object):
             optional comment
         score: bool, opt
             score pattern upon addition
+        estimate: bool, optional
+            only estimate scores on a sample of trees (see set_sample)
+        background: bool, optional
+            with estimate, compute exact scores in the background, 
+            replacing the estimates when done
         """
         if label not in self.annots.columns:
             print('*** invalid label "{}" ***'.format(label))
         else:
             self.patterns.add_pat(name, pattern, label, comment)
-            if score:
+            self.revisions.add_revision(name, pattern, label, comment)
+            if score and estimate:
+                self._estimate_pats(self.patterns.loc[[name]], background)
+            elif score:
                 self._score_pat(pattern, label, name)
         
+    def import_patterns(self, patterns, score=True):
+        """
+        Add a library of patterns
+        
+        Parameters
+        ----------
+        patterns: pandas.DataFrame or str
+            patterns indexed by name, with columns "pattern", "label" and 
+            optionally "comment", e.g. the patterns of another session; or 
+            path of a tab-separated file with a header line and columns
+            name, pattern, label and optionally comment
+        score: bool, optional
+            score added patterns, matching them all in a single batch
+            
+        Comments
+        --------
+        Patterns with an invalid label or an existing name are reported 
+        and skipped. Prints a report of all scores.
+        """
+        if isinstance(patterns, str):
+            patterns = pd.read_csv(patterns, sep="\t", index_col=0, 
+                                   dtype=str, keep_default_na=False)
+        added = []
+        for name, row in patterns.iterrows():
+            if row["label"] not in self.annots.columns:
+                print('*** invalid label "{}" for pattern "{}" ***'.format(
+                    row["label"], name))
+            elif name in self.patterns.index:
+                print('*** pattern "{}" already exists ***'.format(name))
+            else:
+                self.patterns.add_pat(name, row["pattern"], row["label"], 
+                                      row.get("comment", ""))
+                self.revisions.add_revision(name, row["pattern"], 
+                                            row["label"], 
+                                            row.get("comment", ""))
+                added.append(name)
+        print("# imported {} patterns".format(len(added)))
+        if score and added:
+            self._score_pats(self.patterns.loc[added])
+            self.report()
+        
+    def import_annots(self, annots, overwrite=True):
+        """
+        Set many annotations at once
+        
+        Parameters
+        ----------
+        annots: pandas.DataFrame or str
+            annotations with columns tree_n, node_n, label and value, or 
+            with columns file, tree_n (numbered from 1 within file), 
+            node_n, label and value; or path of such a file with a header 
+            line, comma-separated if its name ends in .csv and otherwise 
+            tab-separated. Values are True, False, Unknown or Ignore, as 
+            exported, or their codes 1, -1, 0 and -2.
+        overwrite: bool, optional
+            change annotations that are already known; otherwise their 
+            nodes are left unchanged
+            
+        Returns
+        -------
+        pandas.DataFrame
+            conflicting rows of annots, with a column conflict
+            
+        Comments
+        --------
+        As when annotating, a True label sets all other labels of the node
+        to False. Nodes with conflicting rows, e.g. two True labels, are 
+        left unchanged (see tredev.annots.Annotations.set_values); rows 
+        changing known annotations are reported as conflicts too, and 
+        counted as imported with overwrite.
+        
+        Changes are applied, journaled and scored per label rather than per
+        cell, so importing many thousands of annotations takes seconds.
+        """
+        if isinstance(annots, str):
+            annots = pd.read_csv(annots, 
+                                 sep="," if annots.endswith(".csv") else "\t", 
+                                 dtype=dict(label=str, value=str, file=str), 
+                                 keep_default_na=False)
+        tree_n = annots["tree_n"].values.astype(np.int64)
+        node_n = annots["node_n"].values.astype(np.int64)
+        n_trees = len(self.nodes.tree_offsets)
+        if "file" in annots.columns:
+            # unknown files have no trees
+            files = self.files.reindex(annots["file"].values).fillna(0)
+            first_trees = files["first_tree"].values.astype(np.int64)
+            valid = ((tree_n >= 1) & 
+                     (tree_n <= files["n_trees"].values.astype(np.int64)))
+            tree_n = np.where(valid, first_trees + tree_n - 1, 0)
+        tree_sizes = np.diff(np.append(self.nodes.tree_offsets, 
+                                       len(self.nodes)))
+        valid = (tree_n >= 1) & (tree_n <= n_trees)
+        valid &= (node_n >= 1) & (node_n <= tree_sizes[
+            np.where(valid, tree_n - 1, 0)])
+        # invalid coordinates become the unknown node 0
+        node_ids = np.where(valid, self.nodes.get_node_ids(
+            np.column_stack((np.where(valid, tree_n, 1), node_n))), 0)
+        
+        value_codes = dict((name.lower(), code) for code, name in 
+                           Annotations.value_names.items())
+        values = annots["value"].astype(str).str.strip()
+        codes = values.str.lower().map(value_codes)
+        # or numeric codes; anything else becomes an invalid value
+        codes = codes.fillna(pd.to_numeric(values, errors="coerce")).fillna(
+            np.iinfo(np.int8).max).values.astype(np.int64)
+        
+        n_changed, conflicts = self.annots.set_values(
+            node_ids, annots["label"].astype(str).values, codes, overwrite)
+        if self.journal is not None:
+            self.journal.sync()
+        # with overwrite, rows changing known values are applied anyway
+        n_applied = (int((conflicts["conflict"] == 
+                          "changes known value").sum()) 
+                     if overwrite else 0)
+        print("# imported {} annotations, changing {} cells".format(
+            len(annots) - len(conflicts) + n_applied, n_changed))
+        if len(conflicts):
+            print("* {} conflicting rows, {} of them imported:".format(
+                len(conflicts), n_applied))
+            print(conflicts["conflict"].value_counts().to_string())
+        conflicts = annots.iloc[conflicts.index].assign(
+            conflict=conflicts["conflict"].values)
+        return conflicts
+    
+    def export_annots(self, path=None, labels=None, file_relative=False):
+        """
+        Export all known annotations
+        
+        Parameters
+        ----------
+        path: str, optional
+            file to write annotations to, comma-separated if its name ends
+            in .csv and otherwise tab-separated, with a header line
+        labels: sequence, optional
+            only export these labels
+        file_relative: bool, optional
+            locate nodes by file, tree number within file and node number 
+            instead of tree and node number
+            
+        Returns
+        -------
+        pandas.DataFrame
+            annotations with columns tree_n, node_n, label and value, or 
+            file, tree_n, node_n, label and value (see import_annots), 
+            ordered by node
+        """
+        node_ids, codes, values = self.annots.arrays()
+        # unknown labels of nodes with a True label are exported as well, 
+        # since importing a True label sets the other labels to False
+        n_labels = len(self.annots.columns)
+        keys = node_ids * n_labels + codes
+        pos_ids = np.unique(node_ids[values == Annotations.positive])
+        missing = (pos_ids[:, None] * n_labels + 
+                   np.arange(n_labels)).ravel()
+        missing = missing[~np.isin(missing, keys)]
+        node_ids = np.concatenate((node_ids, missing // n_labels))
+        codes = np.concatenate((codes, missing % n_labels))
+        values = np.concatenate((values, np.full(len(missing), 
+                                                 Annotations.unknown, 
+                                                 dtype=values.dtype)))
+        if labels is not None:
+            keep = np.isin(codes, self.annots.columns.get_indexer(labels))
+            node_ids, codes, values = node_ids[keep], codes[keep], values[keep]
+        order = np.lexsort((codes, node_ids))
+        node_ids, codes, values = node_ids[order], codes[order], values[order]
+        tree_n, node_n = self.nodes.get_tree_nodes(node_ids)
+        annots = pd.DataFrame(dict(
+            tree_n=tree_n, node_n=node_n, 
+            label=np.asarray(self.annots.columns, dtype=object)[codes],
+            value=pd.Series(Annotations.value_names).loc[values].values))
+        if file_relative:
+            files = self.files.sort_values("first_tree")
+            first_trees = files["first_tree"].values.astype(np.int64)
+            file_n = np.searchsorted(first_trees, tree_n, side="right") - 1
+            annots.insert(0, "file", files.index.values[file_n])
+            annots["tree_n"] = tree_n - first_trees[file_n] + 1
+        if path:
+            annots.to_csv(path, sep="," if path.endswith(".csv") else "\t",
+                          index=False)
+        return annots
+        
     def remove(self, name):
         """
         Remove named pattern
@@ -191,9 +730,63 @@ class Tredev(object):
             print('*** unknown name "{}" ***'.format(label))
         else:
             self.patterns.drop(name, inplace=True)
-            self.scores.drop(name, inplace=True)
+            with self._lock:
+                self.revisions.drop_pattern(name)
+                self.scores.drop(name, inplace=True, errors="ignore")
+                self.tracker.untrack(name)
+                self._drop_estimates([name])
         
-    def rescore(self, name=None, label=None):
+    def revise(self, name, pattern, comment=None, score=True):
+        """
+        Revise named pattern, keeping its earlier revisions
+        
+        Parameters
+        ----------
+        name: str
+            pattern name
+        pattern: str
+            new tree regular expression
+        comment: str, optional
+            new comment, by default the comment is kept
+        score: bool, optional
+            score revised pattern and report matches gained and lost
+            
+        Comments
+        --------
+        Revisions are numbered from 1 per pattern name. See Tredev.diff and 
+        Tredev.annotate_diff for comparing them.
+        """
+        if name not in self.patterns.index:
+            print('*** unknown name "{}" ***'.format(name))
+            return
+        old_pattern, label, old_comment = self.patterns.loc[
+            name, ["pattern", "label", "comment"]]
+        if pattern == old_pattern:
+            print("* pattern unchanged")
+            return
+        if comment is None:
+            comment = old_comment
+        with self._lock:
+            if not self.revisions.latest(name):
+                # pattern added before revisions were kept
+                self.revisions.add_revision(name, old_pattern, label, 
+                                            old_comment)
+            revision = self.revisions.add_revision(name, pattern, label, 
+                                                   comment)
+            self.patterns.set_pat(name, pattern, comment)
+            # scores of the previous revision are void
+            self.scores.drop(name, inplace=True, errors="ignore")
+            self.tracker.untrack(name)
+            self._drop_estimates([name])
+        print("# revision {} of {}".format(revision, name))
+        if score:
+            self._score_pat(pattern, label, name)
+            self.report(name)
+            self.diff(name)
+        
+    @timing.timed("tredev.rescore")
+    def rescore(self, name=None, label=None, n_jobs=1, estimate=False,
+                background=False):
         """
         Recompute scores
         
@@ -203,25 +796,93 @@ class Tredev(object):
             pattern name: only rescores named pattern   
         label: str, optional
             label: only rescores patterns targetting label
+        n_jobs: int, optional
+            number of patterns matched concurrently
+        estimate: bool, optional
+            only estimate scores on a sample of trees (see set_sample)
+        background: bool, optional
+            with estimate, compute exact scores in the background, 
+            replacing the estimates when done
             
         Comments
         --------
         Prints a report of updated scores
+        
+        With n_jobs > 1, patterns are matched by a pool of worker threads, 
+        each running its own tregex.sh process. Each pattern is scored as
+        soon as its matches have arrived, together with all patterns 
+        sharing its text, so scores become available while others are 
+        still being matched. A pattern that fails is reported and skipped,
+        without aborting the others.
         """
-        if name:
+        if self.cache is not None:
+            # parse files may have changed since the cache was opened
+            self.cache.update_fingerprint()
+        self._update_tree_map()
+            
+        if estimate:
+            if name:
+                selection = self.patterns.loc[[name]]
+            elif label:
+                selection = self.patterns[self.patterns["label"] == label]
+            else:
+                selection = self.patterns
+            self._estimate_pats(selection, background)
+        elif name:
             self._score_pat(self.patterns.at[name, "pattern"], 
                             self.patterns.at[name, "label"],
                             name)
         elif label:
             selection = self.patterns[self.patterns["label"] == label]
-            for row_name, row in selection.iterrows():
-                self._score_pat(row["pattern"], label, row_name)
+            self._score_pats(selection, n_jobs)
         else:
-            for row_name, row in self.patterns.iterrows():
-                self._score_pat(row["pattern"], row["label"], row_name)
+            self._score_pats(self.patterns, n_jobs)
                 
         self.report(name, label)
         
+    def profile_rescore(self, path=None, n_lines=25, **kwargs):
+        """
+        Recompute scores under cProfile
+        
+        Parameters
+        ----------
+        path: str, optional
+            file for saving the profile, e.g. for snakeviz or pstats
+        n_lines: int, optional
+            number of functions printed, by cumulative time
+        kwargs: 
+            arguments of Tredev.rescore
+        """
+        profile = cProfile.Profile()
+        profile.runcall(self.rescore, **kwargs)
+        if path:
+            profile.dump_stats(path)
+        pstats.Stats(profile).sort_stats("cumulative").print_stats(n_lines)
+        
+    def stats(self, reset=False):
+        """
+        Report time spent per stage
+        
+        Parameters
+        ----------
+        reset: bool, optional
+            clear recorded timings after reporting
+            
+        Comments
+        --------
+        Prints and returns a DataFrame with calls, wall time and bytes of
+        subprocess output per stage, recorded while timing is enabled 
+        (see tredev.timing). Stages nest, e.g. tredev.rescore includes 
+        tregex.get_matches, which includes tregex.call_tregex.
+        """
+        if not timing.enabled:
+            print("* timing disabled, enable with tredev.timing.enable()")
+        stats = timing.get_stats()
+        print(stats.to_string())
+        if reset:
+            timing.reset()
+        return stats
+        
     def report(self, name=None, label=None, column="precision"):
         """
         Report pattern matching scores
@@ -239,8 +900,17 @@ class Tredev(object):
         --------
         Prints a report of scores        
         """
-        t = pd.merge(left=self.patterns, right=self.scores,
-                     left_index=True, right_index=True)
+        if name in self.patterns.index:
+            self.tracker.activate(self.patterns.at[name, "label"])
+        else:
+            self.tracker.activate(label)
+        with self._lock:
+            t = pd.merge(left=self.patterns, right=self.scores,
+                         left_index=True, right_index=True)
+            if len(self.estimates):
+                # confidence intervals of estimated scores
+                t = t.join(self.estimates.formatted()).fillna(
+                    {"precision_ci": "", "recall_ci": ""})
         if name:
             # single row as DataFrame (t.loc[name] returns Series)
             t = t[t.index == name]
@@ -251,10 +921,75 @@ class Tredev(object):
         cols.remove("comment")
         cols.append("comment")
         t = t[cols]
-        t.sort(columns=column, ascending=False, inplace=True)
+        t = t.sort_values(column, ascending=False)
         print(t.to_string())
         
-    def annotate(self, pattern, label, unknown_only=False):
+    def coverage(self, label, names=None, recall=90.0, overlap=False):
+        """
+        Analyse coverage and redundancy of the patterns for a label
+        
+        Parameters
+        ----------
+        label: str
+            targeted label
+        names: sequence of str, optional
+            pattern names, by default all patterns targeting label
+        recall: float, optional
+            target recall (percent) of the greedy pattern subset
+        overlap: bool, optional
+            also print the number of matches shared by each pair of 
+            patterns
+            
+        Returns
+        -------
+        tredev.coverage.Coverage instance
+        
+        Comments
+        --------
+        Prints per pattern its number of matches, the matches and true 
+        positives no other pattern finds, precision and recall; the scores
+        of the union of all patterns and the size of their intersection; 
+        and a greedy subset of patterns whose union reaches the target 
+        recall, with the scores of the union after adding each one.
+        
+        Patterns with no unique matches are redundant: dropping any one of
+        them does not change the union, though dropping several may.
+        """
+        if label not in self.annots.columns:
+            print('*** invalid label "{}" ***'.format(label))
+            return None
+        if names is None:
+            names = self.patterns.index[self.patterns["label"] == label]
+        patterns = self.patterns.loc[list(names), "pattern"]
+        if not len(patterns):
+            print("*** no patterns for label {} ***".format(label))
+            return None
+        matches = self._get_batch_matches(patterns.unique())
+        coverage = Coverage(patterns.index, 
+                            [self.nodes.get_node_ids(matches[pattern]) 
+                             for pattern in patterns], 
+                            self.annots[label])
+        
+        print(coverage.table().sort_values("#unique", 
+                                           ascending=False).to_string())
+        if overlap:
+            print(coverage.overlap().to_string())
+        union = dict(zip(Scores.stats, 
+                         coverage.scores(coverage.union())[0]))
+        print("# union of {} patterns: {:.0f} matches, precision {:.2f}, "
+              "recall {:.2f}".format(len(patterns), union["#pred_pos"], 
+                                     union["precision"], union["recall"]))
+        print("# intersection: {} matches".format(
+            int(coverage.counts(coverage.intersection()).sum())))
+        greedy = coverage.greedy(recall)
+        print("# greedy subset for recall {:.1f}:".format(recall))
+        print(greedy[["precision", "recall", "f_score", 
+                      "#pred_pos"]].to_string())
+        if not len(greedy) or greedy["recall"].iloc[-1] < recall:
+            print("* target recall not reached")
+        return coverage
+        
+    def annotate(self, pattern, label, unknown_only=False, estimate=False):
         """
         Interactive manual annotation
         
@@ -266,48 +1001,67 @@ class Tredev(object):
             targeted label
         unknown_only: bool
             show unknown matches only, skipping true and false matches
-        """
-        n = 0
-        matches = get_matches(pattern, self.parse_dir)
-        max_n = len(matches) - 1
-        
-        if unknown_only:
-            all_matches = matches.copy()
-            matches = [pair for pair in matches
-                       if self.annots.is_unknown(Nodes.get_node_id(*pair), label)]
-        else:
-            all_matches = matches
-        
-        while matches:
-            tree_n, node_n = matches[n]
-            
-            print(78 * "-")
-            print("Match: {}/{}, Sentence: {}, Node: {}".format(
-                n+1, len(matches), tree_n, node_n))
-            print(78 * "-")
-            
-            node_id = self.nodes.get_node_id(tree_n, node_n)            
-            sentence = self.nodes.get_sentence(node_id)
-            substring = self.nodes.get_substring(node_id)
+        estimate: bool, optional
+            show matches in a sample of trees only (see set_sample), and 
+            evaluate with scores estimated from the sample
             
-            contexts = sentence.split(substring)
-            
-            if len(contexts) != 2:
-                print('* Warning: substring "{}" not (unique) in sentence "{}"'.format(
-                    substring, sentence))
+        Comments
+        --------
+        With the tregex backend, matches are streamed from tregex.sh: the 
+        first match is shown as soon as Tregex prints it, while further 
+        matches are read in the background. Their count is then shown 
+        with a "+". Evaluation waits for all matches, quitting kills 
+        tregex.sh if it is still running.
+        
+        While a match is shown, the next Tredev.prefetch matches and the 
+        previous one are rendered in the background, including their full 
+        and sub-trees, so moving on or back responds at once.
+        """
+        try:
+            if estimate:
+                stream = MatchStream.from_list(
+                    self._find_sample_matches(pattern))
             else:
-                print(contexts[0].strip())
-                print("==> {} <==".format(substring))
-                print(contexts[1].strip())
+                stream = self._stream_matches(pattern)
+        except (OSError, CalledProcessError) as err:
+            # tregex.sh not found or failed before streaming
+            print("*** tregex failed: {} ***".format(err))
+            return
+        try:
+            self._annotate(pattern, label, unknown_only, stream, estimate)
+        finally:
+            self._close_stream(pattern, stream)
+            if self._renderer is not None:
+                self._renderer.cancel()
             
-            if self.annots.is_positive(node_id, label):
-                value = "True"
-            elif self.annots.is_negative(node_id, label):
-                value = "False"
-            else:
-                value = "Unknown"    
-                
-            print("Label:", value)        
+    def _annotate(self, pattern, label, unknown_only, stream, estimate=False,
+                  all_matches=None):
+        # all_matches: all matches of pattern, if stream holds only some
+        self.tracker.activate(label)
+        n = 0
+        n_read = 0
+        matches = []
+        
+        while True:
+            # read matches from stream until match n is available
+            while len(matches) <= n and stream.wait(n_read):
+                new = stream.matches[n_read:]
+                n_read += len(new)
+                if unknown_only:
+                    node_ids = self.nodes.get_node_ids(new).tolist()
+                    new = [pair for pair, node_id in zip(new, node_ids)
+                           if self.annots.is_unknown(node_id, label)]
+                matches.extend(new)
+            if stream.error:
+                print("*** tregex failed: {} ***".format(stream.error))
+                return
+            if not matches:
+                print("*** pattern has zero (unknown) matches ***")
+                return
+            n = min(n, len(matches) - 1)
+            node_id = self._show_match(
+                matches, n, label, 
+                stream.done and n_read == len(stream.matches))
             
             while True:
                 print("?", end="", flush=True)
@@ -329,51 +1083,121 @@ class Tredev(object):
                         print("* nltk not installed")
                     else:
                         tree.draw()
-                elif cmd == "e":
-                    scores = self.scores.score_pat(
-                        self.annots[label], all_matches)
+                elif cmd == "e" and estimate:
+                    scores = self._estimate_pat(pattern, label)
                     self.scores.print_score(scores)
+                    Estimates.print_intervals(scores, len(self.sample))
+                elif cmd == "e" and all_matches is not None:
+                    self.scores.print_score(
+                        self._pattern_score(pattern, label, all_matches))
+                elif cmd == "e":
+                    if not stream.done:
+                        print("# waiting for all matches")
+                    try:
+                        all_matches = stream.result()
+                    except Exception as err:
+                        print("*** tregex failed: {} ***".format(err))
+                        continue
+                    self.scores.print_score(
+                        self._pattern_score(pattern, label, all_matches))
                 elif cmd == "f":
                     self.annots.set_negative(node_id, label)
                     print("# set match {}/{} to False".format(n + 1, 
                                                               len(matches)))                
-                    n = min(n + 1, max_n)                
+                    n += 1
                     break   
                 elif cmd == "i":
                     self.annots.set_ignore(node_id, label)
                     print("# set match {}/{} to Ignore".format(n + 1, 
                                                                len(matches)))                
-                    n = min(n + 1, max_n)                
+                    n += 1
                     break   
                 elif cmd == "n":
-                    n = min(n + 1, max_n)
+                    n += 1
                     break
                 elif cmd == "p":
                     n = max(n - 1, 0)
                     break
                 elif cmd == "q":
+                    if self.journal is not None:
+                        self.journal.sync()
                     print("# quit")
                     return        
                 elif cmd == "t":
                     self.annots.set_positive(node_id, label)
                     print("# set match {}/{} to True".format(n + 1, 
                                                              len(matches)))                 
-                    n = min(n + 1, max_n)                
+                    n += 1
                     break
                 elif cmd == "r":
-                    print(self.nodes.get_full_tree(node_id, indent=2))
+                    print(self._get_renderer().full_tree(node_id))
                 elif cmd == "s":
-                    print(self.nodes.get_subtree(node_id, indent=2))
+                    print(self._get_renderer().subtree(node_id))
                 elif cmd == "u":
                     self.annots.set_unknown(node_id, label)
                     print("# set match {}/{} to Unknown".format(n, len(matches)))                
-                    n = min(n + 1, max_n)                
+                    n += 1
                     break
                 else:
                     print("* Unknown commmand") 
                     print(help)
+                    
+    def _show_match(self, matches, n, label, complete=True):
+        # print match n with its context and label value
+        tree_n, node_n = matches[n]
+        
+        print(78 * "-")
+        print("Match: {}/{}{}, Sentence: {}, Node: {}".format(
+            n+1, len(matches), "" if complete else "+", tree_n, node_n))
+        print(78 * "-")
+        
+        node_id = self.nodes.get_node_id(tree_n, node_n)            
+        renderer = self._get_renderer()
+        left, substring, right = renderer.context(node_id)
+        print(left)
+        print("==> {} <==".format(substring))
+        print(right)
+        
+        if self.annots.is_positive(node_id, label):
+            value = "True"
+        elif self.annots.is_negative(node_id, label):
+            value = "False"
         else:
-            print("*** pattern has zero (unknown) matches ***")
+            value = "Unknown"    
+            
+        print("Label:", value)        
+        
+        if self.prefetch:
+            # render following matches, and the previous one for going 
+            # back, while this one is read
+            ahead = (matches[n + 1:n + 1 + self.prefetch] + 
+                     matches[max(n - 1, 0):n])
+            renderer.prefetch(self.nodes.get_node_ids(ahead).tolist())
+        return node_id
+    
+    def _get_renderer(self):
+        if self._renderer is None:
+            self._renderer = MatchRenderer(self.nodes, self.render_cache_size)
+        return self._renderer
+                    
+    def _stream_matches(self, pattern):
+        # stream from tregex.sh, unless matches are cached or come from the
+        # native engine or the persistent worker
+        if self.backend == "tregex" and not self.worker:
+            matches = (self.cache.get(pattern) if self.cache is not None 
+                       else None)
+            if matches is None:
+                return MatchStream(pattern, self.parse_dir, 
+                                   map_matches=self._map_trees)
+            return MatchStream.from_list(matches)
+        return MatchStream.from_list(self._get_matches(pattern))
+    
+    def _close_stream(self, pattern, stream):
+        if not stream.done:
+            stream.cancel()
+        elif (stream.proc is not None and self.cache is not None and 
+              not stream.error and not stream.cancelled):
+            self.cache.put(pattern, stream.matches)
             
             
     def reannotate(self, name, unknown_only=False):
@@ -394,9 +1218,468 @@ class Tredev(object):
                           self.patterns.at[name, "label"], 
                           unknown_only)
     
+    def diff(self, name, rev_a=-2, rev_b=-1):
+        """
+        Compare matches of two revisions of named pattern
+        
+        Parameters
+        ----------
+        name: str
+            pattern name
+        rev_a, rev_b: int, optional
+            revision numbers; negative numbers count back from the latest 
+            revision, so by default the latest revision is compared to the
+            one before
+            
+        Returns
+        -------
+        pandas.DataFrame indexed by node id, with columns tree_n, node_n,
+        change ("gained" or "lost" by rev_b) and value (annotation of the 
+        pattern's label), or None if a revision does not exist
+        
+        Comments
+        --------
+        Prints the number of gained and lost matches per annotation value.
+        
+        The match set of each revision is kept as a sorted array of node 
+        ids, so revisions are matched only once and compared by set 
+        operations. Revisions matched before parse files were added are 
+        compared on the trees they were matched against only.
+        """
+        try:
+            old_ids, n_old = self._revision_matches(name, rev_a)
+            new_ids, n_new = self._revision_matches(name, rev_b)
+        except KeyError as err:
+            print("*** {} ***".format(err.args[0]))
+            return None
+        if n_old != n_new:
+            n_nodes = min(n_old, n_new)
+            print("* comparing matches among the first {} nodes only".format(
+                n_nodes))
+            old_ids = old_ids[old_ids <= n_nodes]
+            new_ids = new_ids[new_ids <= n_nodes]
+        gained, lost = Revisions.diff_ids(old_ids, new_ids)
+        node_ids = np.concatenate((gained, lost)).astype(np.int64)
+        tree_n, node_n = self.nodes.get_tree_nodes(node_ids)
+        true_values = self.annots[self.patterns.at[name, "label"]]
+        values = true_values.values[true_values.index.get_indexer(node_ids)]
+        value_names = pd.Series(Annotations.value_names)
+        diff = pd.DataFrame(
+            dict(tree_n=tree_n, node_n=node_n,
+                 change=np.repeat(["gained", "lost"], [len(gained), 
+                                                       len(lost)]),
+                 value=value_names.loc[values].values),
+            index=pd.Index(node_ids, name="node_id"))
+        print("# {} revision {} -> {}: {} gained, {} lost".format(
+            name, self.revisions.get_row(name, rev_a)["revision"], 
+            self.revisions.get_row(name, rev_b)["revision"], 
+            len(gained), len(lost)))
+        counts = pd.crosstab(diff["change"], diff["value"]).reindex(
+            index=["gained", "lost"], columns=value_names.values, 
+            fill_value=0)
+        print(counts.to_string())
+        return diff
+    
+    def annotate_diff(self, name, rev_a=-2, rev_b=-1, lost=False, 
+                      unknown_only=False):
+        """
+        Interactive manual annotation of the matches gained or lost between
+        two revisions of named pattern
+        
+        Parameters
+        ----------
+        name: str
+            pattern name
+        rev_a, rev_b: int, optional
+            revision numbers, by default the previous and latest revision 
+            (see Tredev.diff)
+        lost: bool, optional
+            show matches of rev_a lost by rev_b instead of matches gained 
+            by rev_b
+        unknown_only: bool
+            show unknown matches only, skipping true and false matches
+            
+        Comments
+        --------
+        Pattern and evaluation are those of rev_b for gained matches and of
+        rev_a for lost ones.
+        """
+        diff = self.diff(name, rev_a, rev_b)
+        if diff is None:
+            return
+        diff = diff[diff["change"] == ("lost" if lost else "gained")]
+        revision = rev_a if lost else rev_b
+        row = self.revisions.get_row(name, revision)
+        tree_n, node_n = self.nodes.get_tree_nodes(
+            self._revision_matches(name, revision)[0])
+        stream = MatchStream.from_list(list(zip(diff["tree_n"].tolist(), 
+                                                diff["node_n"].tolist())))
+        try:
+            self._annotate(row["pattern"], row["label"], unknown_only, stream,
+                           all_matches=list(zip(tree_n.tolist(), 
+                                                node_n.tolist())))
+        finally:
+            if self._renderer is not None:
+                self._renderer.cancel()
+            
+    def _revision_matches(self, name, revision):
+        # node ids matched by revision of named pattern and the number of
+        # nodes matched against; revisions never scored are matched now
+        found = self.revisions.get_matches(name, revision)
+        if found is None:
+            row = self.revisions.get_row(name, revision)
+            node_ids = self.nodes.get_node_ids(
+                self._get_matches(row["pattern"]))
+            with self._lock:
+                self.revisions.set_matches(name, row["revision"], node_ids,
+                                           len(self.nodes))
+            found = self.revisions.get_matches(name, revision)
+        return found
+    
+    def _get_matches(self, pattern):
+        if self.cache is not None:
+            matches = self.cache.get(pattern)
+            if matches is None:
+                matches = self._find_matches(pattern)
+                self.cache.put(pattern, matches)
+            return matches
+        return self._find_matches(pattern)
+    
+    def match_patterns(self, patterns):
+        """
+        Get matches of many patterns at once
+        
+        Parameters
+        ----------
+        patterns: dict or pandas.Series
+            tree regular expressions by name
+            
+        Returns
+        -------
+        dict mapping names to lists of (tree_n, node_n) tuples
+        
+        Comments
+        --------
+        The native backend evaluates all patterns in one pass, sharing 
+        sub-expressions between them; the persistent worker matches them in
+        one pass over its trees. Otherwise tregex.sh is called per pattern.
+        Cached matches are reused.
+        """
+        matches = self._get_batch_matches(set(patterns.values()))
+        return dict((name, matches[pattern]) 
+                    for name, pattern in patterns.items())
+    
+    def _get_batch_matches(self, patterns):
+        # dict mapping each pattern to its matches
+        results = {}
+        uncached = []
+        for pattern in patterns:
+            matches = (self.cache.get(pattern) if self.cache is not None
+                       else None)
+            if matches is None:
+                uncached.append(pattern)
+            else:
+                results[pattern] = matches
+        found = self._find_batch_matches(uncached)
+        if self.cache is not None:
+            for pattern, matches in found.items():
+                self.cache.put(pattern, matches)
+        results.update(found)
+        return results
+    
+    def _find_batch_matches(self, patterns):
+        results = {}
+        if self.backend == "native":
+            # rare patterns are faster on their candidate trees only
+            batch = [pattern for pattern in patterns 
+                     if self._candidate_trees(pattern) is None]
+            if len(batch) > 1:
+                results = native.get_batch_matches(batch, self._get_index())
+        elif self.worker and len(patterns) > 1:
+            match_lists = get_batch_matches(patterns, self.worker)
+            results = dict((pattern, self._map_trees(matches)) 
+                           for pattern, matches in zip(patterns, match_lists))
+        for pattern in patterns:
+            if pattern not in results:
+                results[pattern] = self._find_matches(pattern)
+        return results
+    
+    def _get_index(self):
+        if self._index is None:
+            self._index = native.TreeIndex(self.nodes)
+        return self._index
+    
+    def _candidate_trees(self, pattern):
+        # trees that may match pattern, None for all trees
+        if not self.prefilter:
+            return None
+        if self._label_index is None:
+            self._label_index = LabelIndex.from_nodes(self.nodes)
+        return self._label_index.candidate_trees(pattern)
+    
+    def _find_matches(self, pattern):
+        candidates = self._candidate_trees(pattern)
+        if self.backend == "native":
+            index = self._get_index()
+            if candidates is not None:
+                index = index.subset(candidates)
+            try:
+                return native.get_matches(pattern, index)
+            except native.UnsupportedPattern as err:
+                print("* falling back to tregex:", err)
+        if candidates is not None and not self.worker:
+            return self._find_candidate_matches(pattern, candidates)
+        matches = get_matches(pattern, self.parse_dir, worker=self.worker,
+                              n_shards=self.n_shards, 
+                              tree_counts=self.files["n_trees"])
+        return self._map_trees(matches)
+    
+    def _find_candidate_matches(self, pattern, candidates):
+        # run tregex.sh on a temporary corpus of candidate trees only,
+        # copied from the parse files
+        if not len(candidates):
+            return []
+        trees = self.files.read_trees(self.parse_dir, candidates)
+        with trees_dir(trees) as dir_path:
+            matches = get_matches(pattern, dir_path)
+        return [(int(candidates[tree_n - 1]), node_n) 
+                for tree_n, node_n in matches]
+    
+    def _update_tree_map(self):
+        # map from Tregex's tree numbers (sorted file order) to registered
+        # tree numbers, None if identical
+        self._tree_map = self.files.tregex_tree_map(self.parse_dir)
+        
+    def _map_trees(self, matches):
+        if self._tree_map is None:
+            return matches
+        tree_map = self._tree_map
+        return [(int(tree_map[tree_n]), node_n) for tree_n, node_n in matches
+                if tree_n < len(tree_map) and tree_map[tree_n]]
+    
+    def _find_new_matches(self, pattern, new_dir, new_nodes, first_tree):
+        # match pattern against newly added trees only
+        if self.backend == "native":
+            try:
+                return native.get_matches(pattern, 
+                                          native.TreeIndex(new_nodes))
+            except native.UnsupportedPattern as err:
+                print("* falling back to tregex:", err)
+        # new files are registered in sorted order, like Tregex numbers them
+        return [(first_tree - 1 + tree_n, node_n) 
+                for tree_n, node_n in get_matches(pattern, new_dir)]
+    
+    def _pattern_score(self, pattern, label, matches):
+        # live scores of a tracked pattern with the same pattern and label,
+        # otherwise scores computed from matches
+        for name in self.patterns.index[
+            (self.patterns["pattern"] == pattern) & 
+            (self.patterns["label"] == label)]:
+            if name in self.tracker:
+                return tuple(self.scores.loc[name])
+        return self.scores.score_pat(self.annots[label], 
+                                     self.nodes.get_node_ids(matches))
+    
+    def _track_cached(self, label):
+        # score patterns for label whose matches are cached, to start 
+        # tracking them
+        if self.cache is None:
+            return
+        group = self.patterns[self.patterns["label"] == label]
+        matches = {}
+        for pattern in group["pattern"].unique():
+            cached = self.cache.get(pattern)
+            if cached is not None:
+                matches[pattern] = cached
+        group = group[group["pattern"].isin(matches)]
+        if len(group):
+            self._track(label, group.index, 
+                        [self.nodes.get_node_ids(matches[pattern]) 
+                         for pattern in group["pattern"]])
+    
     def _score_pat(self, pattern, label, name=None):
-        matches = get_matches(pattern, self.parse_dir)
-        return self.scores.score_pat(self.annots[label], matches, name) 
+        node_ids = self.nodes.get_node_ids(self._get_matches(pattern))
+        if name:
+            return tuple(self._track(label, [name], [node_ids])[0])
+        return self.scores.score_pat(self.annots[label], node_ids)
+    
+    def _score_pats(self, selection, n_jobs=1):
+        if n_jobs == 1:
+            # match all patterns in a single pass and score all patterns
+            # for the same label in a single batch
+            matches = self._get_batch_matches(selection["pattern"].unique())
+            for label, group in selection.groupby("label", sort=False):
+                node_id_lists = [self.nodes.get_node_ids(matches[pattern])
+                                 for pattern in group["pattern"]]
+                self._track(label, group.index, node_id_lists)
+            return
+        
+        if self.backend == "native":
+            # build shared index before threads start using it
+            self._get_index()
+            
+        n_done = 0
+        
+        with ThreadPoolExecutor(n_jobs) as executor:
+            # each distinct pattern is matched once
+            futures = dict((executor.submit(self._get_matches, pattern), 
+                            group)
+                           for pattern, group in selection.groupby(
+                               "pattern", sort=False))
+            for future in as_completed(futures):
+                group = futures[future]
+                names = ", ".join(group.index)
+                try:
+                    matches = future.result()
+                except Exception as err:
+                    print('*** pattern "{}" failed: {} ***'.format(names, 
+                                                                   err))
+                    continue
+                node_ids = self.nodes.get_node_ids(matches)
+                for label, label_group in group.groupby("label", 
+                                                        sort=False):
+                    self._track(label, label_group.index, 
+                                [node_ids] * len(label_group))
+                n_done += 1
+                print("# scored {} ({}/{})".format(names, n_done, 
+                                                   len(futures)))
+            
+    def _track(self, label, names, node_id_lists):
+        # score named patterns exactly and keep their scores current,
+        # replacing estimates, and keep the match sets of their revisions
+        with self._lock:
+            scores = self.tracker.score(label, names, node_id_lists)
+            self._drop_estimates(names)
+            for name, node_ids in zip(names, node_id_lists):
+                self.revisions.record(name, self.patterns.at[name, "pattern"],
+                                      label, node_ids, len(self.nodes))
+        return scores
+    
+    def _drop_estimates(self, names):
+        # also cancels replacement by background runs
+        for name in names:
+            self._exact_runs.pop(name, None)
+        self.estimates.drop(list(names), inplace=True, errors="ignore")
+        
+    def set_sample(self, fraction=0.1, seed=0, stratified=True):
+        """
+        Draw the sample of trees on which scores are estimated
+        
+        Parameters
+        ----------
+        fraction: float, optional
+            fraction of trees in sample
+        seed: int, optional
+            seed of the random generator: the same seed draws the same 
+            sample of the same corpus
+        stratified: bool, optional
+            sample the same fraction of trees from every parse file,
+            instead of from all trees at once
+            
+        Comments
+        --------
+        Without calling set_sample, a sample is drawn with the settings 
+        sample_fraction, sample_seed and sample_stratified. The sample is 
+        drawn again with the same settings when parse files are added.
+        """
+        self.sample_fraction = fraction
+        self.sample_seed = seed
+        self.sample_stratified = stratified
+        self.sample = None
+        sample = self._get_sample()
+        print("# sampled {} of {} trees".format(len(sample), sample.n_total))
+        
+    def _get_sample(self):
+        if (self.sample is None or 
+                self.sample.n_total != self.files.total_trees()):
+            self.sample = Sample.draw(self.files, self.sample_fraction,
+                                      self.sample_seed, 
+                                      self.sample_stratified)
+        return self.sample
+    
+    def _find_sample_matches(self, pattern):
+        # matches of pattern in the sampled trees, kept with the sample
+        sample = self._get_sample()
+        matches = sample.matches.get(pattern)
+        if matches is not None:
+            return matches
+        candidates = self._candidate_trees(pattern)
+        trees = (sample.trees if candidates is None 
+                 else np.intersect1d(sample.trees, candidates))
+        if self.backend == "native":
+            if candidates is not None:
+                index = self._get_index().subset(trees)
+            else:
+                if sample.index is None:
+                    sample.index = self._get_index().subset(trees)
+                index = sample.index
+            try:
+                matches = native.get_matches(pattern, index)
+            except native.UnsupportedPattern as err:
+                print("* falling back to tregex:", err)
+        if matches is None and candidates is None:
+            # sampled trees are written to a corpus file only once
+            matches = [(int(sample.trees[tree_n - 1]), node_n) 
+                       for tree_n, node_n in get_matches(
+                           pattern, sample.corpus_dir(self.files, 
+                                                      self.parse_dir))]
+        elif matches is None:
+            matches = self._find_candidate_matches(pattern, trees)
+        sample.matches[pattern] = matches
+        return matches
+    
+    def _estimate_pat(self, pattern, label, name=None):
+        # scores of pattern on the nodes of sampled trees
+        sample = self._get_sample()
+        node_ids = self.nodes.get_node_ids(self._find_sample_matches(pattern))
+        true_values = self.annots[label]
+        true_values = true_values.iloc[true_values.index.get_indexer(
+            sample.node_ids(self.nodes))]
+        with self._lock:
+            scores = self.scores.score_pat(true_values, node_ids, name)
+            if name:
+                # estimates are not kept current
+                self.tracker.untrack(name)
+                self._exact_runs.pop(name, None)
+                self.estimates.add_estimate(name, len(sample), scores)
+        return scores
+    
+    def _estimate_pats(self, selection, background=False):
+        for row_name, row in selection.iterrows():
+            self._estimate_pat(row["pattern"], row["label"], row_name)
+        if background and len(selection):
+            self._start_exact(selection)
+            
+    def _start_exact(self, selection):
+        # compute exact scores of selected patterns in a background thread,
+        # replacing their estimates unless they are estimated again, scored 
+        # or removed meanwhile
+        run = object()
+        with self._lock:
+            for row_name in selection.index:
+                self._exact_runs[row_name] = run
+        thread = threading.Thread(target=self._exact_run, 
+                                  args=(selection, run), daemon=True)
+        thread.start()
+        return thread
+    
+    def _exact_run(self, selection, run):
+        try:
+            matches = self._get_batch_matches(selection["pattern"].unique())
+        except Exception as err:
+            print("*** exact scoring failed: {} ***".format(err))
+            return
+        with self._lock:
+            current = [row_name for row_name in selection.index 
+                       if self._exact_runs.get(row_name) is run]
+            for label, group in selection.loc[current].groupby("label", 
+                                                               sort=False):
+                self._track(label, group.index, 
+                            [self.nodes.get_node_ids(matches[pattern]) 
+                             for pattern in group["pattern"]])
+        if current:
+            print("# exact scores replaced estimates of {}".format(
+                ", ".join(map(str, current)))) 
                 
                     
         
\ No newline at end of file
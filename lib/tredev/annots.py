@@ -1,3 +1,6 @@
+import pickle
+from contextlib import nullcontext
+
 import numpy as np
 import pandas as pd
 
@@ -8,39 +11,456 @@ class Annotations(pd.DataFrame):
     negative = -1
     ignore = -2
     
+    # value names, as in exported annotations
+    value_names = {positive: "True", negative: "False", unknown: "Unknown",
+                   ignore: "Ignore"}
+    
+    # tredev.journal.Journal recording all changes, if any
+    journal = None
+    
+    # callable(node_id, label, old_value, new_value) notified of every 
+    # changed cell, e.g. tredev.tracker.ScoreTracker.update
+    listener = None
+    
+    # callable(node_ids, label, old_values, new_values) notified of the 
+    # cells of a label changed by set_values, e.g. 
+    # tredev.tracker.ScoreTracker.update_many; without it, listener is 
+    # notified of every cell
+    bulk_listener = None
+    
+    # held while cells are changed and listeners notified, so readers 
+    # holding it see cells and listener state agree, e.g. the lock of 
+    # tredev.tracker.ScoreTracker
+    lock = nullcontext()
+    
     @classmethod
     def from_nodes(cls, nodes, annot_labels):
-        data = np.zeros((len(nodes), len(annot_labels)), dtype=np.int8)
-        data = cls.unknown
-        return cls(data, columns=annot_labels, index=nodes.index)
+        return cls.from_index(nodes.index, annot_labels)
+    
+    @classmethod
+    def from_index(cls, index, annot_labels):
+        data = np.full((len(index), len(annot_labels)), cls.unknown, 
+                       dtype=np.int8)
+        return cls(data, columns=annot_labels, index=index)
+    
+    def append_index(self, index):
+        """
+        Return new annotations with unknown values for the nodes in index
+        appended
+        """
+        annots = Annotations(pd.concat([self, self.from_index(index, 
+                                                              self.columns)]))
+        annots.journal = self.journal
+        annots.listener = self.listener
+        annots.bulk_listener = self.bulk_listener
+        annots.lock = self.lock
+        return annots
+    
+    def arrays(self):
+        """
+        Cells whose value is not unknown as arrays of node ids, label codes
+        (positions in columns) and values, as SparseAnnotations.arrays
+        """
+        values = np.asarray(self.values)
+        rows, cols = np.nonzero(values != self.unknown)
+        return (self.index.values[rows].astype(np.int64), 
+                cols.astype(np.int16), values[rows, cols].astype(np.int8))
     
     def get_value(self, node_id, label):
-        return self.ix[node_id, label] 
+        return self.at[node_id, label] 
+        
+    def set_value(self, node_id, label, value):
+        if value == self.positive:
+            self.set_positive(node_id, label)
+        else:
+            with self.lock:
+                old = self.at[node_id, label]
+                self.at[node_id, label] = value
+                self._record(node_id, label, value)
+                self._notify(node_id, label, old, value)
         
     def set_positive(self, node_id, label):
         # Labels are assumed to be mutually exclusive, so if one them is
         # true, then all the others must be false. 
         # TODO: check for conflicts
-        self.loc[node_id] = self.negative
-        self.ix[node_id, label] = self.positive
+        with self.lock:
+            old = self.loc[node_id].copy()
+            self.loc[node_id] = self.negative
+            self.at[node_id, label] = self.positive
+            self._record(node_id, label, self.positive)
+            for other, value in old.items():
+                self._notify(node_id, other, value, self.positive 
+                             if other == label else self.negative)
         
     def set_negative(self, node_id, label):
-        self.ix[node_id, label] = self.negative
+        self.set_value(node_id, label, self.negative)
         
     def set_unknown(self, node_id, label):
-        self.ix[node_id, label] = self.unknown
+        self.set_value(node_id, label, self.unknown)
         
     def set_ignore(self, node_id, label):
-        self.ix[node_id, label] = self.ignore
+        self.set_value(node_id, label, self.ignore)
+        
+    def set_values(self, node_ids, labels, values, overwrite=True):
+        """
+        Set many cells at once
+        
+        Parameters
+        ----------
+        node_ids: sequence of int
+            node ids
+        labels: sequence of str
+            annotation labels
+        values: sequence of int
+            values: positive, negative, unknown or ignore
+        overwrite: bool, optional
+            change cells that already have another value than unknown; 
+            otherwise their nodes are left unchanged
+            
+        Returns
+        -------
+        n_changed: int
+            number of changed cells
+        conflicts: pandas.DataFrame
+            conflicting input rows, indexed by position, with columns 
+            node_id, label, value and conflict
+            
+        Comments
+        --------
+        As with set_positive, a positive value sets all other labels of 
+        the node negative, unless their values are given too. Nodes of 
+        conflicting rows are left unchanged, except that rows changing a 
+        known value are only reported with overwrite. Conflicts are 
+        resolved on arrays, and cells are written, journaled and notified 
+        per label, so the cost hardly depends on the number of cells.
+        """
+        node_ids = np.asarray(node_ids, dtype=np.int64)
+        labels = pd.Index(labels, dtype=object)
+        values = np.asarray(values, dtype=np.int64)
+        n_labels = len(self.columns)
+        rows = self.index.get_indexer(node_ids)
+        codes = self.columns.get_indexer(labels)
+        conflict = np.full(len(node_ids), "", dtype=object)
+        
+        def flag(mask, reason):
+            conflict[mask & (conflict == "")] = reason
+            
+        def flag_rows(bad_rows, reason):
+            flag(np.isin(rows, bad_rows), reason)
+            
+        flag(rows < 0, "unknown node")
+        flag(codes < 0, "unknown label")
+        flag(~np.isin(values, list(self.value_names)), "invalid value")
+        
+        # cells given different values
+        ok = conflict == ""
+        keys = rows * n_labels + codes
+        order = np.lexsort((values[ok], keys[ok]))
+        cell_keys, cell_values = keys[ok][order], values[ok][order]
+        cell_keys, first = np.unique(cell_keys, return_index=True)
+        last = np.append(first[1:], len(order))[:len(first)] - 1
+        flag_rows(cell_keys[cell_values[first] != cell_values[last]] // 
+                  n_labels, "different values for the same cell")
+        
+        # positive labels exclude each other
+        ok = conflict == ""
+        cell_keys, index = np.unique(keys[ok], return_index=True)
+        cell_values = values[ok][index]
+        cell_rows = cell_keys // n_labels
+        pos_rows, n_pos = np.unique(cell_rows[cell_values == self.positive],
+                                    return_counts=True)
+        flag_rows(pos_rows[n_pos > 1], "several positive labels")
+        
+        # cells to set: other labels of positive nodes are negative, unless
+        # given, as if set_positive came first
+        ok = conflict == ""
+        cell_keys, index = np.unique(keys[ok], return_index=True)
+        cell_values = values[ok][index]
+        pos_rows = cell_keys[cell_values == self.positive] // n_labels
+        implied = (pos_rows[:, None] * n_labels + 
+                   np.arange(n_labels)).ravel()
+        implied = implied[~np.isin(implied, cell_keys)]
+        cell_keys = np.concatenate((cell_keys, implied))
+        cell_values = np.concatenate((
+            cell_values, np.full(len(implied), self.negative)))
+        cell_rows, cell_codes = np.divmod(cell_keys, n_labels)
+        old_values = np.empty(len(cell_keys), dtype=np.int64)
+        for code in np.unique(cell_codes):
+            is_code = cell_codes == code
+            old_values[is_code] = self._get_cells(self.columns[code], 
+                                                  cell_rows[is_code])
+        
+        # cells whose known value changes
+        known = (old_values != self.unknown) & (old_values != cell_values)
+        flag_rows(cell_rows[known], "changes known value")
+        if not overwrite:
+            cell_rows, cell_codes, cell_values, old_values = [
+                array[~np.isin(cell_rows, cell_rows[known])] 
+                for array in (cell_rows, cell_codes, cell_values, 
+                              old_values)]
+            
+        changed = old_values != cell_values
+        cell_ids = np.asarray(self.index.values[cell_rows], dtype=np.int64)
+        with self.lock:
+            for code in np.unique(cell_codes[changed]):
+                is_code = changed & (cell_codes == code)
+                label = self.columns[code]
+                self._put_cells(label, cell_rows[is_code], 
+                                cell_values[is_code])
+                self._notify_many(cell_ids[is_code], label, 
+                                  old_values[is_code], cell_values[is_code])
+        if self.journal is not None:
+            # replaying a positive cell sets the other labels negative, so
+            # positive cells go first, followed by all other cells of 
+            # their nodes
+            is_pos = changed & (cell_values == self.positive)
+            is_other = ~is_pos & (changed | np.isin(cell_rows, 
+                                                     cell_rows[is_pos]))
+            for selection in is_pos, is_other:
+                for code in np.unique(cell_codes[selection]):
+                    is_code = selection & (cell_codes == code)
+                    self.journal.record_many(cell_ids[is_code], 
+                                             self.columns[code], 
+                                             cell_values[is_code])
+        
+        is_conflict = conflict != ""
+        conflicts = pd.DataFrame(
+            dict(node_id=node_ids[is_conflict], label=labels[is_conflict],
+                 value=values[is_conflict], conflict=conflict[is_conflict]),
+            index=np.flatnonzero(is_conflict))
+        return int(changed.sum()), conflicts
+    
+    def _get_cells(self, label, rows):
+        return self[label].values[rows]
+    
+    def _put_cells(self, label, rows, values):
+        self.iloc[rows, self.columns.get_loc(label)] = values.astype(
+            np.int8)
+        
+    def _record(self, node_id, label, value):
+        if self.journal is not None:
+            self.journal.record(node_id, label, value)
+            
+    def _notify(self, node_id, label, old, new):
+        if self.listener is not None and old != new:
+            self.listener(node_id, label, old, new)
+            
+    def _notify_many(self, node_ids, label, old, new):
+        if self.bulk_listener is not None:
+            self.bulk_listener(node_ids, label, old, new)
+        elif self.listener is not None:
+            for node_id, old_value, new_value in zip(
+                    node_ids.tolist(), old.tolist(), new.tolist()):
+                self.listener(node_id, label, old_value, new_value)
+        
+    def is_positive(self, node_id, label):
+        return self.at[node_id, label] == self.positive
+        
+    def is_negative(self, node_id, label):
+        return self.at[node_id, label] == self.negative
+    
+    def is_unknown(self, node_id, label):
+        return self.at[node_id, label] == self.unknown
+    
+    def is_ignore(self, node_id, label):
+        return self.at[node_id, label] == self.ignore
+
+
+class SparseAnnotations(object):
+    """
+    Alternative to Annotations with the same methods, storing only cells
+    whose value is not unknown
+    
+    Values are kept per label in a dict from node id to value, so memory
+    scales with the number of annotations instead of nodes times labels.
+    The index of all node ids (normally shared with the nodes) is only 
+    used to check node ids and to export dense vectors for scoring.
+    """
+    
+    positive = Annotations.positive
+    unknown = Annotations.unknown
+    negative = Annotations.negative
+    ignore = Annotations.ignore
+    value_names = Annotations.value_names
+    
+    def __init__(self, index, annot_labels):
+        self.index = pd.Index(index, name="node_id", copy=False)
+        self.columns = pd.Index(annot_labels)
+        self.cells = dict((label, {}) for label in self.columns)
+        self.journal = None
+        self.listener = None
+        self.bulk_listener = None
+        self.lock = Annotations.lock
+        
+    @classmethod
+    def from_nodes(cls, nodes, annot_labels):
+        return cls(nodes.index, annot_labels)
+    
+    @classmethod
+    def from_index(cls, index, annot_labels):
+        return cls(index, annot_labels)
+    
+    @classmethod
+    def from_arrays(cls, index, annot_labels, node_ids, label_codes, values):
+        """
+        Create from arrays of annotated cells (see arrays)
+        """
+        annots = cls(index, annot_labels)
+        labels = annots.columns[np.asarray(label_codes, dtype=np.int64)]
+        for label, node_id, value in zip(labels, 
+                                         np.asarray(node_ids).tolist(),
+                                         np.asarray(values).tolist()):
+            annots.cells[label][node_id] = value
+        return annots
+    
+    @classmethod
+    def from_frame(cls, frame):
+        """
+        Convert from Annotations DataFrame
+        """
+        values = np.asarray(frame.values)
+        rows, cols = np.nonzero(values != cls.unknown)
+        return cls.from_arrays(frame.index, frame.columns, 
+                               frame.index.values[rows], cols, 
+                               values[rows, cols])
+    
+    def to_frame(self):
+        """
+        Convert to Annotations DataFrame
+        """
+        annots = Annotations.from_index(self.index, self.columns)
+        for label in self.columns:
+            annots[label] = self.dense(label)
+        return annots
+    
+    def arrays(self):
+        """
+        Annotated cells as arrays of node ids, label codes (positions in
+        columns) and values
+        """
+        node_ids, label_codes, values = [], [], []
+        for code, label in enumerate(self.columns):
+            cells = self.cells[label]
+            node_ids.extend(cells)
+            label_codes.extend([code] * len(cells))
+            values.extend(cells.values())
+        return (np.array(node_ids, dtype=np.int64), 
+                np.array(label_codes, dtype=np.int16),
+                np.array(values, dtype=np.int8))
+    
+    def __len__(self):
+        return len(self.index)
+    
+    def __getitem__(self, label):
+        """
+        Values of label as pandas.Series, like Annotations[label]
+        """
+        return pd.Series(self.dense(label), index=self.index, name=label)
+    
+    def dense(self, label):
+        """
+        Values of label as dense int8 array aligned with index
+        """
+        cells = self.cells[label]
+        values = np.full(len(self.index), self.unknown, dtype=np.int8)
+        if cells:
+            values[self.index.get_indexer(list(cells))] = list(cells.values())
+        return values
+    
+    def n_annotated(self):
+        """
+        Number of cells whose value is not unknown
+        """
+        return sum(len(cells) for cells in self.cells.values())
+    
+    def append_index(self, index):
+        """
+        Return new annotations with unknown values for the nodes in index
+        appended, sharing the annotated cells
+        """
+        annots = self.__class__.__new__(self.__class__)
+        annots.__dict__.update(self.__dict__)
+        annots.index = self.index.append(pd.Index(index)).rename("node_id")
+        return annots
+    
+    def _check(self, node_id, label):
+        if label not in self.cells:
+            raise KeyError(label)
+        if node_id not in self.index:
+            raise KeyError(node_id)
+        
+    def get_value(self, node_id, label):
+        self._check(node_id, label)
+        return self.cells[label].get(node_id, self.unknown)
+    
+    def set_value(self, node_id, label, value):
+        if value == self.positive:
+            self.set_positive(node_id, label)
+            return
+        self._check(node_id, label)
+        with self.lock:
+            if value == self.unknown:
+                old = self.cells[label].pop(node_id, self.unknown)
+            else:
+                old = self.cells[label].get(node_id, self.unknown)
+                self.cells[label][node_id] = value
+            self._record(node_id, label, value)
+            self._notify(node_id, label, old, value)
+        
+    def set_positive(self, node_id, label):
+        # Labels are assumed to be mutually exclusive, so if one them is
+        # true, then all the others must be false. 
+        self._check(node_id, label)
+        with self.lock:
+            old = dict((other, cells.get(node_id, self.unknown))
+                       for other, cells in self.cells.items())
+            for cells in self.cells.values():
+                cells[node_id] = self.negative
+            self.cells[label][node_id] = self.positive
+            self._record(node_id, label, self.positive)
+            for other, value in old.items():
+                self._notify(node_id, other, value, self.positive 
+                             if other == label else self.negative)
         
+    set_negative = Annotations.set_negative
+    set_unknown = Annotations.set_unknown
+    set_ignore = Annotations.set_ignore
+    set_values = Annotations.set_values
+    _record = Annotations._record
+    _notify = Annotations._notify
+    _notify_many = Annotations._notify_many
+    
+    def _get_cells(self, label, rows):
+        return self.dense(label)[rows]
+    
+    def _put_cells(self, label, rows, values):
+        cells = self.cells[label]
+        node_ids = self.index.values[rows]
+        known = values != self.unknown
+        cells.update(zip(node_ids[known].tolist(), values[known].tolist()))
+        for node_id in node_ids[~known].tolist():
+            cells.pop(node_id, None)
+    
     def is_positive(self, node_id, label):
-        return self.ix[node_id, label] == self.positive
+        return self.get_value(node_id, label) == self.positive
         
     def is_negative(self, node_id, label):
-        return self.ix[node_id, label] == self.negative
+        return self.get_value(node_id, label) == self.negative
     
     def is_unknown(self, node_id, label):
-        return self.ix[node_id, label] == self.unknown
+        return self.get_value(node_id, label) == self.unknown
     
     def is_ignore(self, node_id, label):
-        return self.ix[node_id, label] == self.ignore
\ No newline at end of file
+        return self.get_value(node_id, label) == self.ignore
+    
+    def to_pickle(self, path):
+        with open(path, "wb") as outf:
+            pickle.dump(self, outf, protocol=pickle.HIGHEST_PROTOCOL)
+            
+    def __getstate__(self):
+        # the journal and listener belong to the session, not to the 
+        # annotations
+        return (self.index, self.columns) + self.arrays()
+    
+    def __setstate__(self, state):
+        self.__dict__.update(self.from_arrays(*state).__dict__)
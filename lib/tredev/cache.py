@@ -0,0 +1,150 @@
+"""
+Persistent cache for pattern matches
+
+Matches are stored as int32 arrays of (tree_n, node_n) rows in .npy files,
+one per pattern, named after a hash of the pattern text, the matching
+backend and a fingerprint of the parse directory. Changing any parse file
+therefore invalidates all entries, and matches of one backend are never
+served to another. The total size of the cache is bounded by evicting the least
+recently used entries.
+"""
+
+import hashlib
+import os
+import threading
+from glob import glob
+from os.path import join, getsize, exists
+
+import numpy as np
+
+
+def fingerprint(parse_dir):
+    """
+    Fingerprint of parse directory from names, sizes and modification
+    times of its files
+    """
+    digest = hashlib.sha1()
+    # sort files like Nodes.from_parses
+    for fname in sorted(glob(join(parse_dir, "*"))):
+        stat = os.stat(fname)
+        digest.update("{}\t{}\t{}\n".format(os.path.basename(fname),
+                                            stat.st_size,
+                                            stat.st_mtime_ns).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class MatchCache(object):
+    """
+    Size-bounded LRU cache of pattern matches on disk
+    """
+
+    suffix = ".npy"
+
+    def __init__(self, cache_dir, parse_dir, max_bytes=2 ** 30, 
+                 backend="tregex"):
+        """
+        Parameters
+        ----------
+        cache_dir: str
+            directory for cache files, created if needed
+        parse_dir: str
+            directory with files containing parse trees
+        max_bytes: int
+            maximum total size of cache files
+        backend: str
+            backend producing the matches, e.g. "tregex" or "native"
+        """
+        self.cache_dir = cache_dir
+        self.parse_dir = parse_dir
+        self.max_bytes = max_bytes
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self.update_fingerprint()
+
+        # file name -> size, in order of last use (oldest first)
+        paths = glob(join(cache_dir, "*" + self.suffix))
+        paths.sort(key=os.path.getmtime)
+        self._sizes = dict((os.path.basename(path), getsize(path))
+                           for path in paths)
+
+    def update_fingerprint(self):
+        """
+        Recompute fingerprint of parse directory, e.g. after adding or
+        changing parse files
+        """
+        self.fingerprint = fingerprint(self.parse_dir)
+
+    def key(self, pattern):
+        digest = hashlib.sha1(self.fingerprint.encode("utf-8"))
+        digest.update("{}\n".format(self.backend).encode("utf-8"))
+        digest.update(pattern.encode("utf-8"))
+        return digest.hexdigest() + self.suffix
+
+    def get(self, pattern):
+        """
+        Get cached matches for pattern as list of (tree_n, node_n) tuples,
+        or None if not cached
+        """
+        fname = self.key(pattern)
+        path = join(self.cache_dir, fname)
+        try:
+            array = np.load(path)
+        except (IOError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+            if fname in self._sizes:
+                # mark as most recently used
+                os.utime(path)
+                self._sizes[fname] = self._sizes.pop(fname)
+        return list(map(tuple, array.tolist()))
+
+    def put(self, pattern, matches):
+        """
+        Store matches for pattern, evicting least recently used entries
+        if the cache grows too large
+        """
+        fname = self.key(pattern)
+        path = join(self.cache_dir, fname)
+        array = np.array(matches, dtype=np.int32).reshape(-1, 2)
+        # write to temporary file first, so readers never see partial files
+        tmp_path = "{}.{}.tmp".format(path, threading.get_ident())
+        with open(tmp_path, "wb") as outf:
+            np.save(outf, array)
+        with self._lock:
+            os.replace(tmp_path, path)
+            self._sizes.pop(fname, None)
+            self._sizes[fname] = getsize(path)
+            self._evict()
+
+    def evict(self):
+        with self._lock:
+            self._evict()
+
+    def _evict(self):
+        total = sum(self._sizes.values())
+        for fname in list(self._sizes):
+            if total <= self.max_bytes:
+                break
+            total -= self._sizes.pop(fname)
+            path = join(self.cache_dir, fname)
+            if exists(path):
+                os.remove(path)
+
+    def clear(self):
+        for fname in list(self._sizes):
+            path = join(self.cache_dir, fname)
+            if exists(path):
+                os.remove(path)
+        self._sizes.clear()
+
+    def __len__(self):
+        return len(self._sizes)
+
+    def nbytes(self):
+        return sum(self._sizes.values())
@@ -0,0 +1,182 @@
+"""
+Coverage and redundancy of sets of patterns, on bitsets of their matches
+"""
+
+import numpy as np
+import pandas as pd
+
+from tredev.annots import Annotations
+from tredev.scores import Scores
+
+
+# number of set bits per byte, where numpy lacks bitwise_count
+_BYTE_COUNTS = np.array([bin(byte).count("1") for byte in range(256)],
+                        dtype=np.uint8)
+
+
+def popcount(words):
+    """
+    Number of set bits in array of uint64 words, summed over the last axis
+    """
+    if hasattr(np, "bitwise_count"):
+        counts = np.bitwise_count(words)
+    else:
+        counts = _BYTE_COUNTS[words.view(np.uint8)]
+    return counts.sum(axis=-1, dtype=np.int64)
+
+
+def to_bitset(positions, n_nodes):
+    """
+    Bitset of node positions as array of uint64 words
+    """
+    bits = np.zeros(-(-n_nodes // 64) * 64, dtype=bool)
+    bits[positions] = True
+    return np.packbits(bits, bitorder="little").view("<u8")
+
+
+class Coverage(object):
+    """
+    Matches of patterns for the same label as bitsets over all nodes
+
+    Every pattern, and every annotation value of the label, is a row of
+    bits, one per node, packed in 64-bit words. Unions, intersections and
+    differences of match sets are bitwise operations on whole rows, and
+    their sizes per annotation value are counts of set bits, so analyses
+    take a few passes over k x n / 64 words for k patterns and n nodes.
+    """
+
+    def __init__(self, names, node_id_lists, true_values):
+        """
+        Parameters
+        ----------
+        names: sequence of str
+            pattern names
+        node_id_lists: sequence of numpy.ndarray
+            ids of nodes matching each pattern
+        true_values: pandas.Series
+            true values from manual annotation, indexed by node id
+        """
+        self.names = list(names)
+        self.n_nodes = len(true_values)
+        n_words = -(-self.n_nodes // 64)
+        self.bits = np.zeros((len(self.names), n_words), dtype=np.uint64)
+        for i, node_ids in enumerate(node_id_lists):
+            # repeated matches set the same bit, so need no sorting out
+            positions = true_values.index.get_indexer(
+                np.asarray(node_ids, dtype=np.int64))
+            self.bits[i] = to_bitset(positions[positions >= 0], self.n_nodes)
+        # value codes as in Scores.score_pats
+        codes = np.asarray(true_values, dtype=np.int64) - Annotations.ignore
+        self.gold = np.bincount(codes, minlength=4)
+        self.gold_bits = np.stack([to_bitset(np.flatnonzero(codes == code),
+                                             self.n_nodes)
+                                   for code in range(4)])
+
+    def _rows(self, names=None):
+        if names is None:
+            return self.bits
+        return self.bits[[self.names.index(name) for name in names]]
+
+    def counts(self, bits):
+        """
+        Number of set bits per annotation value code, for a bitset or per
+        row of bitsets
+        """
+        bits = np.atleast_2d(bits)
+        return np.column_stack([popcount(bits & self.gold_bits[code])
+                                for code in range(4)])
+
+    def scores(self, bits):
+        """
+        Scores of the nodes in a bitset, or per row of bitsets, as
+        predicted positives (see Scores.stats)
+        """
+        return Scores.stats_from_counts(self.gold, self.counts(bits),
+                                        self.n_nodes)
+
+    def union(self, names=None):
+        """
+        Bitset of nodes matched by any of the named patterns (default all)
+        """
+        return np.bitwise_or.reduce(self._rows(names), axis=0)
+
+    def intersection(self, names=None):
+        """
+        Bitset of nodes matched by all named patterns (default all)
+        """
+        return np.bitwise_and.reduce(self._rows(names), axis=0)
+
+    def overlap(self):
+        """
+        Matrix of the number of nodes matched by both patterns of a pair;
+        the diagonal holds the number of matches of each pattern
+        """
+        n_pats = len(self.names)
+        overlap = np.zeros((n_pats, n_pats), dtype=np.int64)
+        for i in range(n_pats):
+            overlap[i, i:] = popcount(self.bits[i] & self.bits[i:])
+            overlap[i:, i] = overlap[i, i:]
+        return pd.DataFrame(overlap, index=self.names, columns=self.names)
+
+    def unique(self):
+        """
+        Bitsets of nodes matched by each pattern and by no other one
+        """
+        # union of all other patterns from unions of preceding and
+        # following patterns
+        n_words = self.bits.shape[1]
+        zeros = np.zeros((1, n_words), dtype=np.uint64)
+        before = np.bitwise_or.accumulate(np.vstack([zeros, self.bits[:-1]]),
+                                          axis=0)
+        after = np.bitwise_or.accumulate(
+            np.vstack([zeros, self.bits[:0:-1]]), axis=0)[::-1]
+        return self.bits & ~(before | after)
+
+    def table(self):
+        """
+        Per pattern: number of matches, matches and true positives found by
+        no other pattern, precision and recall
+        """
+        unique = self.counts(self.unique())
+        scores = self.scores(self.bits)
+        stats = Scores.stats
+        return pd.DataFrame(
+            {"#matches": popcount(self.bits),
+             "#unique": unique.sum(axis=1),
+             "#unique_pos": unique[:, 3],
+             "precision": scores[:, stats.index("precision")],
+             "recall": scores[:, stats.index("recall")]},
+            index=self.names)
+
+    def greedy(self, recall=90.0):
+        """
+        Small subset of patterns whose union reaches the target recall
+
+        Patterns are added one by one, each time the one matching most
+        true positives not matched yet, breaking ties by fewest new false
+        positives, until the union reaches recall (in percent) or no
+        pattern adds true positives.
+
+        Returns
+        -------
+        pandas.DataFrame
+            scores of the union of the patterns so far, indexed by the
+            name of each added pattern, in order
+        """
+        positive = self.gold_bits[3]
+        negative = self.gold_bits[1]
+        covered = np.zeros(self.bits.shape[1], dtype=np.uint64)
+        n_target = recall / 100.0 * self.gold[3]
+        chosen, rows = [], []
+        while popcount(covered & positive) < n_target:
+            new = self.bits & ~covered
+            gain = popcount(new & positive)
+            cost = popcount(new & negative)
+            best = int(np.lexsort((cost, -gain))[0]) if len(gain) else 0
+            if not len(gain) or gain[best] == 0:
+                break
+            covered = covered | self.bits[best]
+            chosen.append(self.names[best])
+            rows.append(self.scores(covered)[0])
+        return pd.DataFrame(np.reshape(rows, (-1, len(Scores.stats))),
+                            index=chosen, columns=Scores.stats)
@@ -0,0 +1,123 @@
+from glob import glob
+from os.path import basename, join
+
+import numpy as np
+import pandas as pd
+
+
+class Files(pd.DataFrame):
+    """
+    Registry of parse files and the range of tree numbers assigned to them
+
+    Tree numbers are assigned once, in order of registration, so they stay
+    stable when new files are added later. Tregex numbers trees in sorted
+    file order instead, which differs as soon as a new file sorts before
+    an existing one (see tregex_tree_map).
+    """
+
+    fields = ["first_tree", "n_trees"]
+
+    def __init__(self, *args, **kwargs):
+        if kwargs.get("columns") is None:
+            kwargs["columns"] = self.fields
+        pd.DataFrame.__init__(self, *args, **kwargs)
+
+    @classmethod
+    def count_trees(cls, fname):
+        # one tree per line, as in Nodes.from_parses
+        with open(fname, encoding="utf-8") as inf:
+            return sum(1 for line in inf)
+
+    @classmethod
+    def from_parse_dir(cls, parse_dir):
+        """
+        Register all files in parse_dir in sorted order, like
+        Nodes.from_parses
+        """
+        files = cls()
+        fnames = sorted(glob(join(parse_dir, "*")))
+        files.add_files(fnames, [cls.count_trees(fname) for fname in fnames])
+        return files
+
+    def total_trees(self):
+        if not len(self):
+            return 0
+        return int((self["first_tree"] + self["n_trees"]).max()) - 1
+
+    def add_files(self, fnames, tree_counts, first_tree=None):
+        """
+        Register files with given numbers of trees, numbering their trees
+        consecutively from first_tree (by default after all registered
+        trees)
+        """
+        if first_tree is None:
+            first_tree = self.total_trees() + 1
+        for fname, n_trees in zip(fnames, tree_counts):
+            name = basename(fname)
+            if name in self.index:
+                raise ValueError("file '{}' already registered".format(name))
+            self.loc[name] = first_tree, n_trees
+            first_tree += n_trees
+
+    def read_trees(self, parse_dir, tree_ns):
+        """
+        Bracketed trees with the given registered tree numbers, as lines
+        of their parse files in parse_dir, in the order of tree_ns
+
+        Only the files holding some of the trees are read, each up to its
+        last requested tree, and trees are not parsed.
+        """
+        tree_ns = np.asarray(tree_ns, dtype=np.int64)
+        files = self.sort_values("first_tree")
+        first_trees = files["first_tree"].values.astype(np.int64)
+        file_ns = np.searchsorted(first_trees, tree_ns, side="right") - 1
+        trees = {}
+        for file_n in np.unique(file_ns).tolist():
+            first_tree = int(first_trees[file_n])
+            line_ns = set((tree_ns[file_ns == file_n] - first_tree).tolist())
+            last = max(line_ns)
+            with open(join(parse_dir, files.index[file_n]),
+                      encoding="utf-8") as inf:
+                for line_n, line in enumerate(inf):
+                    if line_n in line_ns:
+                        trees[first_tree + line_n] = line.strip()
+                    if line_n == last:
+                        break
+        return [trees[tree_n] for tree_n in tree_ns.tolist()]
+
+    def new_files(self, parse_dir):
+        """
+        Files in parse_dir that are not registered yet, in sorted order
+        """
+        return [fname for fname in sorted(glob(join(parse_dir, "*")))
+                if basename(fname) not in self.index]
+
+    def tregex_tree_map(self, parse_dir):
+        """
+        Map from tree numbers assigned by Tregex on parse_dir to registered
+        tree numbers
+
+        Returns
+        -------
+        numpy.ndarray or None
+            array m with m[tregex_tree_n] = tree_n, or 0 for trees in
+            unregistered files; None if both numberings are identical
+        """
+        fnames = sorted(glob(join(parse_dir, "*")))
+        names = [basename(fname) for fname in fnames]
+        if names == self.index.tolist():
+            # registered in sorted order, like Nodes.from_parses
+            if (self["first_tree"].values ==
+                    np.cumsum(self["n_trees"].values) -
+                    self["n_trees"].values + 1).all():
+                return None
+
+        ranges = [np.zeros(1, dtype=np.int64)]
+        for fname, name in zip(fnames, names):
+            if name in self.index:
+                first_tree, n_trees = map(int, self.loc[name, self.fields])
+                ranges.append(np.arange(first_tree, first_tree + n_trees))
+            else:
+                ranges.append(np.zeros(self.count_trees(fname),
+                                       dtype=np.int64))
+        return np.concatenate(ranges)
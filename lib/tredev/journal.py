@@ -0,0 +1,153 @@
+"""
+Append-only journal of annotation changes
+
+Every change made through the Annotations setters is appended as a fixed
+size binary record (node id, label code, value), so saving a session costs
+O(changes) instead of rewriting the whole annotation matrix. Records are
+flushed and fsynced in batches; a crash loses at most the records of the
+last unsynced batch. Replaying the journal on top of the last saved
+annotation matrix restores the session.
+
+File layout: a header line, a line with the labels as JSON list, followed
+by records.
+"""
+
+import json
+import os
+import time
+from os.path import exists, getsize
+
+import numpy as np
+
+
+class Journal(object):
+
+    header = b"TREDEV-JOURNAL 1\n"
+    record_dtype = np.dtype([("node_id", "<i8"),
+                             ("label", "<i2"),
+                             ("value", "i1")])
+
+    def __init__(self, path, labels, sync_every=8, sync_secs=1.0):
+        """
+        Open journal for appending, creating it if needed
+
+        Parameters
+        ----------
+        path: str
+            journal file
+        labels: sequence
+            annotation labels, in the order of the annotation columns
+        sync_every: int
+            fsync after this many records
+        sync_secs: float
+            fsync when a record is added this many seconds after the
+            previous sync
+        """
+        self.path = path
+        self.labels = [str(label) for label in labels]
+        self.label_codes = dict((label, code)
+                                for code, label in enumerate(self.labels))
+        self.sync_every = sync_every
+        self.sync_secs = sync_secs
+
+        if exists(path) and getsize(path):
+            file_labels, records, end = self._read(path)
+            if file_labels != self.labels:
+                raise ValueError(
+                    "journal {} has labels {}, expected {}".format(
+                        path, file_labels, self.labels))
+            self.n_records = len(records)
+            # drop an incomplete last record, so appended records stay
+            # aligned
+            os.truncate(path, end)
+            self.outf = open(path, "ab")
+        else:
+            self.n_records = 0
+            self.outf = open(path, "wb")
+            self._write_header()
+        self.unsynced = 0
+        self.last_sync = time.time()
+
+    def _write_header(self):
+        self.outf.write(self.header)
+        self.outf.write(json.dumps(self.labels).encode("utf-8") + b"\n")
+        self.sync()
+
+    def __len__(self):
+        return self.n_records
+
+    def record(self, node_id, label, value):
+        record = np.array([(node_id, self.label_codes[str(label)], value)],
+                          dtype=self.record_dtype)
+        self.outf.write(record.tobytes())
+        self.n_records += 1
+        self.unsynced += 1
+        if (self.unsynced >= self.sync_every or
+                time.time() - self.last_sync >= self.sync_secs):
+            self.sync()
+
+    def record_many(self, node_ids, label, values):
+        """
+        Append records of many cells of label at once, then sync
+        """
+        records = np.empty(len(node_ids), dtype=self.record_dtype)
+        records["node_id"] = node_ids
+        records["label"] = self.label_codes[str(label)]
+        records["value"] = values
+        self.outf.write(records.tobytes())
+        self.n_records += len(records)
+        self.sync()
+
+    def sync(self):
+        self.outf.flush()
+        os.fsync(self.outf.fileno())
+        self.unsynced = 0
+        self.last_sync = time.time()
+
+    def reset(self):
+        """
+        Remove all records, e.g. after compacting them into the annotation
+        matrix
+        """
+        self.outf.close()
+        self.outf = open(self.path, "wb")
+        self._write_header()
+        self.n_records = 0
+
+    def close(self):
+        if not self.outf.closed:
+            self.sync()
+            self.outf.close()
+
+    @classmethod
+    def read(cls, path):
+        """
+        Read labels and records array from journal file
+
+        An incomplete last record, written during a crash, is ignored.
+        """
+        labels, records, end = cls._read(path)
+        return labels, records
+
+    @classmethod
+    def _read(cls, path):
+        # labels, records and file offset after the last complete record
+        with open(path, "rb") as inf:
+            if inf.readline() != cls.header:
+                raise ValueError("{} is not a journal file".format(path))
+            labels = json.loads(inf.readline().decode("utf-8"))
+            start = inf.tell()
+            data = inf.read()
+        itemsize = cls.record_dtype.itemsize
+        size = len(data) // itemsize * itemsize
+        records = np.frombuffer(data[:size], dtype=cls.record_dtype)
+        return labels, records, start + size
+
+    def replay(self, annots):
+        """
+        Apply all records in journal to annotations, in order
+        """
+        labels, records = self.read(self.path)
+        for node_id, label_code, value in records.tolist():
+            annots.set_value(node_id, labels[label_code], value)
+        return len(records)
@@ -0,0 +1,465 @@
+"""
+Native in-process tree pattern engine
+
+Implements the subset of Tregex syntax used in practice directly on the
+Nodes table, without Java or subprocesses:
+
+- node descriptions: labels, label alternatives (NN|NNS), regular
+  expressions (/^NN/), the wildcard __ and negated descriptions (!NP)
+- relations: < (parent of), > (child of), << (dominates),
+  >> (dominated by), $ (sister of), .. (precedes), ,, (follows)
+- boolean grouping: implicit or explicit (&) conjunction, disjunction (|),
+  negation (!), optional relations (?), brackets [...] and parenthesized
+  sub-patterns (...)
+- node names (NP=name) are accepted but ignored
+
+Other syntax raises UnsupportedPattern, so callers can fall back to
+tregex.sh. Every sub-pattern is evaluated as a boolean mask over all nodes
+of the corpus at once, using NumPy operations on arrays derived from the
+preorder layout of the Nodes table.
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+from tredev.nodes import CompactNodes, tree_spans
+from tredev import timing
+
+
+class UnsupportedPattern(ValueError):
+    pass
+
+
+class TreeIndex(object):
+    """
+    Array representation of all nodes, in preorder
+
+    Attributes
+    ----------
+    labels: numpy.ndarray
+        node labels
+    tree_n: numpy.ndarray
+        tree number per node (1-based)
+    node_n: numpy.ndarray
+        node number per node within its tree (1-based, preorder)
+    parent: numpy.ndarray
+        position of parent node, or -1 for root nodes
+    last: numpy.ndarray
+        position of last descendant (the node itself for terminals)
+    left, right: numpy.ndarray
+        token span of node as [left, right) offsets in a global token
+        sequence
+    """
+
+    def __init__(self, nodes):
+        if isinstance(nodes, CompactNodes):
+            node_ids = nodes.node_ids
+            self.labels = nodes.labels
+            self.parent = nodes.parent.astype(np.int64)
+        else:
+            node_ids = nodes.index.values
+            self.labels = nodes["label"].values.astype(object)
+            self.parent = pd.Index(node_ids).get_indexer(
+                nodes["parent"].values)
+        self.tree_n, self.node_n = nodes.get_tree_nodes(node_ids)
+        root, self.last, self.left, self.right = tree_spans(self.parent)
+        self._tree_pos = np.unique(self.tree_n, return_inverse=True)[1]
+        self._n_trees = self._tree_pos.max(initial=-1) + 1
+        self._label_codes = None
+
+    def __len__(self):
+        return len(self.labels)
+
+    def subset(self, trees):
+        """
+        Index restricted to the nodes of the given sorted tree numbers
+        
+        Tree and node numbers are kept, so matches need no remapping.
+        """
+        starts = np.searchsorted(self.tree_n, trees, side="left")
+        ends = np.searchsorted(self.tree_n, trees, side="right")
+        sizes = ends - starts
+        # positions of all selected nodes, tree by tree
+        sel = (np.arange(sizes.sum()) + 
+               np.repeat(starts - np.cumsum(sizes) + sizes, sizes))
+        new_pos = np.full(len(self), -1, dtype=np.int64)
+        new_pos[sel] = np.arange(len(sel))
+        
+        index = self.__class__.__new__(self.__class__)
+        index.labels = self.labels[sel]
+        index.tree_n = self.tree_n[sel]
+        index.node_n = self.node_n[sel]
+        parent = self.parent[sel]
+        index.parent = np.where(parent >= 0, new_pos[parent], -1)
+        index.last = new_pos[self.last[sel]]
+        # token offsets are only compared within trees
+        index.left = self.left[sel]
+        index.right = self.right[sel]
+        index._tree_pos = np.repeat(np.arange(len(trees)), sizes)
+        index._n_trees = len(trees)
+        index._label_codes = None
+        return index
+
+    def label_mask(self, pred):
+        """
+        Boolean mask of nodes whose label satisfies predicate pred,
+        evaluated once per distinct label
+        """
+        if self._label_codes is None:
+            self._label_vocab, self._label_codes = np.unique(
+                self.labels, return_inverse=True)
+        vocab_mask = np.fromiter((pred(label) for label in self._label_vocab),
+                                 dtype=bool, count=len(self._label_vocab))
+        return vocab_mask[self._label_codes]
+
+    def any_child(self, mask):
+        result = np.zeros(len(self), dtype=bool)
+        result[self.parent[mask & (self.parent >= 0)]] = True
+        return result
+
+    def any_parent(self, mask):
+        has_parent = self.parent >= 0
+        result = np.zeros(len(self), dtype=bool)
+        result[has_parent] = mask[self.parent[has_parent]]
+        return result
+
+    def any_descendant(self, mask):
+        counts = np.concatenate(([0], np.cumsum(mask)))
+        return counts[self.last + 1] - counts[np.arange(len(self)) + 1] > 0
+
+    def any_ancestor(self, mask):
+        # each matching node covers the positions of its descendants
+        sel = np.flatnonzero(mask)
+        diff = np.zeros(len(self) + 1, dtype=np.int64)
+        np.add.at(diff, sel + 1, 1)
+        np.add.at(diff, self.last[sel] + 1, -1)
+        return np.cumsum(diff[:-1]) > 0
+
+    def any_sister(self, mask):
+        has_parent = self.parent >= 0
+        counts = np.bincount(self.parent[mask & has_parent],
+                             minlength=len(self))
+        result = np.zeros(len(self), dtype=bool)
+        result[has_parent] = (counts[self.parent[has_parent]] -
+                              mask[has_parent]) > 0
+        return result
+
+    def any_following(self, mask):
+        # node precedes some node in mask: its right edge is not after the
+        # latest left edge of mask nodes in the same tree
+        latest = np.full(self._n_trees, -1, dtype=np.int64)
+        np.maximum.at(latest, self._tree_pos[mask], self.left[mask])
+        return self.right <= latest[self._tree_pos]
+
+    def any_preceding(self, mask):
+        earliest = np.full(self._n_trees, np.iinfo(np.int64).max,
+                           dtype=np.int64)
+        np.minimum.at(earliest, self._tree_pos[mask], self.right[mask])
+        return earliest[self._tree_pos] <= self.left
+
+    def to_pairs(self, mask):
+        """
+        Convert mask to list of (tree_n, node_n) tuples
+        """
+        sel = np.flatnonzero(mask)
+        return list(zip(self.tree_n[sel].tolist(), self.node_n[sel].tolist()))
+
+
+# ----------------------------------------------------------------------------
+# Pattern syntax
+# ----------------------------------------------------------------------------
+
+_token_re = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<regex>/(?:[^/\\]|\\.)*/)
+  | (?P<wildcard>__)
+  | (?P<rel>(?:<<|>>|<|>)(?:-?\d+|[-,:#+=.])?|\$(?:\+\+|--|\.\.|,,|[-+])?
+            |\.\.|,,|\.|,|==)
+  | (?P<punct>[()\[\]!|&?=])
+  | (?P<ident>[^\s()\[\]/|@!#%&=?<>~$.,:;{}]+)
+  | (?P<other>.)
+""", re.VERBOSE)
+
+
+_relations = {
+    "<": TreeIndex.any_child,
+    ">": TreeIndex.any_parent,
+    "<<": TreeIndex.any_descendant,
+    ">>": TreeIndex.any_ancestor,
+    "$": TreeIndex.any_sister,
+    "..": TreeIndex.any_following,
+    ",,": TreeIndex.any_preceding,
+}
+
+
+def _tokenize(pattern):
+    tokens = []
+    for m in _token_re.finditer(pattern):
+        kind = m.lastgroup
+        if kind == "space":
+            continue
+        if kind == "other":
+            raise UnsupportedPattern(
+                "unsupported symbol {!r} in pattern {!r}".format(
+                    m.group(), pattern))
+        tokens.append((kind, m.group()))
+    return tokens
+
+
+class _Parser(object):
+    """
+    Recursive descent parser producing a nested tuple expression
+    """
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.tokens = _tokenize(pattern)
+        self.i = 0
+
+    def peek(self, offset=0):
+        try:
+            return self.tokens[self.i + offset]
+        except IndexError:
+            return (None, None)
+
+    def next(self):
+        token = self.peek()
+        self.i += 1
+        return token
+
+    def expect(self, value):
+        kind, token = self.next()
+        if token != value:
+            self.error("expected {!r}, found {!r}".format(value, token))
+
+    def error(self, msg):
+        raise UnsupportedPattern("{} in pattern {!r}".format(msg,
+                                                             self.pattern))
+
+    def parse(self):
+        expr = self.sub_node()
+        if self.peek() != (None, None):
+            self.error("unexpected {!r}".format(self.peek()[1]))
+        return expr
+
+    def sub_node(self):
+        if self.peek() == ("punct", "("):
+            self.next()
+            node = self.sub_node()
+            self.expect(")")
+        else:
+            node = self.description()
+        if self.at_relation():
+            node = ("and", node, self.rel_disj())
+        return node
+
+    def at_relation(self):
+        kind, token = self.peek()
+        return kind == "rel" or token in ("!", "?", "[")
+
+    def rel_disj(self):
+        terms = [self.rel_conj()]
+        while self.peek() == ("punct", "|"):
+            self.next()
+            terms.append(self.rel_conj())
+        return terms[0] if len(terms) == 1 else ("or",) + tuple(terms)
+
+    def rel_conj(self):
+        terms = [self.mod_relation()]
+        while True:
+            if self.peek() == ("punct", "&"):
+                self.next()
+            elif not self.at_relation():
+                break
+            terms.append(self.mod_relation())
+        return terms[0] if len(terms) == 1 else ("and",) + tuple(terms)
+
+    def mod_relation(self):
+        kind, token = self.peek()
+        if token == "!":
+            self.next()
+            return ("not", self.mod_relation())
+        if token == "?":
+            # optional relations only affect named nodes, never whether the
+            # root node matches
+            self.next()
+            self.mod_relation()
+            return ("true",)
+        if token == "[":
+            self.next()
+            expr = self.rel_disj()
+            self.expect("]")
+            return expr
+        if kind != "rel":
+            self.error("expected relation, found {!r}".format(token))
+        self.next()
+        if token not in _relations:
+            self.error("unsupported relation {!r}".format(token))
+        if self.peek() == ("punct", "("):
+            self.next()
+            target = self.sub_node()
+            self.expect(")")
+        else:
+            target = self.description()
+        return ("rel", token, target)
+
+    def description(self):
+        negated = False
+        while self.peek() == ("punct", "!"):
+            self.next()
+            negated = not negated
+
+        atoms = [self.atom()]
+        while (self.peek() == ("punct", "|") and
+               self.peek(1)[0] in ("ident", "regex", "wildcard")):
+            self.next()
+            atoms.append(self.atom())
+
+        if self.peek() == ("punct", "="):
+            # node name: irrelevant for matching
+            self.next()
+            if self.next()[0] != "ident":
+                self.error("invalid node name")
+
+        expr = ("label", tuple(atoms))
+        return ("not", expr) if negated else expr
+
+    def atom(self):
+        kind, token = self.next()
+        if kind == "ident":
+            return ("eq", token)
+        if kind == "regex":
+            try:
+                return ("re", re.compile(token[1:-1]))
+            except re.error as err:
+                self.error("invalid regular expression {!r} ({})".format(
+                    token, err))
+        if kind == "wildcard":
+            return ("any",)
+        self.error("expected node description, found {!r}".format(token))
+
+
+def _label_pred(atoms):
+    exact = set(atom[1] for atom in atoms if atom[0] == "eq")
+    regexes = [atom[1] for atom in atoms if atom[0] == "re"]
+    wildcard = any(atom[0] == "any" for atom in atoms)
+
+    def pred(label):
+        return (wildcard or label in exact or
+                any(regex.search(label) for regex in regexes))
+    return pred
+
+
+def _evaluate(expr, index, memo=None):
+    # memo maps shared sub-expressions to their mask, or None until 
+    # evaluated
+    if memo is not None and memo.get(expr) is not None:
+        return memo[expr]
+    mask = _evaluate_op(expr, index, memo)
+    if memo is not None and expr in memo:
+        memo[expr] = mask
+    return mask
+
+
+def _evaluate_op(expr, index, memo):
+    op = expr[0]
+    if op == "and":
+        mask = _evaluate(expr[1], index, memo)
+        for sub_expr in expr[2:]:
+            mask = mask & _evaluate(sub_expr, index, memo)
+        return mask
+    if op == "or":
+        mask = _evaluate(expr[1], index, memo)
+        for sub_expr in expr[2:]:
+            mask = mask | _evaluate(sub_expr, index, memo)
+        return mask
+    if op == "not":
+        return ~_evaluate(expr[1], index, memo)
+    if op == "true":
+        return np.ones(len(index), dtype=bool)
+    if op == "label":
+        return index.label_mask(_label_pred(expr[1]))
+    if op == "rel":
+        return _relations[expr[1]](index, _evaluate(expr[2], index, memo))
+    raise ValueError("invalid expression {!r}".format(expr))
+
+
+def _sub_expressions(expr):
+    yield expr
+    op = expr[0]
+    if op in ("and", "or", "not"):
+        for sub_expr in expr[1:]:
+            for sub in _sub_expressions(sub_expr):
+                yield sub
+    elif op == "rel":
+        for sub in _sub_expressions(expr[2]):
+            yield sub
+
+
+def compile_pattern(pattern):
+    """
+    Compile tree regular expression to expression tuple
+
+    Raises UnsupportedPattern if pattern uses syntax not implemented by the
+    native engine
+    """
+    return _Parser(pattern).parse()
+
+
+@timing.timed("native.get_matches")
+def get_matches(pattern, index):
+    """
+    Get nodes matching pattern
+
+    Parameters
+    ----------
+    pattern: str
+        tree regular expression
+    index: TreeIndex
+        nodes to match against
+
+    Returns
+    -------
+    list of (tree_n, node_n) tuples, in the same order as tredev.tregex.get_matches
+    """
+    return index.to_pairs(_evaluate(compile_pattern(pattern), index))
+
+
+@timing.timed("native.get_batch_matches")
+def get_batch_matches(patterns, index):
+    """
+    Get nodes matching each of several patterns in a single pass
+    
+    Sub-expressions occurring more than once, e.g. the same label or
+    relation in many variants of a pattern, are evaluated only once.
+    
+    Parameters
+    ----------
+    patterns: sequence of str
+        tree regular expressions
+    index: TreeIndex
+        nodes to match against
+        
+    Returns
+    -------
+    dict mapping patterns to lists of (tree_n, node_n) tuples, like 
+    get_matches; patterns with unsupported syntax are left out
+    """
+    exprs = {}
+    for pattern in patterns:
+        try:
+            exprs[pattern] = compile_pattern(pattern)
+        except UnsupportedPattern:
+            pass
+        
+    counts = {}
+    for expr in exprs.values():
+        for sub_expr in _sub_expressions(expr):
+            counts[sub_expr] = counts.get(sub_expr, 0) + 1
+    memo = dict((sub_expr, None) for sub_expr, count in counts.items()
+                if count > 1)
+    
+    return dict((pattern, index.to_pairs(_evaluate(expr, index, memo)))
+                for pattern, expr in exprs.items())
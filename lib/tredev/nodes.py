@@ -1,16 +1,241 @@
+import pickle
+import sys
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
 from glob import glob
 from os.path import join
 from collections import namedtuple
 
+import numpy as np
 import pandas as pd
 
+from tredev import timing
 
 
+def tree_spans(parent):
+    """
+    Compute spans of nodes in preorder from positions of their parents
+    
+    Parameters
+    ----------
+    parent: numpy.ndarray
+        position of parent node, or -1 for root nodes
+        
+    Returns
+    -------
+    root: position of root node
+    last: position of last descendant (the node itself for terminals)
+    start, end: token span as [start, end) offsets in the sequence of all
+        terminals
+    """
+    parent = np.asarray(parent, dtype=np.int64)
+    n = len(parent)
+    positions = np.arange(n)
+    
+    # in preorder, the root of a node is the closest root node before it
+    roots = np.flatnonzero(parent < 0)
+    root = roots[np.searchsorted(roots, positions, side="right") - 1]
+    
+    depth = np.zeros(n, dtype=np.int64)
+    ancestor = parent.copy()
+    active = ancestor >= 0
+    while active.any():
+        depth[active] += 1
+        ancestor[active] = parent[ancestor[active]]
+        active &= ancestor >= 0
+    
+    # propagate position of last descendant bottom-up, one level at a time
+    last = positions.copy()
+    for level in range(depth.max(initial=0), 0, -1):
+        sel = np.flatnonzero(depth == level)
+        np.maximum.at(last, parent[sel], last[sel])
+        
+    is_term = last == positions
+    n_terms = np.cumsum(is_term)
+    end = n_terms[last]
+    start = n_terms - is_term
+    return root, last, start, end
+
+
+def parse_file(fname):
+    """
+    Parse all trees in file into compact arrays
+    
+    Returns
+    -------
+    label_codes: numpy.ndarray
+        code of each node's label in vocab
+    vocab: list
+        distinct labels in file
+    parent: numpy.ndarray
+        position of parent node within file, or -1 for root nodes
+    tree_sizes: numpy.ndarray
+        number of nodes per tree (one tree per line)
+    """
+    label_codes = array("i")
+    parent = array("q")
+    tree_sizes = array("q")
+    vocab = {}
+    
+    for tree in open(fname, encoding="utf-8"):
+        tree_start = len(parent)
+        # positions of non-terminals on path from root node up to current
+        # node
+        path = []
+        
+        for substr in tree.split():
+            pos = len(parent)
+            # root node has no parent
+            parent.append(path[-1] if path else -1)
+            label = substr.strip("()")
+            label_codes.append(vocab.setdefault(label, len(vocab)))
+            
+            if substr.startswith("("):
+                # non-terminal: push onto path stack
+                path.append(pos)
+            else:
+                # terminal: pop non-terminals from path stack, depending on
+                # the number of closing brackets
+                path = path[:-substr.count(")")]
+                
+        tree_sizes.append(len(parent) - tree_start)
+                
+    return (np.array(label_codes, dtype=np.int32), list(vocab), 
+            np.array(parent, dtype=np.int64), 
+            np.array(tree_sizes, dtype=np.int64))
+
+
+def read_parses(parse_dir, n_jobs=1, verbose=False):
+    """
+    Read all parse trees in parse_dir, see read_files
+    
+    Comments
+    --------
+    Files are read in sorted order, so trees are numbered exactly as by 
+    Tregex. The array of trees per file is not returned.
+    """
+    # sort files, because order of files listed may differ depending on OS
+    fnames = sorted(glob(join(parse_dir, "*")))
+    return read_files(fnames, n_jobs, verbose)[:4]
+
+
+def read_files(fnames, n_jobs=1, verbose=False):
+    """
+    Read all parse trees in given files
+    
+    Parameters
+    ----------
+    fnames: list
+        files containing parse trees
+    n_jobs: int
+        number of processes parsing files in parallel
+    verbose: bool
+        print progress and throughput
+        
+    Returns
+    -------
+    label_codes: numpy.ndarray
+        code of each node's label in label_vocab
+    label_vocab: numpy.ndarray
+        distinct labels
+    parent: numpy.ndarray
+        position of parent node, or -1 for root nodes
+    tree_sizes: numpy.ndarray
+        number of nodes per tree
+    file_sizes: numpy.ndarray
+        number of trees per file
+        
+    Comments
+    --------
+    Files are parsed independently (in a process pool if n_jobs > 1) and
+    their arrays are merged chunk by chunk in the given file order.
+    """
+    vocab = {}
+    chunks = []
+    n_nodes = n_trees = 0
+    start_time = last_report = time.time()
+    
+    if n_jobs == 1:
+        results = map(parse_file, fnames)
+    else:
+        executor = ProcessPoolExecutor(n_jobs)
+        results = executor.map(parse_file, fnames, 
+                               chunksize=max(1, len(fnames) // (n_jobs * 16)))
+    
+    try:
+        for i, (codes, file_vocab, parent, tree_sizes) in enumerate(results):
+            # map file-local label codes and parent positions to global ones
+            mapping = np.array([vocab.setdefault(label, len(vocab)) 
+                                for label in file_vocab], dtype=np.int32)
+            parent[parent >= 0] += n_nodes
+            chunks.append((mapping[codes], parent, tree_sizes, 
+                           np.array([len(tree_sizes)], dtype=np.int64)))
+            n_nodes += len(codes)
+            n_trees += len(tree_sizes)
+            
+            if verbose and (time.time() - last_report >= 1 or 
+                            i + 1 == len(fnames)):
+                last_report = time.time()
+                secs = last_report - start_time
+                print("# parsed {}/{} files, {} trees, {} nodes "
+                      "({:.0f} nodes/s)".format(i + 1, len(fnames), n_trees, 
+                                                n_nodes, 
+                                                n_nodes / max(secs, 1e-9)))
+    finally:
+        if n_jobs != 1:
+            executor.shutdown()
+        
+    label_vocab = np.empty(len(vocab), dtype=object)
+    label_vocab[list(vocab.values())] = list(vocab)
+    
+    if not chunks:
+        return (np.zeros(0, dtype=np.int32), label_vocab,
+                np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64),
+                np.zeros(0, dtype=np.int64))
+    
+    label_codes, parent, tree_sizes, file_sizes = (
+        np.concatenate(arrays) for arrays in zip(*chunks))
+    return label_codes, label_vocab, parent, tree_sizes, file_sizes
+
+
+def get_tree_offsets(tree_sizes, first_tree=1, first_node=0):
+    """
+    Number of nodes before each tree, for consecutive trees with given 
+    numbers of nodes, numbered as by Tregex from tree number first_tree on
+    and preceded by first_node nodes; trees before first_tree are empty
+    """
+    tree_sizes = np.asarray(tree_sizes, dtype=np.int64)
+    return np.concatenate((np.full(first_tree - 1, first_node, dtype=np.int64),
+                           first_node + np.cumsum(tree_sizes) - tree_sizes))
+
+
+# node ids of sessions saved before consecutive node ids were introduced
+# were tree_n * LEGACY_NODE_OFFSET + node_n, which collide for trees with 
+# LEGACY_NODE_OFFSET or more nodes
+LEGACY_NODE_OFFSET = 10 ** 3
+
+
+def has_legacy_ids(index):
+    """
+    True if index holds legacy node ids: consecutive node ids always start
+    at 1, legacy ones at LEGACY_NODE_OFFSET + 1
+    """
+    return len(index) > 0 and index[0] != 1
+
         
 class Nodes(pd.DataFrame):
-    NODE_OFFSET = 10 ** 3
+    # Node ids number the nodes of all trees consecutively from 1 on, trees
+    # in order and nodes in preorder, so node node_n of tree tree_n has id
+    # tree_offsets[tree_n - 1] + node_n, where tree_offsets holds the number
+    # of nodes before each tree. Trees are only appended, so ids of existing
+    # nodes never change.
+    _metadata = ["tree_offsets"]
+    tree_offsets = None
     
     fields = ["node_id", "label", "parent", "children"]
+    # precomputed root node id and token span [start, end) per node
+    span_fields = ["root", "start", "end"]
     # brackets escapes are lower-cased in lemmatized parse trees
     bracket_escapes = { "-LRB-": "(", "-RRB-": ")",
                         "-LSB-": "[", "-RSB-": "]",
@@ -20,16 +245,68 @@ class Nodes(pd.DataFrame):
                         "-lcb-": "{", "-rcb-": "}" }
     Node = namedtuple("Node", fields)
     
-    @classmethod
-    def get_node_id(cls, tree_n, node_n):
-        return tree_n * cls.NODE_OFFSET + node_n 
+    # lazily built array of all tokens, indexed by span offsets
+    _tokens = None
+    
+    def get_node_id(self, tree_n, node_n):
+        return int(self.tree_offsets[tree_n - 1] + node_n)
+    
+    def get_node_ids(self, matches):
+        """
+        Convert sequence of (tree_n, node_n) pairs to array of node ids
+        """
+        pairs = np.array(matches, dtype=np.int64).reshape(-1, 2)
+        return self.tree_offsets[pairs[:, 0] - 1] + pairs[:, 1]
+    
+    def get_tree_nodes(self, node_ids):
+        """
+        Convert node ids to arrays of tree numbers and node numbers
+        """
+        node_ids = np.asarray(node_ids, dtype=np.int64)
+        # the last of several trees with the same offset is the non-empty one
+        tree_n = np.searchsorted(self.tree_offsets, node_ids - 1, 
+                                 side="right")
+        return tree_n, node_ids - self.tree_offsets[tree_n - 1]
+    
+    def has_spans(self):
+        return all(field in self.columns for field in self.span_fields)
+    
+    def add_spans(self):
+        """
+        Add precomputed root node id and token span columns, e.g. to nodes
+        of sessions saved before these were introduced
+        """
+        node_ids = self.index.values
+        parent = self.index.get_indexer(self["parent"].values)
+        root, last, start, end = tree_spans(parent)
+        self["root"] = node_ids[root]
+        self["start"] = start
+        self["end"] = end
+        self._tokens = None
+        
+    @property
+    def tokens(self):
+        """
+        Unescaped tokens of all trees, such that the tokens of a node are 
+        tokens[start:end]
+        """
+        if self._tokens is None:
+            is_term = self["children"].map(len).values == 0
+            self._tokens = np.array(
+                [self.unescape_brackets(label) 
+                 for label in self["label"].values[is_term]], dtype=object)
+        return self._tokens
     
     def get_root_node_id(self, node_id):
+        if self.has_spans():
+            return self.at[node_id, "root"]
+        
         node = self.get_node(node_id)
         while node.parent:
             node = self.get_node(node.parent)
         return node.name
     
+    @timing.timed("nodes.get_node")
     def get_node(self, node_id):
         return self.loc[node_id]
     
@@ -51,7 +328,8 @@ class Nodes(pd.DataFrame):
                 subtree += " "
         
             if indent:
-                subtree +=  "\n".join(self.get_subtree(child_id, indent, _level + 1) 
+                subtree +=  "\n".join(self.get_subtree(child_id, indent, 
+                                                       _level + 1) 
                                       for child_id in node.children)
             else:
                 subtree +=  " ".join(self.get_subtree(child_id) 
@@ -59,15 +337,21 @@ class Nodes(pd.DataFrame):
             subtree += ")"  
         return subtree
     
+    @timing.timed("nodes.get_full_tree")
     def get_full_tree(self, node_id, indent=0):
         return self.get_subtree(self.get_root_node_id(node_id), indent) 
     
     def get_substring(self, node_id):
+        if self.has_spans():
+            start, end = self.at[node_id, "start"], self.at[node_id, "end"]
+            return " ".join(self.tokens[start:end])
+        
         node = self.get_node(node_id)
         if not node.children:
             return self.unescape_brackets(node.label)
         
-        return " ".join(self.get_substring(child_id) for child_id in node.children)
+        return " ".join(self.get_substring(child_id) 
+                        for child_id in node.children)
     
     @classmethod    
     def unescape_brackets(cls, label):
@@ -76,54 +360,350 @@ class Nodes(pd.DataFrame):
         """
         return cls.bracket_escapes.get(label, label)
     
+    @timing.timed("nodes.get_sentence")
     def get_sentence(self, node_id):
         return self.get_substring(self.get_root_node_id(node_id))    
     
+    @timing.timed("nodes.get_context")
+    def get_context(self, node_id):
+        """
+        Get left context, substring and right context of node within its
+        sentence
+        """
+        if not self.has_spans():
+            self.add_spans()
+        root_id = self.at[node_id, "root"]
+        return self._get_context(self.at[root_id, "start"], 
+                                 self.at[node_id, "start"], 
+                                 self.at[node_id, "end"], 
+                                 self.at[root_id, "end"])
+    
+    def _get_context(self, sent_start, start, end, sent_end):
+        tokens = self.tokens
+        return (" ".join(tokens[sent_start:start]),
+                " ".join(tokens[start:end]),
+                " ".join(tokens[end:sent_end]))
+    
     @classmethod
-    def from_parses(cls, parse_dir):
-        nodes = []
-        node_id = 0
-        
-        # sort files, because order of files listed may differ 
-        # depending on OS
-        for fname in sorted(glob(join(parse_dir, "*"))):
-            for tree in open(fname, encoding="utf-8"):
-                node_id += cls.NODE_OFFSET
-                cls.parse_tree(tree, nodes, node_id)
-                
-        df = cls(nodes, columns=cls.fields)
+    def from_parses(cls, parse_dir, n_jobs=1, verbose=False):
+        """
+        Read nodes from all parse trees in parse_dir
+        
+        Parameters
+        ----------
+        parse_dir: str
+            directory with files containing parse trees
+        n_jobs: int
+            number of processes parsing files in parallel
+        verbose: bool
+            print progress and throughput
+        """
+        label_codes, label_vocab, parent, tree_sizes = read_parses(
+            parse_dir, n_jobs, verbose)
+        return cls.from_arrays(label_vocab[label_codes], parent, tree_sizes)
+    
+    @classmethod
+    def from_arrays(cls, labels, parent, tree_sizes, first_tree=1, 
+                    first_node=0):
+        """
+        Create nodes from labels and parent positions of nodes in preorder
+        and numbers of nodes per tree, numbering trees from first_tree on
+        and nodes after first_node nodes of preceding trees
+        """
+        node_ids = first_node + 1 + np.arange(len(parent), dtype=np.int64)
+        has_parent = parent >= 0
+        parent_ids = np.where(has_parent, node_ids[np.maximum(parent, 0)], 0)
+        
+        # child lists, in preorder
+        order = np.argsort(parent, kind="stable")
+        child_ids = node_ids[order[has_parent[order]]].tolist()
+        counts = np.bincount(parent[has_parent], minlength=len(node_ids))
+        ends = np.cumsum(counts).tolist()
+        starts = (np.cumsum(counts) - counts).tolist()
+        children = [child_ids[start:end] for start, end in zip(starts, ends)]
+        
+        df = cls(dict(node_id=node_ids, label=list(labels), parent=parent_ids,
+                      children=children), 
+                 columns=cls.fields)
         df.set_index("node_id", inplace=True)
+        df.add_spans()
+        df.tree_offsets = get_tree_offsets(tree_sizes, first_tree, first_node)
         return df    
+    
+    def append_arrays(self, label_codes, label_vocab, parent, tree_sizes,
+                      first_tree):
+        """
+        Return new nodes with trees appended, numbering the new trees from
+        first_tree on (see read_files for arguments)
+        """
+        new = self.from_arrays(label_vocab[label_codes], parent, tree_sizes,
+                               first_tree, len(self))
+        nodes = self.__class__(pd.concat([self, new]))
+        nodes.tree_offsets = np.concatenate(
+            (self.tree_offsets, new.tree_offsets[len(self.tree_offsets):]))
+        nodes.add_spans()
+        return nodes
 
+
+class CompactNodes(object):
+    """
+    Array-backed alternative to Nodes with the same lookup methods
+
+    Nodes are stored by position, in the same order as in Nodes (i.e. trees
+    in sorted file order and nodes in preorder within each tree):
+    
+    - parent: position of parent node, -1 for root nodes
+    - child_offsets, child_index: children of the node at position i are
+      child_index[child_offsets[i]:child_offsets[i+1]] (CSR layout)
+    - label_codes: code of node label in label_vocab
+    - tree_offsets: position of the first node of each tree
+    
+    Node ids are the same as in Nodes, i.e. positions + 1, and are 
+    converted from and to tree and node numbers through tree_offsets.
+    """
+    
+    Node = Nodes.Node
+    # all arrays, including those derived from parent
+    array_fields = ["parent", "label_codes", "tree_offsets", "child_index", 
+                    "child_offsets", "root", "start", "end"]
+    get_node_id = Nodes.get_node_id
+    get_node_ids = Nodes.get_node_ids
+    get_tree_nodes = Nodes.get_tree_nodes
+    unescape_brackets = Nodes.unescape_brackets
+    _get_context = Nodes._get_context
+    
+    def __init__(self, parent, label_codes, label_vocab, tree_offsets):
+        n = len(parent)
+        pos_dtype = np.int32 if n < 2 ** 31 else np.int64
+        self.parent = np.asarray(parent, dtype=pos_dtype)
+        self.label_codes = np.asarray(label_codes, dtype=np.int32)
+        self.label_vocab = np.asarray(label_vocab, dtype=object)
+        self.tree_offsets = np.asarray(tree_offsets, dtype=np.int64)
+        
+        # children in CSR layout: stable sort on parent keeps children in
+        # preorder
+        has_parent = self.parent >= 0
+        order = np.argsort(self.parent, kind="stable")
+        self.child_index = order[has_parent[order]].astype(pos_dtype)
+        counts = np.bincount(self.parent[has_parent], minlength=n)
+        self.child_offsets = np.concatenate(([0], np.cumsum(counts)))
+        root, last, start, end = tree_spans(self.parent)
+        self.root = root.astype(pos_dtype)
+        self.start = start.astype(pos_dtype)
+        self.end = end.astype(pos_dtype)
+        self._index = None
+        self._tokens = None
+        
     @classmethod
-    def parse_tree(cls, tree, nodes, node_id):
-        # stack of Node objects representing path from root node up to current
-        # node
-        path = []
+    def from_columns(cls, columns, label_vocab):
+        """
+        Create from dict with all arrays in array_fields, e.g. memory-mapped
+        arrays, without recomputing derived arrays
+        """
+        nodes = cls.__new__(cls)
+        for name in cls.array_fields:
+            setattr(nodes, name, columns[name])
+        nodes.label_vocab = label_vocab
+        nodes._index = None
+        nodes._tokens = None
+        return nodes
+    
+    def columns(self):
+        """
+        Dict with all arrays in array_fields
+        """
+        return dict((name, getattr(self, name)) for name in self.array_fields)
         
-        for substr in tree.split():
-            node_id += 1
-            
-            try:
-                # try to get parent's id, which is the latest node on the path
-                parent_id = path[-1].node_id
-            except IndexError:
-                # root node has no parent
-                parent_id = 0
-            else:
-                # make current node a child of its parent
-                path[-1].children.append(node_id)
+    def __len__(self):
+        return len(self.parent)
+    
+    @property
+    def labels(self):
+        return self.label_vocab[self.label_codes]
     
-            # create a new (non-)terminal node
-            node = cls.Node(node_id, substr.strip("()"), parent_id, [])
+    @property
+    def node_ids(self):
+        return np.arange(1, len(self) + 1, dtype=np.int64)
+    
+    @property
+    def index(self):
+        """
+        node ids as pandas.Index, like Nodes.index
+        """
+        if self._index is None:
+            self._index = pd.Index(self.node_ids, name="node_id")
+        return self._index
+    
+    def get_position(self, node_id):
+        if not 1 <= node_id <= len(self):
+            raise KeyError(node_id)
+        return int(node_id) - 1
+    
+    def get_positions(self, node_ids):
+        return np.asarray(node_ids, dtype=np.int64) - 1
+    
+    def _node_id(self, pos):
+        return int(pos) + 1
+    
+    def _children(self, pos):
+        return self.child_index[self.child_offsets[pos]:
+                                self.child_offsets[pos + 1]]
+    
+    @timing.timed("nodes.get_node")
+    def get_node(self, node_id):
+        pos = self.get_position(node_id)
+        parent = self.parent[pos]
+        return self.Node(node_id, 
+                         self.label_vocab[self.label_codes[pos]],
+                         self._node_id(parent) if parent >= 0 else 0,
+                         [self._node_id(child) 
+                          for child in self._children(pos)])
+    
+    @property
+    def tokens(self):
+        if self._tokens is None:
+            is_term = np.diff(self.child_offsets) == 0
+            self._tokens = np.array(
+                [self.unescape_brackets(label) 
+                 for label in self.label_vocab[self.label_codes[is_term]]],
+                dtype=object)
+        return self._tokens
+    
+    def get_root_node_id(self, node_id):
+        return self._node_id(self.root[self.get_position(node_id)])
+    
+    def get_subtree(self, node_id, indent=0):
+        return self._subtree(self.get_position(node_id), indent)
+    
+    def _subtree(self, pos, indent=0, _level=0):
+        label = self.label_vocab[self.label_codes[pos]]
+        children = self._children(pos)
+        
+        if not len(children):
+            # terminal node
+            return label
+        
+        # non-terminal node            
+        subtree = _level * indent * " " + "(" + label
+        
+        if indent and len(self._children(children[0])):
+            # indented non-terminal node
+            subtree += "\n"
+        else:
+            # non-indented or pre-terminal node, e.g. "(NN ocean)"
+            subtree += " "
+    
+        if indent:
+            subtree += "\n".join(self._subtree(child, indent, _level + 1) 
+                                 for child in children)
+        else:
+            subtree += " ".join(self._subtree(child) for child in children)
+        return subtree + ")"
+    
+    @timing.timed("nodes.get_full_tree")
+    def get_full_tree(self, node_id, indent=0):
+        return self.get_subtree(self.get_root_node_id(node_id), indent) 
+    
+    def get_substring(self, node_id):
+        pos = self.get_position(node_id)
+        return " ".join(self.tokens[self.start[pos]:self.end[pos]])
+    
+    @timing.timed("nodes.get_sentence")
+    def get_sentence(self, node_id):
+        return self.get_substring(self.get_root_node_id(node_id))
+    
+    @timing.timed("nodes.get_context")
+    def get_context(self, node_id):
+        """
+        Get left context, substring and right context of node within its
+        sentence
+        """
+        pos = self.get_position(node_id)
+        root = self.root[pos]
+        return self._get_context(self.start[root], self.start[pos], 
+                                 self.end[pos], self.end[root])
+    
+    def nbytes(self):
+        """
+        Memory used by arrays and label vocabulary, in bytes
+        """
+        arrays = (self.parent, self.label_codes, self.tree_offsets,
+                  self.child_index, self.child_offsets, self.label_vocab,
+                  self.root, self.start, self.end)
+        return (sum(array.nbytes for array in arrays) +
+                sum(sys.getsizeof(label) for label in self.label_vocab))
+    
+    def to_pickle(self, path):
+        with open(path, "wb") as outf:
+            pickle.dump(self, outf, protocol=pickle.HIGHEST_PROTOCOL)
             
-            if substr.startswith("("):
-                # non-terminal: push onto path stack
-                path.append(node)
-            else:
-                # terminal: pop non-terminals from path stack, depending on the
-                # number of closing brackets
-                closures = substr.count(")")
-                path = path[:-closures]
-                
-            nodes.append(node)  
+    def __getstate__(self):
+        # children and index are derived from parents
+        return (self.parent, self.label_codes, self.label_vocab, 
+                self.tree_offsets)
+    
+    def __setstate__(self, state):
+        self.__init__(*state)
+    
+    def to_nodes(self):
+        """
+        Convert to Nodes DataFrame
+        """
+        node_ids = self.node_ids
+        parent_ids = np.where(self.parent >= 0, node_ids[self.parent], 0)
+        children = [node_ids[self._children(pos)].tolist() 
+                    for pos in range(len(self))]
+        df = Nodes(dict(node_id=node_ids, label=self.labels, 
+                        parent=parent_ids, children=children),
+                   columns=Nodes.fields)
+        df.set_index("node_id", inplace=True)
+        df.add_spans()
+        df.tree_offsets = self.tree_offsets.copy()
+        return df
+    
+    @classmethod
+    def from_nodes(cls, nodes):
+        """
+        Convert from Nodes DataFrame
+        """
+        parent = nodes.index.get_indexer(nodes["parent"].values)
+        label_vocab, label_codes = np.unique(nodes["label"].values.astype(str),
+                                             return_inverse=True)
+        return cls(parent, label_codes, label_vocab.astype(object), 
+                   nodes.tree_offsets)
+    
+    def append_arrays(self, label_codes, label_vocab, parent, tree_sizes,
+                      first_tree):
+        """
+        Return new nodes with trees appended, numbering the new trees from
+        first_tree on (see read_files for arguments)
+        """
+        vocab = dict((label, code) 
+                     for code, label in enumerate(self.label_vocab))
+        mapping = np.array([vocab.setdefault(label, len(vocab)) 
+                            for label in label_vocab], dtype=np.int32)
+        all_vocab = np.empty(len(vocab), dtype=object)
+        all_vocab[list(vocab.values())] = list(vocab)
+        
+        n = len(self)
+        # empty trees, if first_tree skips tree numbers
+        n_skipped = first_tree - 1 - len(self.tree_offsets)
+        tree_offsets = np.concatenate((self.tree_offsets,
+                                       np.full(n_skipped, n, dtype=np.int64),
+                                       n + np.cumsum(tree_sizes) - tree_sizes))
+        parent = np.where(parent >= 0, parent + n, -1)
+        return self.__class__(np.concatenate((self.parent, parent)),
+                              np.concatenate((self.label_codes, 
+                                              mapping[label_codes])),
+                              all_vocab, tree_offsets)
+    
+    @classmethod
+    def from_parses(cls, parse_dir, n_jobs=1, verbose=False):
+        """
+        Read all parse trees in parse_dir, without creating intermediary
+        objects per node (see read_parses)
+        """
+        label_codes, label_vocab, parent, tree_sizes = read_parses(
+            parse_dir, n_jobs, verbose)
+        return cls(parent, label_codes, label_vocab, 
+                   np.cumsum(tree_sizes) - tree_sizes)
@@ -18,6 +18,15 @@ class Patterns(pd.DataFrame):
             self.loc[name] = pattern, label, comment
         else:
             raise ValueError("pattern with name '{}' already exists".format(name))
+
+    def set_pat(self, name, pattern, comment=""):
+        if name not in self.index:
+            raise ValueError("no pattern with name '{}'".format(name))
+        # replace whole columns, as cells of a frame enlarged from empty
+        # may be read-only
+        is_name = self.index == name
+        self["pattern"] = self["pattern"].mask(is_name, pattern)
+        self["comment"] = self["comment"].mask(is_name, comment)
             
     
     
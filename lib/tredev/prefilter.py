@@ -0,0 +1,128 @@
+"""
+Inverted index from node labels to trees, for prefiltering trees before
+matching
+
+Node labels include the terminal words, so the index maps both words and
+syntactic categories to the trees containing them. Literal labels that
+every match of a pattern requires are extracted from the pattern as parsed
+by tredev.native, e.g. "NP > (PP <<in > (NP <<increase))" requires the
+labels NP, PP, in and increase. Only trees containing all of them can
+match, so the pattern has to be matched against those trees only.
+"""
+
+import numpy as np
+
+from tredev.nodes import CompactNodes
+from tredev.native import compile_pattern, UnsupportedPattern
+
+
+class LabelIndex(object):
+    """
+    Sorted tree numbers per label, in CSR layout: the trees containing
+    label l are trees[offsets[c]:offsets[c+1]] with c = codes[l]
+    """
+
+    def __init__(self, label_codes, label_vocab, tree_n):
+        label_codes = np.asarray(label_codes, dtype=np.int64)
+        tree_n = np.asarray(tree_n, dtype=np.int64)
+        n_trees = tree_n.max(initial=0) + 1
+        # unique (label, tree) pairs, sorted by label and then tree
+        keys = np.unique(label_codes * n_trees + tree_n)
+        pair_codes, self.trees = np.divmod(keys, n_trees)
+        counts = np.bincount(pair_codes, minlength=len(label_vocab))
+        self.offsets = np.concatenate(([0], np.cumsum(counts)))
+        self.codes = dict((label, code)
+                          for code, label in enumerate(label_vocab))
+        self.n_trees = len(np.unique(tree_n))
+
+    @classmethod
+    def from_nodes(cls, nodes):
+        """
+        Build index for Nodes or CompactNodes
+        """
+        if isinstance(nodes, CompactNodes):
+            sizes = np.diff(np.append(nodes.tree_offsets, len(nodes)))
+            tree_n = np.repeat(np.arange(1, len(sizes) + 1), sizes)
+            return cls(nodes.label_codes, nodes.label_vocab, tree_n)
+        label_vocab, label_codes = np.unique(nodes["label"].values.astype(str),
+                                             return_inverse=True)
+        return cls(label_codes, label_vocab,
+                   nodes.get_tree_nodes(nodes.index.values)[0])
+
+    def get_trees(self, label):
+        """
+        Sorted numbers of trees containing a node labeled label
+        """
+        code = self.codes.get(label)
+        if code is None:
+            return np.zeros(0, dtype=np.int64)
+        return self.trees[self.offsets[code]:self.offsets[code + 1]]
+
+    def candidate_trees(self, pattern, max_fraction=0.5):
+        """
+        Sorted numbers of trees that may contain matches of pattern
+
+        Returns None if all trees are candidates, if the pattern has no
+        literal labels or unsupported syntax, or if the candidates are
+        more than max_fraction of all trees, so filtering does not pay off
+        """
+        try:
+            clauses = required_labels(pattern)
+        except UnsupportedPattern:
+            return None
+        if not clauses:
+            return None
+        candidates = None
+        # smallest clauses first, to keep intersections small
+        for clause in sorted(clauses, key=lambda clause: sum(
+                len(self.get_trees(label)) for label in clause)):
+            trees = np.unique(np.concatenate(
+                [self.get_trees(label) for label in clause]))
+            candidates = (trees if candidates is None else
+                          np.intersect1d(candidates, trees,
+                                         assume_unique=True))
+            if not len(candidates):
+                break
+        if len(candidates) > max_fraction * self.n_trees:
+            return None
+        return candidates
+
+
+def required_labels(pattern):
+    """
+    Literal labels required by pattern
+
+    Returns
+    -------
+    list of sets of labels: every tree with a match contains at least one
+    label of each set
+
+    Raises UnsupportedPattern if tredev.native cannot parse the pattern
+    """
+    return _requirements(compile_pattern(pattern))
+
+
+def _requirements(expr):
+    op = expr[0]
+    if op == "and":
+        return [clause for sub_expr in expr[1:]
+                for clause in _requirements(sub_expr)]
+    if op == "or":
+        alternatives = [_requirements(sub_expr) for sub_expr in expr[1:]]
+        if not all(alternatives):
+            return []
+        # weaker, but still required: some label of one clause of each
+        # alternative
+        return [set().union(*(min(clauses, key=len)
+                              for clauses in alternatives))]
+    if op == "label":
+        atoms = expr[1]
+        if all(atom[0] == "eq" for atom in atoms):
+            return [set(atom[1] for atom in atoms)]
+        # regular expressions and wildcards may match any label
+        return []
+    if op == "rel":
+        # all relations hold between nodes of the same tree
+        return _requirements(expr[2])
+    # negations and optional relations require nothing
+    return []
@@ -0,0 +1,147 @@
+"""
+Rendering of matches for interactive annotation, ahead of time
+"""
+
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+
+class LRUCache(object):
+    """
+    Thread-safe mapping keeping the max_size most recently used items
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._items
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._items.move_to_end(key)
+            except KeyError:
+                return default
+            return self._items[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+# display of a match: root node id, (left, substring, right) context and
+# indented subtree
+View = namedtuple("View", ["root_id", "context", "subtree"])
+
+
+class MatchRenderer(object):
+    """
+    Renders matches as shown by Tredev.annotate, ahead of time
+
+    prefetch renders given nodes on a background thread while the user is
+    reading the current match, so showing the next ones, or going back,
+    takes a cache lookup. Views of matches and indented full trees, keyed
+    by root node, are kept in LRU caches. Nodes that are not rendered yet
+    are rendered on demand.
+    """
+
+    def __init__(self, nodes, max_size=1000):
+        """
+        Parameters
+        ----------
+        nodes: tredev.nodes.Nodes or tredev.nodes.CompactNodes instance
+            nodes in all parse trees
+        max_size: int, optional
+            maximum number of match views and of full trees cached
+        """
+        self.nodes = nodes
+        self.views = LRUCache(max_size)
+        self.trees = LRUCache(max_size)
+        # node id -> future of node being rendered in the background
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        # build lazily computed tokens before threads share them
+        if hasattr(nodes, "has_spans") and not nodes.has_spans():
+            nodes.add_spans()
+        nodes.tokens
+
+    def view(self, node_id):
+        """
+        View of node, waiting for it if it is being rendered
+        """
+        view = self.views.get(node_id)
+        if view is not None:
+            return view
+        with self._lock:
+            future = self._pending.get(node_id)
+        if future is not None and not future.cancelled():
+            return future.result()
+        return self._render(node_id)
+
+    def context(self, node_id):
+        return self.view(node_id).context
+
+    def subtree(self, node_id):
+        return self.view(node_id).subtree
+
+    def full_tree(self, node_id):
+        root_id = self.view(node_id).root_id
+        tree = self.trees.get(root_id)
+        if tree is None:
+            tree = self.nodes.get_subtree(root_id, indent=2)
+            self.trees.put(root_id, tree)
+        return tree
+
+    def _render(self, node_id):
+        root_id = self.nodes.get_root_node_id(node_id)
+        view = View(root_id, self.nodes.get_context(node_id),
+                    self.nodes.get_subtree(node_id, indent=2))
+        if root_id not in self.trees:
+            self.trees.put(root_id, self.nodes.get_subtree(root_id, indent=2))
+        self.views.put(node_id, view)
+        return view
+
+    def prefetch(self, node_ids):
+        """
+        Render nodes in the background, in the given order
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                1, thread_name_prefix="tredev_render")
+        with self._lock:
+            for node_id in node_ids:
+                if node_id not in self._pending and node_id not in self.views:
+                    self._pending[node_id] = self._executor.submit(
+                        self._prefetch, node_id)
+
+    def _prefetch(self, node_id):
+        try:
+            return self._render(node_id)
+        finally:
+            with self._lock:
+                self._pending.pop(node_id, None)
+
+    def cancel(self):
+        """
+        Drop nodes waiting to be rendered, keeping everything rendered
+        """
+        with self._lock:
+            for future in self._pending.values():
+                future.cancel()
+            self._pending.clear()
@@ -0,0 +1,106 @@
+"""
+Revision history of patterns and their match sets
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class Revisions(pd.DataFrame):
+    """
+    Successive texts of named patterns, numbered from 1 per name
+
+    The match set of a revision is kept in the dict matches, keyed by
+    (name, revision), as a sorted array of node ids in the smallest integer
+    type that holds them. n_nodes is the number of nodes it was matched
+    against (0 if not matched yet): trees added later are not covered.
+    """
+
+    fields = ["name", "revision", "pattern", "label", "comment", "n_nodes",
+              "n_matches"]
+
+    _metadata = ["matches"]
+
+    def __init__(self, *args, **kwargs):
+        if kwargs.get("columns") is None:
+            kwargs["columns"] = self.fields
+        pd.DataFrame.__init__(self, *args, **kwargs)
+        self.matches = {}
+
+    def latest(self, name):
+        """
+        Number of latest revision of named pattern, 0 if none
+        """
+        revisions = self.loc[self["name"] == name, "revision"]
+        return int(revisions.max()) if len(revisions) else 0
+
+    def get_row(self, name, revision=-1):
+        """
+        Row of revision of named pattern; negative revisions count back
+        from the latest, so -1 is the latest and -2 the one before
+        """
+        if revision < 0:
+            revision += self.latest(name) + 1
+        rows = self.index[(self["name"] == name) &
+                          (self["revision"] == revision)]
+        if not len(rows):
+            raise KeyError("no revision {} of pattern '{}'".format(revision,
+                                                                   name))
+        return self.loc[rows[0]]
+
+    def add_revision(self, name, pattern, label, comment=""):
+        """
+        Add a revision of named pattern and return its number
+        """
+        revision = self.latest(name) + 1
+        row_n = self.index.max() + 1 if len(self) else 0
+        self.loc[row_n] = name, revision, pattern, label, comment, 0, 0
+        return revision
+
+    def set_matches(self, name, revision, node_ids, n_nodes):
+        """
+        Store ids of nodes matched by revision of named pattern among
+        n_nodes nodes
+        """
+        row = self.get_row(name, revision)
+        dtype = np.int32 if n_nodes < 2 ** 31 else np.int64
+        node_ids = np.unique(np.asarray(node_ids, dtype=np.int64))
+        self.matches[(name, int(row["revision"]))] = node_ids.astype(dtype)
+        self.loc[row.name, ["n_nodes", "n_matches"]] = n_nodes, len(node_ids)
+
+    def get_matches(self, name, revision=-1):
+        """
+        Ids of nodes matched by revision of named pattern and the number of
+        nodes they were matched against; None if not matched yet
+        """
+        row = self.get_row(name, revision)
+        node_ids = self.matches.get((name, int(row["revision"])))
+        if node_ids is None:
+            return None
+        return node_ids, int(row["n_nodes"])
+
+    def record(self, name, pattern, label, node_ids, n_nodes):
+        """
+        Store matches of named pattern as those of its latest revision,
+        adding a revision if pattern differs from it
+        """
+        revision = self.latest(name)
+        if not revision or self.get_row(name)["pattern"] != pattern:
+            revision = self.add_revision(name, pattern, label)
+        self.set_matches(name, revision, node_ids, n_nodes)
+
+    def drop_pattern(self, name):
+        """
+        Drop all revisions of named pattern
+        """
+        for revision in self.loc[self["name"] == name, "revision"].tolist():
+            self.matches.pop((name, revision), None)
+        self.drop(self.index[self["name"] == name], inplace=True)
+
+    @staticmethod
+    def diff_ids(old_ids, new_ids):
+        """
+        Node ids gained and lost from sorted arrays old_ids to new_ids
+        """
+        return (np.setdiff1d(new_ids, old_ids, assume_unique=True),
+                np.setdiff1d(old_ids, new_ids, assume_unique=True))
@@ -0,0 +1,185 @@
+"""
+Estimation of pattern scores from a sample of trees
+"""
+
+import shutil
+import tempfile
+import weakref
+from os.path import join
+
+import numpy as np
+import pandas as pd
+
+from tredev.scores import Scores
+
+
+def wilson_interval(k, n, z=1.96):
+    """
+    Wilson score interval of proportion k / n in percent, with z = 1.96
+    for 95% confidence; nan if n is 0
+    """
+    k = np.asarray(k, dtype=np.float64)
+    n = np.asarray(n, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p = k / n
+        denom = 1 + z ** 2 / n
+        center = (p + z ** 2 / (2 * n)) / denom
+        half = z * np.sqrt(p * (1 - p) / n + z ** 2 / (4 * n ** 2)) / denom
+    return (center - half) * 100, (center + half) * 100
+
+
+class Sample(object):
+    """
+    Reproducible random sample of trees
+
+    Matches of patterns on the sample are kept in the dict matches. For
+    tregex.sh, the sampled trees are written once to a temporary corpus
+    file, which is removed with the sample.
+    """
+
+    def __init__(self, trees, n_total, fraction=None, seed=None,
+                 stratified=None):
+        """
+        Parameters
+        ----------
+        trees: numpy.ndarray
+            numbers of sampled trees
+        n_total: int
+            number of trees in the corpus
+        fraction, seed, stratified: optional
+            settings the sample was drawn with (see draw)
+        """
+        self.trees = np.unique(np.asarray(trees, dtype=np.int64))
+        self.n_total = n_total
+        self.fraction = fraction
+        self.seed = seed
+        self.stratified = stratified
+        # pattern -> list of (tree_n, node_n) tuples
+        self.matches = {}
+        self.index = None
+        self._node_ids = None
+        self._dir_path = None
+
+    @classmethod
+    def draw(cls, files, fraction=0.1, seed=0, stratified=True):
+        """
+        Draw a sample of trees
+
+        Parameters
+        ----------
+        files: tredev.files.Files instance
+            registry of parse files and their tree numbers
+        fraction: float
+            fraction of trees in sample
+        seed: int
+            seed of random generator, so samples are reproducible
+        stratified: bool
+            sample the same fraction of trees from every parse file,
+            instead of from all trees at once
+        """
+        rng = np.random.RandomState(seed)
+        n_total = files.total_trees()
+        if stratified:
+            trees = [np.zeros(0, dtype=np.int64)]
+            for first_tree, n_trees in zip(files["first_tree"].tolist(),
+                                           files["n_trees"].tolist()):
+                if n_trees:
+                    k = min(n_trees, max(1, int(round(fraction * n_trees))))
+                    trees.append(first_tree +
+                                 rng.choice(n_trees, k, replace=False))
+            trees = np.concatenate(trees)
+        else:
+            k = min(n_total, max(1, int(round(fraction * n_total))))
+            trees = 1 + rng.choice(n_total, k, replace=False)
+        return cls(trees, n_total, fraction, seed, stratified)
+
+    def __len__(self):
+        return len(self.trees)
+
+    def node_ids(self, nodes):
+        """
+        Ids of all nodes in sampled trees
+        """
+        if self._node_ids is None:
+            offsets = np.append(nodes.tree_offsets, len(nodes))
+            starts = offsets[self.trees - 1]
+            sizes = offsets[self.trees] - starts
+            self._node_ids = (np.arange(sizes.sum()) + 1 +
+                              np.repeat(starts - np.cumsum(sizes) + sizes,
+                                        sizes))
+        return self._node_ids
+
+    def corpus_dir(self, files, parse_dir):
+        """
+        Directory with a file of all sampled trees, in order, for Tregex,
+        copied from their parse files in parse_dir (see Files.read_trees)
+        """
+        if self._dir_path is None:
+            dir_path = tempfile.mkdtemp(prefix="tredev_sample_")
+            weakref.finalize(self, shutil.rmtree, dir_path, True)
+            with open(join(dir_path, "trees.txt"), "w",
+                      encoding="utf-8") as outf:
+                for tree in files.read_trees(parse_dir, self.trees):
+                    outf.write(tree + "\n")
+            self._dir_path = dir_path
+        return self._dir_path
+
+
+class Estimates(pd.DataFrame):
+    """
+    95% confidence intervals of precision and recall of patterns scored
+    on a sample of trees, by pattern name
+
+    Intervals are Wilson score intervals, treating annotated nodes as
+    independent; nodes of the same tree are not, so intervals are somewhat
+    optimistic.
+    """
+
+    fields = ["sample_trees", "precision_low", "precision_high",
+              "recall_low", "recall_high"]
+
+    def __init__(self, *args, **kwargs):
+        if kwargs.get("columns") is None:
+            kwargs["columns"] = self.fields
+        pd.DataFrame.__init__(self, *args, **kwargs)
+
+    @classmethod
+    def intervals(cls, scores):
+        """
+        Confidence intervals of precision and recall for a row of scores
+        (see Scores.stats)
+        """
+        stats = dict(zip(Scores.stats, scores))
+        true_pos = stats["#true_pos"]
+        return (wilson_interval(true_pos, true_pos + stats["#false_pos"]) +
+                wilson_interval(true_pos, true_pos + stats["#false_neg"]))
+
+    def add_estimate(self, name, n_trees, scores):
+        """
+        Store intervals of named pattern scored on n_trees sampled trees
+        """
+        self.loc[name] = (n_trees,) + tuple(map(float,
+                                                self.intervals(scores)))
+
+    def formatted(self):
+        """
+        Intervals as strings, for reports
+        """
+        def fmt(low, high):
+            return "[{:.1f}, {:.1f}]".format(low, high)
+
+        return pd.DataFrame(
+            dict(precision_ci=[fmt(*pair) for pair in zip(
+                     self["precision_low"], self["precision_high"])],
+                 recall_ci=[fmt(*pair) for pair in zip(
+                     self["recall_low"], self["recall_high"])]),
+            index=self.index)
+
+    @classmethod
+    def print_intervals(cls, scores, n_trees):
+        prec_low, prec_high, rec_low, rec_high = cls.intervals(scores)
+        print("{:12s} : [{:.2f}, {:.2f}]".format("precision CI", prec_low,
+                                                 prec_high))
+        print("{:12s} : [{:.2f}, {:.2f}]".format("recall CI", rec_low,
+                                                 rec_high))
+        print("* estimated on a sample of {} trees".format(n_trees))
@@ -1,7 +1,8 @@
+import numpy as np
 import pandas as pd
 
-from tredev.nodes import Nodes 
 from tredev.annots import Annotations
+from tredev import timing
 
 
 
@@ -18,7 +19,8 @@ class Scores(pd.DataFrame):
             kwargs["columns"] = self.stats
         pd.DataFrame.__init__(self, *args, **kwargs)
         
-    def score_pat(self, true_values, matches, name=None):
+    @timing.timed("scores.score_pat")
+    def score_pat(self, true_values, node_ids, name=None):
         """
         Evaluate named pattern and store scores
         
@@ -26,57 +28,157 @@ class Scores(pd.DataFrame):
         ----------
         true_values: pandas.Series
             true values from manual annotation
-        matches: list of (tree_n, node_n) tuples
-            nodes matching the pattern
+        node_ids: numpy.ndarray
+            ids of nodes matching the pattern (see Nodes.get_node_ids)
         name : str, optional
             pattern name for storing score
         """
-        is_pos = true_values ==  Annotations.positive
-        is_neg = true_values == Annotations.negative
-        is_unk = true_values == Annotations.unknown
-        is_ign = true_values == Annotations.ignore
+        names = [name] if name else None
+        return tuple(self.score_pats(true_values, [node_ids], names)[0])
+    
+    @timing.timed("scores.score_pats")
+    def score_pats(self, true_values, node_id_lists, names=None):
+        """
+        Evaluate several patterns for the same label at once and store
+        scores
+        
+        Parameters
+        ----------
+        true_values: pandas.Series
+            true values from manual annotation
+        node_id_lists: sequence of numpy.ndarray
+            ids of nodes matching each pattern
+        names : sequence of str, optional
+            pattern names for storing scores
+            
+        Returns
+        -------
+        numpy.ndarray
+            scores with one row per pattern, columns as in Scores.stats
+        """
+        # value codes: ignore = 0, negative = 1, unknown = 2, positive = 3
+        codes = np.asarray(true_values, dtype=np.int64) - Annotations.ignore
+        n_nodes = len(codes)
+        n_pats = len(node_id_lists)
+        pat_ids, positions = self.match_positions(true_values.index, 
+                                                  node_id_lists)
         
-        gold_pos = sum(is_pos)
-        gold_neg = sum(is_neg)
-        gold_unk = sum(is_unk)
-        gold_ign = sum(is_ign)
+        gold = np.bincount(codes, minlength=4)
+        # matched node counts per pattern and value code
+        match = np.bincount(pat_ids * 4 + codes[positions],
+                            minlength=n_pats * 4).reshape(n_pats, 4)
+        scores = self.stats_from_counts(gold, match, n_nodes)
         
-        pred_values = true_values.copy()
-        pred_values[:] = Annotations.negative 
-        for tree_n, node_n in matches:
-            node_id = Nodes.get_node_id(tree_n, node_n)
-            pred_values.loc[node_id] = Annotations.positive
+        if names is not None:
+            self.store(names, scores)
             
-        is_match = pred_values == Annotations.positive
+        return scores
+    
+    @staticmethod
+    def match_positions(index, node_id_lists):
+        """
+        Positions in index of the nodes matched by each pattern
         
-        # predicting positives and predicted negatives (discounting nothing)
-        pred_pos = sum(is_match)
-        pred_neg = sum(~is_match)
-         
-        # true posities, false positives, true negatives and fasle negatives,  
-        # discounting unknown and ignored instances 
-        true_pos = sum(is_pos & is_match)
-        false_pos = sum(is_neg & is_match)
-        true_neg = sum(is_neg & ~is_match)
-        false_neg = sum(is_pos & ~is_match)
+        Returns
+        -------
+        (pat_ids, positions): numpy.ndarray
+            pattern number and node position of every matched node, once 
+            per pattern, sorted by pattern and position; matches of nodes 
+            not in index are dropped
+        """
+        n_nodes = len(index)
+        # convert matches of all patterns to node positions in one go
+        lengths = [len(node_ids) for node_ids in node_id_lists]
+        all_ids = np.concatenate([np.zeros(0, dtype=np.int64)] + 
+                                 [np.asarray(node_ids, dtype=np.int64) 
+                                  for node_ids in node_id_lists])
+        positions = index.get_indexer(all_ids)
+        pat_ids = np.repeat(np.arange(len(node_id_lists)), lengths)
+        found = positions >= 0
+        # count every matched node once per pattern
+        keys = np.unique(pat_ids[found] * n_nodes + positions[found])
+        return np.divmod(keys, n_nodes)
+    
+    @staticmethod
+    def stats_from_counts(gold, match, n_nodes):
+        """
+        Compute scores from counts of annotation values
         
-        prec = (true_pos / (true_pos + false_pos)) * 100
-        rec = (true_pos / (true_pos + false_neg)) * 100
-        f = 2 * ((prec * rec) / (prec + rec))
+        Parameters
+        ----------
+        gold: numpy.ndarray
+            number of nodes per value code (ignore, negative, unknown, 
+            positive)
+        match: numpy.ndarray
+            number of matched nodes per pattern (rows) and value code
+        n_nodes: int
+            total number of nodes
+            
+        Returns
+        -------
+        numpy.ndarray
+            scores with one row per pattern, columns as in Scores.stats
+        """
+        gold = np.asarray(gold, dtype=np.float64)
+        match = np.asarray(match, dtype=np.float64).reshape(-1, 4)
+        n_pats = len(match)
+        gold_ign, gold_neg, gold_unk, gold_pos = gold
+        
+        # predicted positives and predicted negatives (discounting nothing)
+        pred_pos = match.sum(axis=1)
+        pred_neg = n_nodes - pred_pos
+        
+        # true positives, false positives, true negatives and false
+        # negatives, discounting unknown and ignored instances 
+        true_pos = match[:, 3]
+        false_pos = match[:, 1]
+        true_neg = gold_neg - false_pos
+        false_neg = gold_pos - true_pos
+        
+        with np.errstate(divide="ignore", invalid="ignore"):
+            prec = (true_pos / (true_pos + false_pos)) * 100
+            rec = (true_pos / (true_pos + false_neg)) * 100
+            f = 2 * ((prec * rec) / (prec + rec))
         
         # unknown positives and unknown negatives,
         # discounting true, false and ignored instances
-        unk_pos = sum(is_unk & is_match)
-        unk_neg = sum(is_unk & ~is_match)
+        unk_pos = match[:, 2]
+        unk_neg = gold_unk - unk_pos
         
-        scores =  prec, rec, f, pred_pos, pred_neg, gold_pos, gold_neg, gold_unk, gold_ign, true_pos, false_pos, true_neg, false_neg, unk_pos, unk_neg
-        
-        if name:
-            # save score
-            self.loc[name, :] = scores
-            
+        ones = np.ones(n_pats)
+        scores = np.column_stack((prec, rec, f, pred_pos, pred_neg, 
+                                  gold_pos * ones, gold_neg * ones, 
+                                  gold_unk * ones, gold_ign * ones, 
+                                  true_pos, false_pos, true_neg, false_neg,
+                                  unk_pos, unk_neg))
         return scores
     
+    def store(self, names, scores):
+        """
+        Save score rows of named patterns
+        """
+        for name in names:
+            if name not in self.index:
+                self.loc[name, :] = np.nan
+        self.loc[list(names), :] = scores
+    
+    def update_columns(self, names, columns, values):
+        """
+        Overwrite some columns of stored named patterns, one column at a 
+        time, which is faster than store for many patterns
+        
+        Returns False, without changes, if some pattern has no scores
+        """
+        rows = self.index.get_indexer(list(names))
+        if (rows < 0).any():
+            return False
+        for column, column_values in zip(columns, np.asarray(values).T):
+            # replace whole column, as cells may be read-only
+            new = self[column].to_numpy(dtype=np.float64, copy=True)
+            new[rows] = column_values
+            self[column] = new
+        return True
+    
     def print_score(self, scores):
         for name, score in zip(self.columns, scores):
             print("{:12s} : {:.2f}".format(name, score))
@@ -0,0 +1,242 @@
+"""
+Columnar session format
+
+Nodes and annotations are stored as directories of NumPy .npy files, which
+are memory-mapped on loading, so opening a session costs next to nothing
+regardless of corpus size; pages are read from disk only when used.
+
+<path_prefix>_nodes/
+    one .npy file per CompactNodes array, label_vocab.npy with labels
+<path_prefix>_annots/
+    node_ids.npy (all node ids), labels.npy (label names), and the
+    annotated cells as cell_node_ids.npy, cell_labels.npy (label codes)
+    and cell_values.npy; older sessions have a dense int8 node x label
+    matrix values.npy instead
+
+Patterns, scores and the files registry are small and remain pickles.
+Annotation changes since the last full save of the annotation matrix are
+kept in <path_prefix>_annots.journal (see tredev.journal).
+
+Sessions saved with legacy node ids (tree_n * 1000 + node_n) are converted
+to consecutive node ids by migrate, which Tredev.load applies 
+automatically.
+
+Usage to convert an existing pickle session:
+
+    python -m tredev.session <path_prefix> [<parse_dir>]
+    
+where parse_dir is only needed for sessions with legacy node ids.
+"""
+
+import os
+import sys
+from os.path import exists, getmtime, isdir, join
+
+import numpy as np
+import pandas as pd
+
+from tredev.nodes import (Nodes, CompactNodes, LEGACY_NODE_OFFSET, 
+                          get_tree_offsets, has_legacy_ids, read_files)
+from tredev.annots import Annotations, SparseAnnotations
+from tredev.files import Files
+
+
+def _save_array(dir_path, name, array):
+    # write to temporary file first, so a crash never leaves a partial file
+    path = join(dir_path, name + ".npy")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as outf:
+        np.save(outf, np.ascontiguousarray(array))
+    os.replace(tmp_path, path)
+
+
+def _load_array(dir_path, name, mmap_mode="r"):
+    return np.load(join(dir_path, name + ".npy"), mmap_mode=mmap_mode)
+
+
+def is_columnar(path_prefix):
+    """
+    True if the session at path_prefix was last saved in columnar format
+    """
+    labels_path = join(path_prefix + "_annots", "labels.npy")
+    if not (isdir(path_prefix + "_nodes") and exists(labels_path)):
+        return False
+    pickle_path = path_prefix + "_annots.pkl"
+    return (not exists(pickle_path) or
+            getmtime(labels_path) >= getmtime(pickle_path))
+
+
+def save_nodes(nodes, path_prefix):
+    """
+    Save Nodes or CompactNodes as CompactNodes arrays
+    """
+    if isinstance(nodes, Nodes):
+        nodes = CompactNodes.from_nodes(nodes)
+    dir_path = path_prefix + "_nodes"
+    os.makedirs(dir_path, exist_ok=True)
+    for name, array in nodes.columns().items():
+        _save_array(dir_path, name, array)
+    _save_array(dir_path, "label_vocab",
+                np.array(nodes.label_vocab.tolist(), dtype=str))
+
+
+def load_nodes(path_prefix, mmap_mode="r"):
+    """
+    Load CompactNodes with memory-mapped arrays
+    """
+    dir_path = path_prefix + "_nodes"
+    columns = dict((name, _load_array(dir_path, name, mmap_mode))
+                   for name in CompactNodes.array_fields)
+    label_vocab = np.load(join(dir_path, "label_vocab.npy")).astype(object)
+    return CompactNodes.from_columns(columns, label_vocab)
+
+
+def save_annots(annots, path_prefix):
+    """
+    Save Annotations or SparseAnnotations as annotated cells
+    """
+    if isinstance(annots, Annotations):
+        annots = SparseAnnotations.from_frame(annots)
+    dir_path = path_prefix + "_annots"
+    os.makedirs(dir_path, exist_ok=True)
+    _save_array(dir_path, "node_ids", annots.index.values.astype(np.int64))
+    for name, array in zip(["cell_node_ids", "cell_labels", "cell_values"],
+                           annots.arrays()):
+        _save_array(dir_path, name, array)
+    # labels last: its modification time marks a complete save
+    _save_array(dir_path, "labels",
+                np.array([str(label) for label in annots.columns], dtype=str))
+    dense_path = join(dir_path, "values.npy")
+    if exists(dense_path):
+        os.remove(dense_path)
+
+
+def load_annots(path_prefix, mmap_mode="r"):
+    """
+    Load SparseAnnotations, with a memory-mapped index of node ids
+    
+    Dense annotations of older sessions are converted.
+    """
+    dir_path = path_prefix + "_annots"
+    node_ids = _load_array(dir_path, "node_ids", mmap_mode)
+    labels = np.load(join(dir_path, "labels.npy")).tolist()
+    index = pd.Index(node_ids, name="node_id", copy=False)
+    if exists(join(dir_path, "values.npy")):
+        values = _load_array(dir_path, "values", mmap_mode)
+        return SparseAnnotations.from_frame(
+            Annotations(values, index=index, columns=labels, copy=False))
+    return SparseAnnotations.from_arrays(
+        index, labels, *[np.load(join(dir_path, name + ".npy"))
+                         for name in ("cell_node_ids", "cell_labels",
+                                      "cell_values")])
+
+
+def migrate(nodes, annots, parse_dir, files=None):
+    """
+    Convert nodes and annotations with legacy node ids to consecutive node
+    ids (see tredev.nodes.Nodes)
+    
+    Parameters
+    ----------
+    nodes: tredev.nodes.Nodes or tredev.nodes.CompactNodes instance
+        nodes with legacy node ids
+    annots: tredev.annots.SparseAnnotations or tredev.annots.Annotations 
+            instance
+        annotations with legacy node ids
+    parse_dir: str
+        directory with the parse files of the session
+    files: tredev.files.Files instance, optional
+        registry of parse files; by default all files in parse_dir
+    
+    Returns
+    -------
+    nodes, annots: nodes of the same class and SparseAnnotations
+    
+    Comments
+    --------
+    Legacy ids are not decoded: ids of nodes beyond the first 
+    LEGACY_NODE_OFFSET - 1 nodes of a tree collide with ids of the next 
+    tree. Instead, nodes are read again from the parse files, which must 
+    not have changed. Dense annotations are mapped by position. Other
+    annotations are mapped through the legacy ids of the rebuilt nodes;
+    annotations of legacy ids shared by several nodes are ambiguous, so 
+    they are dropped and reported.
+    """
+    if files is None:
+        files = Files.from_parse_dir(parse_dir)
+    fnames = [join(parse_dir, name) 
+              for name in files.sort_values("first_tree").index]
+    label_codes, label_vocab, parent, tree_sizes = read_files(fnames)[:4]
+    labels = label_vocab[label_codes]
+    old_labels = np.asarray(nodes["label"].values if isinstance(nodes, Nodes)
+                            else nodes.labels, dtype=object)
+    if len(old_labels) != len(labels) or (old_labels != labels).any():
+        raise ValueError("parse files in {} differ from the nodes of the "
+                         "session, cannot convert legacy node ids".format(
+                             parse_dir))
+    tree_offsets = get_tree_offsets(tree_sizes)
+    if isinstance(nodes, Nodes):
+        nodes = Nodes.from_arrays(labels, parent, tree_sizes)
+    else:
+        nodes = CompactNodes(parent, label_codes, label_vocab, tree_offsets)
+    
+    # legacy id of every node
+    tree_n = np.repeat(np.arange(1, len(tree_sizes) + 1), tree_sizes)
+    node_n = (np.arange(len(labels)) + 1 - 
+              np.repeat(tree_offsets, tree_sizes))
+    legacy_ids = tree_n * LEGACY_NODE_OFFSET + node_n
+    
+    if (isinstance(annots, Annotations) and 
+            np.array_equal(annots.index.values, legacy_ids)):
+        # rows are in node order
+        return nodes, SparseAnnotations.from_frame(Annotations(
+            np.asarray(annots.values), index=nodes.index, 
+            columns=annots.columns))
+    if isinstance(annots, Annotations):
+        annots = SparseAnnotations.from_frame(annots)
+    if annots.index.duplicated().any():
+        print("*** legacy node ids of trees with {} or more nodes are "
+              "ambiguous ***".format(LEGACY_NODE_OFFSET))
+    node_ids, label_codes, values = annots.arrays()
+    shared = pd.Index(legacy_ids).duplicated(keep=False)
+    positions = pd.Index(legacy_ids[~shared]).get_indexer(node_ids)
+    found = positions >= 0
+    if not found.all():
+        print("*** dropped {} annotations of ambiguous or unknown legacy "
+              "node ids ***".format(int((~found).sum())))
+    new_ids = np.asarray(nodes.index.values, dtype=np.int64)[~shared]
+    return nodes, SparseAnnotations.from_arrays(
+        nodes.index, annots.columns, new_ids[positions[found]], 
+        label_codes[found], values[found])
+
+
+def convert(path_prefix, parse_dir=None):
+    """
+    Convert nodes and annotations of a pickle session to columnar format
+
+    The pickle files are left in place, but are no longer read once the
+    columnar files exist. Sessions with legacy node ids also need the 
+    directory of their parse files (see migrate).
+    """
+    for suffix in "_nodes.pkl", "_annots.pkl":
+        if not exists(path_prefix + suffix):
+            raise IOError("no pickle session file " + path_prefix + suffix)
+    nodes = pd.read_pickle(path_prefix + "_nodes.pkl")
+    annots = pd.read_pickle(path_prefix + "_annots.pkl")
+    if has_legacy_ids(annots.index):
+        if parse_dir is None:
+            raise ValueError("session has legacy node ids, give the "
+                             "directory of its parse files")
+        files_path = path_prefix + "_files.pkl"
+        nodes, annots = migrate(nodes, annots, parse_dir, 
+                                pd.read_pickle(files_path) 
+                                if exists(files_path) else None)
+    save_nodes(nodes, path_prefix)
+    save_annots(annots, path_prefix)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3):
+        print(__doc__)
+        sys.exit(1)
+    convert(*sys.argv[1:])
@@ -0,0 +1,131 @@
+"""
+Lightweight timing of pipeline stages
+
+Instrumented functions (Tregex calls, output parsing, scoring, node
+lookups, saving and loading) record call counts, wall time and bytes of
+subprocess output per stage, but only while timing is enabled; otherwise
+each call costs a single flag test. Enable with enable() or by setting the
+environment variable TREDEV_TIMING=1, inspect with Tredev.stats() or
+get_stats(), and export records as they happen with add_hook, e.g.
+
+    import logging
+    timing.add_hook(lambda stage, secs, nbytes: logging.debug(
+        "%s %.6f %d", stage, secs, nbytes))
+"""
+
+import functools
+import os
+import threading
+import time
+
+import pandas as pd
+
+
+enabled = bool(os.environ.get("TREDEV_TIMING"))
+
+# stage -> [calls, seconds, bytes]
+_stats = {}
+_hooks = []
+_lock = threading.Lock()
+
+
+def enable(flag=True):
+    global enabled
+    enabled = flag
+
+
+def disable():
+    enable(False)
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+
+
+def add_hook(func):
+    """
+    Call func(stage, secs, nbytes) for every recorded call
+    """
+    _hooks.append(func)
+
+
+def remove_hook(func):
+    _hooks.remove(func)
+
+
+def record(stage, secs, nbytes=0):
+    with _lock:
+        entry = _stats.setdefault(stage, [0, 0.0, 0])
+        entry[0] += 1
+        entry[1] += secs
+        entry[2] += nbytes
+    for hook in _hooks:
+        hook(stage, secs, nbytes)
+
+
+def text_nbytes(text, encoding="utf-8"):
+    """
+    Number of bytes of decoded subprocess output text
+    """
+    return len(text.encode(encoding))
+
+
+def timed(stage, nbytes=None):
+    """
+    Decorator recording calls of a function as stage
+
+    nbytes, if given, is applied to the result to obtain the number of
+    bytes to record, e.g. text_nbytes for decoded subprocess output
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            record(stage, time.perf_counter() - start,
+                   nbytes(result) if nbytes else 0)
+            return result
+        return wrapper
+    return decorator
+
+
+class stage(object):
+    """
+    Context manager recording the enclosed block as stage
+
+    The block is recorded only if timing was enabled on entering it, so
+    enabling or disabling timing inside the block has no effect on it
+    """
+
+    __slots__ = ("name", "active", "start")
+
+    def __init__(self, name):
+        self.name = name
+        self.active = False
+
+    def __enter__(self):
+        self.active = enabled
+        if self.active:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.active:
+            record(self.name, time.perf_counter() - self.start)
+
+
+def get_stats():
+    """
+    Recorded stages as DataFrame with calls, total seconds, seconds per
+    call and bytes, slowest stage first
+    """
+    with _lock:
+        rows = dict((name, list(entry)) for name, entry in _stats.items())
+    stats = pd.DataFrame.from_dict(rows, orient="index",
+                                   columns=["calls", "secs", "bytes"])
+    stats.insert(2, "secs/call", stats["secs"] / stats["calls"])
+    stats.index.name = "stage"
+    return stats.sort_values("secs", ascending=False)
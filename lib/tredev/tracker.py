@@ -0,0 +1,279 @@
+"""
+Incremental maintenance of pattern scores while annotating
+"""
+
+import threading
+
+import numpy as np
+
+from tredev.annots import Annotations
+from tredev.scores import Scores
+
+
+class _LabelCounts(object):
+    # counts of all tracked patterns for one label
+
+    def __init__(self, gold, n_nodes):
+        # number of nodes per value code (see Scores.score_pats)
+        self.gold = gold
+        self.n_nodes = n_nodes
+        self.names = []
+        # sorted node ids matched by each pattern
+        self.node_ids = []
+        # number of matched nodes per pattern (rows) and value code
+        self.match = np.zeros((0, 4), dtype=np.int64)
+
+
+class ScoreTracker(object):
+    """
+    Keeps the scores of named patterns current while annotations change
+
+    For every tracked pattern, the node ids of its matches are kept as a
+    sorted array, together with the number of matched nodes per annotation
+    value; per label, the number of all nodes per value is kept. Attached
+    to annotations, the tracker is notified of every changed cell and
+    updates these counts for the patterns of the changed label only, each
+    by a binary search in its match array; cells changed in bulk take one
+    vectorized search per pattern. Scores are then recomputed from the 
+    counts, without matching or scanning annotations, and stored for the
+    patterns matching a changed node only; for the other patterns of the
+    label, only the columns derived from the changed counts of all nodes
+    are stored.
+    
+    Tracking the patterns of a label can be deferred until the label is
+    first changed or its scores are needed (see defer).
+    
+    Methods are thread-safe, so patterns can be scored in the background
+    while annotating: attached annotations change cells while holding the
+    lock of the tracker.
+    """
+
+    def __init__(self, scores, lock=None):
+        """
+        Parameters
+        ----------
+        scores: tredev.scores.Scores instance
+            scores to keep current
+        lock: threading.RLock, optional
+            lock guarding scores, by default a new one
+        """
+        self.scores = scores
+        self.annots = None
+        # label -> _LabelCounts
+        self._labels = {}
+        # pattern name -> label
+        self._names = {}
+        # label -> callable starting to track its patterns
+        self._deferred = {}
+        self._lock = threading.RLock() if lock is None else lock
+
+    def attach(self, annots):
+        """
+        Follow changes of annots, e.g. after nodes were appended
+
+        Nodes added since the counts were taken are unknown and not
+        matched by tracked patterns until these are scored again.
+        """
+        if self.annots is not None and self.annots is not annots:
+            self.annots.listener = None
+            self.annots.bulk_listener = None
+            self.annots.lock = Annotations.lock
+        self.annots = annots
+        annots.listener = self.update
+        annots.bulk_listener = self.update_many
+        # cells change and counts follow in one step, so scoring never
+        # sees a change that is yet to be counted
+        annots.lock = self._lock
+        code = Annotations.unknown - Annotations.ignore
+        for counts in self._labels.values():
+            counts.gold[code] += len(annots) - counts.n_nodes
+            counts.n_nodes = len(annots)
+
+    def __contains__(self, name):
+        return name in self._names
+
+    def defer(self, label, track):
+        """
+        Call track() to start tracking patterns of label once label is
+        first changed, or activate is called for it
+        
+        track should score the patterns from the current annotations, e.g.
+        through score.
+        """
+        with self._lock:
+            self._deferred[label] = track
+
+    def activate(self, label=None):
+        """
+        Start tracking the deferred patterns of label, or of all labels
+        """
+        with self._lock:
+            labels = list(self._deferred) if label is None else [label]
+            for label in labels:
+                track = self._deferred.pop(label, None)
+                if track is not None:
+                    track()
+
+    def score(self, label, names, node_id_lists):
+        """
+        Score named patterns for label, store their scores and track them
+
+        Parameters
+        ----------
+        label: str
+            targeted label
+        names: sequence of str
+            pattern names
+        node_id_lists: sequence of numpy.ndarray
+            ids of nodes matching each pattern
+
+        Returns
+        -------
+        numpy.ndarray
+            scores with one row per pattern, as Scores.score_pats
+        """
+        with self._lock:
+            return self._score(label, list(names), node_id_lists)
+    
+    def _score(self, label, names, node_id_lists):
+        for name in names:
+            self.untrack(name)
+        true_values = self.annots[label]
+        codes = (np.asarray(true_values, dtype=np.int64) -
+                 Annotations.ignore)
+        counts = self._labels.get(label)
+        if counts is None:
+            counts = self._labels[label] = _LabelCounts(None, 0)
+        # recount, in case annotations were changed while not attached
+        counts.gold = np.bincount(codes, minlength=4)
+        counts.n_nodes = len(codes)
+
+        pat_ids, positions = Scores.match_positions(true_values.index,
+                                                    node_id_lists)
+        match = np.bincount(pat_ids * 4 + codes[positions],
+                            minlength=len(names) * 4).reshape(-1, 4)
+        # positions are sorted per pattern, so node ids are too, provided
+        # the index is sorted as usual
+        node_ids = true_values.index.values[positions]
+        bounds = np.searchsorted(pat_ids, np.arange(len(names) + 1))
+        for i, name in enumerate(names):
+            ids = node_ids[bounds[i]:bounds[i + 1]]
+            if len(ids) > 1 and np.any(ids[1:] < ids[:-1]):
+                ids = np.sort(ids)
+            counts.names.append(name)
+            counts.node_ids.append(ids)
+            self._names[name] = label
+        counts.match = np.vstack([counts.match, match])
+
+        # gold counts changed for the other tracked patterns of label too
+        scores = Scores.stats_from_counts(counts.gold, counts.match,
+                                          counts.n_nodes)
+        Scores.store(self.scores, counts.names, scores)
+        return scores[len(counts.names) - len(names):]
+
+    def untrack(self, name):
+        """
+        Stop tracking named pattern, keeping its last scores
+        """
+        with self._lock:
+            label = self._names.pop(name, None)
+            if label is None:
+                return
+            counts = self._labels[label]
+            i = counts.names.index(name)
+            del counts.names[i]
+            del counts.node_ids[i]
+            counts.match = np.delete(counts.match, i, axis=0)
+
+    def clear(self):
+        with self._lock:
+            self._labels.clear()
+            self._names.clear()
+            self._deferred.clear()
+
+    def update(self, node_id, label, old, new):
+        """
+        Update counts and scores of patterns for label after the value of
+        node_id changed from old to new
+        """
+        with self._lock:
+            self._update(node_id, label, old, new)
+
+    def _update(self, node_id, label, old, new):
+        if label in self._deferred:
+            # scored from annotations that already hold the change
+            self.activate(label)
+            return
+        counts = self._labels.get(label)
+        if counts is None:
+            return
+        old = int(old) - Annotations.ignore
+        new = int(new) - Annotations.ignore
+        counts.gold[old] -= 1
+        counts.gold[new] += 1
+        changed = []
+        for i, ids in enumerate(counts.node_ids):
+            j = np.searchsorted(ids, node_id)
+            if j < len(ids) and ids[j] == node_id:
+                counts.match[i, old] -= 1
+                counts.match[i, new] += 1
+                changed.append(i)
+        self._store(counts, changed, [old, new])
+
+    def update_many(self, node_ids, label, old, new):
+        """
+        Update counts and scores of patterns for label after the values of
+        many nodes changed, from array old to array new
+        """
+        with self._lock:
+            if label in self._deferred:
+                self.activate(label)
+                return
+            counts = self._labels.get(label)
+            if counts is None:
+                return
+            node_ids = np.asarray(node_ids, dtype=np.int64)
+            old = np.asarray(old, dtype=np.int64) - Annotations.ignore
+            new = np.asarray(new, dtype=np.int64) - Annotations.ignore
+            gold_change = (np.bincount(new, minlength=4) -
+                           np.bincount(old, minlength=4))
+            counts.gold += gold_change
+            changed = []
+            for i, ids in enumerate(counts.node_ids):
+                if not len(ids):
+                    continue
+                j = np.minimum(np.searchsorted(ids, node_ids), len(ids) - 1)
+                hit = ids[j] == node_ids
+                if hit.any():
+                    counts.match[i] += (np.bincount(new[hit], minlength=4) -
+                                        np.bincount(old[hit], minlength=4))
+                    changed.append(i)
+            self._store(counts, changed, np.flatnonzero(gold_change))
+
+    # score columns derived from the number of all nodes per value code
+    _gold_columns = {
+        0: ["#gold_ign"],
+        1: ["#gold_neg", "#true_neg"],
+        2: ["#gold_unk", "#unk_neg"],
+        3: ["#gold_pos", "#false_neg", "recall", "f_score"],
+    }
+
+    def _store(self, counts, changed, gold_codes):
+        # store scores of the patterns at positions changed in counts, and
+        # the columns depending on the gold counts of codes for all others
+        if not counts.names:
+            return
+        scores = Scores.stats_from_counts(counts.gold, counts.match,
+                                          counts.n_nodes)
+        columns = sorted(set(column for code in set(gold_codes)
+                             for column in self._gold_columns[code]),
+                         key=Scores.stats.index)
+        if columns and not Scores.update_columns(
+                self.scores, counts.names, columns,
+                scores[:, [Scores.stats.index(column)
+                           for column in columns]]):
+            # some patterns lack scores
+            changed = list(range(len(counts.names)))
+        if len(changed):
+            Scores.store(self.scores, [counts.names[i] for i in changed],
+                         scores[changed])
@@ -1,7 +1,19 @@
 
-from subprocess import check_output, Popen, PIPE           
-    
+import os
+import shutil
+import signal
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from glob import glob
+from os.path import abspath, basename, isdir, join
+from subprocess import check_output, CalledProcessError, Popen, PIPE
+
+from tredev import timing
     
+
+@timing.timed("tregex.call_tregex", nbytes=timing.text_nbytes)
 def call_tregex(pattern, file_path, options=["-x"], exec_path="tregex.sh",
                 out_encoding="utf-8"):
 
@@ -9,22 +21,291 @@ def call_tregex(pattern, file_path, options=["-x"], exec_path="tregex.sh",
     return check_output(cmd).decode(out_encoding)
     
 
-def get_matches(pattern, file_path, exec_path="tregex.sh"):
-    output = call_tregex(pattern, file_path, options=['-x'],
-                         exec_path=exec_path)
+@contextmanager
+def linked_dir(fnames):
+    """
+    Temporary directory with symbolic links to given parse files, for 
+    running Tregex on part of a corpus
+    
+    Trees are numbered by Tregex in sorted order of the file names.
+    """
+    dir_path = tempfile.mkdtemp(prefix="tredev_")
+    try:
+        for fname in fnames:
+            os.symlink(abspath(fname), join(dir_path, basename(fname)))
+        yield dir_path
+    finally:
+        shutil.rmtree(dir_path)
+
+
+@contextmanager
+def trees_dir(trees):
+    """
+    Temporary directory with a single file containing the given bracketed
+    trees, one per line, for running Tregex on selected trees
+    """
+    dir_path = tempfile.mkdtemp(prefix="tredev_")
+    try:
+        with open(join(dir_path, "trees.txt"), "w", encoding="utf-8") as outf:
+            for tree in trees:
+                outf.write(tree + "\n")
+        yield dir_path
+    finally:
+        shutil.rmtree(dir_path)
+
+
+@timing.timed("tregex.get_matches")
+def get_matches(pattern, file_path, exec_path="tregex.sh", worker=None,
+                n_shards=1, tree_counts=None):
+    if worker:
+        # persistent worker: trees are already loaded, so file_path and
+        # exec_path are ignored
+        output = worker.call(pattern)
+    elif n_shards > 1 and isdir(file_path):
+        return get_sharded_matches(pattern, file_path, n_shards, exec_path,
+                                   tree_counts)
+    else:
+        output = call_tregex(pattern, file_path, options=['-x'],
+                             exec_path=exec_path)
+    with timing.stage("tregex.parse_matches"):
+        return list(parse_matches(output.split()))
+    
+    # This may be faster, but doesn't preserve order.
+    # return list(set([tuple(map(int, pair.split(":"))) 
+    # for pair in output.split()]))
+
+
+@timing.timed("tregex.get_batch_matches")
+def get_batch_matches(patterns, worker):
+    """
+    Get matches of several patterns from a persistent worker, which 
+    matches them in a single pass over the trees
+    
+    Returns
+    -------
+    list with a list of (tree_n, node_n) tuples per pattern
+    """
+    outputs = worker.call_batch(patterns)
+    with timing.stage("tregex.parse_matches"):
+        return [list(parse_matches(output.split())) for output in outputs]
+
+
+def shard_files(fnames, tree_counts, n_shards):
+    """
+    Split files into at most n_shards runs of consecutive files with about
+    the same number of trees
+    
+    The last shard takes all remaining files, so files without trees 
+    (or a corpus without trees) never add shards.
+    
+    Returns
+    -------
+    list of (fnames, first_tree) tuples, where first_tree is the global 
+    number of the first tree in the shard
+    """
+    total = sum(tree_counts)
+    shards = []
+    shard_fnames = []
+    first_tree = 1
+    n_trees = 0
+    for fname, count in zip(fnames, tree_counts):
+        shard_fnames.append(fname)
+        n_trees += count
+        if (len(shards) < n_shards - 1 and 
+                n_trees * n_shards >= total * (len(shards) + 1)):
+            shards.append((shard_fnames, first_tree))
+            shard_fnames = []
+            first_tree = n_trees + 1
+    if shard_fnames:
+        shards.append((shard_fnames, first_tree))
+    return shards
+
+
+def get_sharded_matches(pattern, parse_dir, n_shards, exec_path="tregex.sh",
+                        tree_counts=None):
+    """
+    Get matches by running one tregex.sh process per shard of parse_dir
+    in parallel
+    
+    Parameters
+    ----------
+    pattern: str
+        tree regular expression
+    parse_dir: str
+        directory with files containing parse trees
+    n_shards: int
+        number of shards, i.e. concurrent Tregex processes
+    exec_path: str
+        tregex.sh executable
+    tree_counts: mapping, optional
+        number of trees per file name (e.g. Files["n_trees"]), to avoid 
+        counting lines; files missing from it are counted
+        
+    Returns
+    -------
+    list of (tree_n, node_n) tuples, identical to those of an unsharded
+    call on parse_dir
+    
+    Comments
+    --------
+    Shards are consecutive files in sorted order, the order in which
+    Tregex numbers trees, so translating shard tree numbers to global ones
+    only takes an offset per shard, and concatenating shards in order 
+    preserves the order of matches.
+    """
+    fnames = sorted(glob(join(parse_dir, "*")))
+    counts = []
+    for fname in fnames:
+        count = (tree_counts.get(basename(fname)) 
+                 if tree_counts is not None else None)
+        if count is None:
+            # one tree per line, as in Nodes.from_parses
+            with open(fname, encoding="utf-8") as inf:
+                count = sum(1 for line in inf)
+        counts.append(int(count))
+        
+    def shard_matches(shard):
+        shard_fnames, first_tree = shard
+        with linked_dir(shard_fnames) as shard_dir:
+            return [(first_tree - 1 + tree_n, node_n) for tree_n, node_n 
+                    in get_matches(pattern, shard_dir, exec_path)]
+    
+    shards = shard_files(fnames, counts, n_shards)
+    if not shards:
+        return []
+    with ThreadPoolExecutor(len(shards)) as executor:
+        results = list(executor.map(shard_matches, shards))
+    return [match for matches in results for match in matches]
+
+
+def parse_matches(pairs):
+    """
+    Generate unique (tree_n, node_n) tuples from "tree:node" strings, in
+    order of first occurrence
+    """
     # FIXME: Only when calling tregex.sh -x through subprocess, output
     # contain duplicates. Why?
     seen = set()
-    matches = []
-    for pair in output.split():
+    for pair in pairs:
         if pair not in seen:
             seen.add(pair)
             tree_n, node_n = map(int, pair.split(":"))
-            matches.append((tree_n, node_n))
-    return matches
-    
-    # This may be faster, but doesn't preserve order.
-    # return list(set([tuple(map(int, pair.split(":"))) 
-    # for pair in output.split()]))
+            yield tree_n, node_n
 
 
+class MatchStream(object):
+    """
+    Matches of a tregex.sh process, collected by a background thread while 
+    Tregex prints them
+    
+    The list matches grows until the process has finished or is cancelled.
+    Iterating over the stream yields matches as soon as they arrive; 
+    result() waits for the complete list.
+    """
+    
+    def __init__(self, pattern, file_path, exec_path="tregex.sh", 
+                 map_matches=None, out_encoding="utf-8"):
+        """
+        Parameters
+        ----------
+        pattern: str
+            tree regular expression
+        file_path: str
+            file or directory with parse trees
+        exec_path: str
+            tregex.sh executable
+        map_matches: callable, optional
+            function applied to each list of new matches, e.g. to map 
+            tree numbers
+        out_encoding: str
+            encoding of Tregex output
+        """
+        self._init([])
+        # own process group, so cancel also kills java started by the 
+        # shell script
+        self.proc = Popen([exec_path, "-x", pattern, file_path], stdout=PIPE,
+                          start_new_session=True)
+        self._done = False
+        self._thread = threading.Thread(target=self._read, 
+                                        args=(map_matches, out_encoding),
+                                        daemon=True)
+        self._thread.start()
+        
+    def _init(self, matches):
+        self.matches = matches
+        self.error = None
+        self.cancelled = False
+        self.proc = None
+        self._done = True
+        self._cond = threading.Condition()
+        
+    @classmethod
+    def from_list(cls, matches):
+        """
+        Stream of matches that are already complete, e.g. cached ones
+        """
+        stream = cls.__new__(cls)
+        stream._init(list(matches))
+        return stream
+    
+    @property
+    def done(self):
+        return self._done
+        
+    def _read(self, map_matches, out_encoding):
+        try:
+            pairs = (pair for line in self.proc.stdout 
+                     for pair in line.decode(out_encoding).split())
+            for match in parse_matches(pairs):
+                new = map_matches([match]) if map_matches else [match]
+                with self._cond:
+                    self.matches.extend(new)
+                    self._cond.notify_all()
+            if self.proc.wait() and not self.cancelled:
+                raise CalledProcessError(self.proc.returncode, self.proc.args)
+        except Exception as err:
+            if not self.cancelled:
+                self.error = err
+        finally:
+            self.proc.stdout.close()
+            self.proc.wait()
+            with self._cond:
+                self._done = True
+                self._cond.notify_all()
+                
+    def wait(self, n):
+        """
+        Wait until match n (0-based) has arrived or the stream is done;
+        return True if it has arrived
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: len(self.matches) > n or self._done)
+            return len(self.matches) > n
+        
+    def result(self):
+        """
+        Wait for and return the complete list of matches
+        """
+        self.wait(float("inf"))
+        if self.error:
+            raise self.error
+        return self.matches
+    
+    def cancel(self):
+        """
+        Kill the Tregex process, keeping the matches read so far
+        """
+        if self.proc is not None and not self._done:
+            self.cancelled = True
+            try:
+                os.killpg(self.proc.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            
+    def __iter__(self):
+        n = 0
+        while self.wait(n):
+            yield self.matches[n]
+            n += 1
+        if self.error:
+            raise self.error
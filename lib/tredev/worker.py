@@ -0,0 +1,202 @@
+"""
+Persistent Tregex worker
+
+A worker is a single long-lived process that loads all parse trees once and
+then answers many pattern queries over a pipe, which avoids paying JVM
+startup and re-reading the parse directory for every pattern.
+
+Protocol: the worker reads one pattern per line from stdin. For every
+pattern it writes matches as "tree_n:node_n" lines to stdout, followed by
+an empty line. A line starting with "ERROR" reports a failed query.
+
+Batch mode: a line "#BATCH n" followed by n pattern lines makes the worker
+match all n patterns in a single pass over the trees, then write one
+answer per pattern, in order, as above.
+"""
+
+import threading
+from subprocess import Popen, PIPE
+
+from tredev import timing
+
+
+class TregexWorkerError(Exception):
+    pass
+
+
+class TregexWorker(object):
+    """
+    Long-lived process answering Tregex queries for one parse directory
+    """
+
+    terminator = ""
+    error_prefix = "ERROR"
+    batch_prefix = "#BATCH "
+
+    def __init__(self, file_path, exec_path="tregex_server.sh", options=[],
+                 max_restarts=3, out_encoding="utf-8"):
+        """
+        Parameters
+        ----------
+        file_path: str
+            directory (or file) with parse trees, loaded once by the worker
+        exec_path: str
+            worker executable, e.g. java/tregex_server.sh
+        options: list
+            extra command line options passed to the worker
+        max_restarts: int
+            maximum number of consecutive restarts after a crash
+        out_encoding: str
+            encoding of the worker's input and output
+        """
+        self.file_path = file_path
+        self.exec_path = exec_path
+        self.options = options
+        self.max_restarts = max_restarts
+        self.out_encoding = out_encoding
+        self.proc = None
+        self.restarts = 0
+        # queries from concurrent threads are answered one at a time
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def is_alive(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def start(self):
+        if not self.is_alive():
+            cmd = [self.exec_path] + self.options + [self.file_path]
+            self.proc = Popen(cmd, stdin=PIPE, stdout=PIPE,
+                              encoding=self.out_encoding,
+                              bufsize=1)
+
+    def stop(self):
+        if self.proc is not None:
+            try:
+                self.proc.stdin.close()
+            except OSError:
+                pass
+            try:
+                self.proc.wait(timeout=5)
+            except Exception:
+                self.proc.kill()
+                self.proc.wait()
+            self.proc = None
+
+    def restart(self):
+        if self.proc is not None:
+            self.proc.kill()
+            self.proc.wait()
+            self.proc = None
+        self.start()
+
+    @timing.timed("worker.call", nbytes=timing.text_nbytes)
+    def call(self, pattern):
+        """
+        Query worker with pattern
+
+        Parameters
+        ----------
+        pattern: str
+            tree regular expression
+
+        Returns
+        -------
+        str
+            matches as whitespace separated "tree_n:node_n" pairs,
+            like the output of "tregex.sh -x"
+
+        Comments
+        --------
+        If the worker has died, it is restarted and the query is repeated,
+        up to max_restarts times in a row.
+        """
+        if "\n" in pattern:
+            raise ValueError("pattern must not contain newlines")
+
+        with self._lock:
+            lines = self._call([pattern])[0]
+        return self._answer(pattern, lines)
+
+    @timing.timed("worker.call_batch",
+                  nbytes=lambda outputs: sum(map(timing.text_nbytes, 
+                                                 outputs)))
+    def call_batch(self, patterns):
+        """
+        Query worker with several patterns, matched in a single pass over
+        the trees
+
+        Parameters
+        ----------
+        patterns: sequence of str
+            tree regular expressions
+
+        Returns
+        -------
+        list of str
+            matches of each pattern, as returned by call
+
+        Comments
+        --------
+        Raises TregexWorkerError for the first pattern that failed.
+        """
+        patterns = list(patterns)
+        if any("\n" in pattern for pattern in patterns):
+            raise ValueError("pattern must not contain newlines")
+        if not patterns:
+            return []
+
+        with self._lock:
+            answers = self._call(
+                ["{}{}".format(self.batch_prefix, len(patterns))] + patterns,
+                len(patterns))
+        return [self._answer(pattern, lines)
+                for pattern, lines in zip(patterns, answers)]
+
+    def _answer(self, pattern, lines):
+        if lines and lines[0].startswith(self.error_prefix):
+            raise TregexWorkerError(
+                "{}: {}".format(pattern, lines[0][len(self.error_prefix):]
+                                .strip()))
+        return "\n".join(lines)
+
+    def _call(self, request, n_answers=1):
+        while True:
+            try:
+                self.start()
+                answers = self._query(request, n_answers)
+                self.restarts = 0
+                return answers
+            except (OSError, EOFError):
+                if self.restarts >= self.max_restarts:
+                    raise TregexWorkerError(
+                        "worker {} crashed {} times in a row".format(
+                            self.exec_path, self.restarts + 1))
+                self.restarts += 1
+                self.restart()
+
+    def _query(self, request, n_answers=1):
+        # send request lines, read n_answers answers of lines each
+        for line in request:
+            self.proc.stdin.write(line + "\n")
+        self.proc.stdin.flush()
+        answers = []
+        lines = []
+        while len(answers) < n_answers:
+            line = self.proc.stdout.readline()
+            if not line:
+                # EOF: worker died before completing its answer
+                raise EOFError
+            line = line.rstrip("\n")
+            if line == self.terminator:
+                answers.append(lines)
+                lines = []
+            else:
+                lines.append(line)
+        return answers
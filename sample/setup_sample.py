@@ -19,8 +19,9 @@ td = Tredev.from_parses(parse_dir, labels)
 path_prefix = "sample"
 
 # save environment data files, which will create
-# 1. sample_nodes.pkl : nodes from all trees found in parse_dir
-# 2. sample_annots.pkl : stores manual annotations (i.e. nodes labeled as positive or negative for a certain label)  
+# 1. sample_nodes/ : nodes from all trees found in parse_dir
+# 2. sample_annots/ : stores manual annotations (i.e. nodes labeled as positive or negative for a certain label)  
 # 3. sample_patterns.pkl : definition of tree regular expressions
 # 4. sample_scores.pkl : scores and other statistics for each pattern
+# 5. sample_files.pkl : parse files and the numbers of their trees
 td.save(path_prefix)
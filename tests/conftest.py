@@ -0,0 +1,61 @@
+import stat
+import sys
+from os.path import abspath, dirname, join
+
+import pytest
+
+ROOT = dirname(dirname(abspath(__file__)))
+
+# as setup_env.sh does
+sys.path.insert(0, join(ROOT, "lib"))
+
+
+@pytest.fixture
+def parse_dir():
+    return join(ROOT, "sample", "parses")
+
+
+@pytest.fixture
+def quiet(monkeypatch):
+    # silence score reports
+    from tredev import Tredev
+    monkeypatch.setattr(Tredev, "report", lambda self, *a, **k: None)
+
+
+# stub tregex.sh -x: a pattern is a node label, matched in the trees of a
+# file, or of the files of a directory in sorted order; FAIL exits with an
+# error and HANG stops after the first match, both after printing it
+TREGEX_STUB = """#!{python}
+import re
+import stat
+import sys
+import time
+from os import listdir
+from os.path import isdir, join
+
+pattern, path = sys.argv[-2:]
+if pattern in ("FAIL", "HANG"):
+    print("1:1", flush=True)
+    if pattern == "FAIL":
+        sys.exit(1)
+    time.sleep(60)
+fnames = ([join(path, name) for name in sorted(listdir(path))]
+          if isdir(path) else [path])
+tree_n = 0
+for fname in fnames:
+    with open(fname, encoding="utf-8") as inf:
+        for line in inf:
+            tree_n += 1
+            labels = re.findall(r"[^\\s()]+", line)
+            for node_n, label in enumerate(labels, 1):
+                if label == pattern:
+                    print("{{}}:{{}}".format(tree_n, node_n))
+"""
+
+
+@pytest.fixture
+def tregex_stub(tmp_path):
+    exec_path = tmp_path / "tregex.sh"
+    exec_path.write_text(TREGEX_STUB.format(python=sys.executable))
+    exec_path.chmod(exec_path.stat().st_mode | stat.S_IEXEC)
+    return str(exec_path)
@@ -0,0 +1,87 @@
+"""
+Record the output of tregex.sh -x over sample/parses for the patterns of
+the native conformance tests (see tests/test_native.py) in
+expected_matches.json
+
+Run with tregex.sh on the PATH after adding patterns to PATTERNS:
+
+    python tests/data/record_tregex.py
+
+Without tregex.sh, reference_matcher.py writes the same file from its own
+predicates; the "source" entry tells which of the two wrote it.
+"""
+
+import json
+import sys
+from os.path import abspath, dirname, join
+
+ROOT = dirname(dirname(dirname(abspath(__file__))))
+sys.path.insert(0, join(ROOT, "lib"))
+
+from tredev.tregex import call_tregex
+
+# patterns the native engine implements, and ones it must hand over to
+# tregex.sh
+PATTERNS = {
+    "supported": [
+        "NP",
+        "NN|NNS",
+        "/^VB/",
+        "NP < NN",
+        "NP !< DT",
+        "VP << NN",
+        "NN > NP",
+        "NN >> VP",
+        "JJ $ NN",
+        "DT .. NN",
+        "NN ,, DT",
+        "NP < (NN $ JJ)",
+        "NP [< NN | < NNS]",
+        "S < (NP < PRP) < VP",
+        "__ < /^[0-9]/",
+        "NP=np < DT",
+        "!NP < NN",
+        "NP ?< DT",
+        "(NP < NN) > VP",
+        "PP < IN << (NP < NNS)",
+    ],
+    "unsupported": [
+        "NP <1 DT",
+        "NP <- NNS",
+        "NP <: PRP",
+        "DT . JJ",
+        "NP $+ VP",
+        "@NP < NN",
+    ],
+}
+
+PARSE_DIR = join(ROOT, "sample", "parses")
+OUT_PATH = join(dirname(abspath(__file__)), "expected_matches.json")
+
+
+def write(outputs, source, path=OUT_PATH):
+    """
+    Write outputs, mapping "supported" and "unsupported" to dicts of
+    patterns and their "tree:node" pairs as printed by tregex.sh -x, one
+    pattern per line, with the name of the program that produced them
+    """
+    with open(path, "w", encoding="utf-8") as outf:
+        outf.write("{\n")
+        outf.write(' "source": {},\n'.format(json.dumps(source)))
+        for i, kind in enumerate(PATTERNS):
+            outf.write(" {}: {{\n".format(json.dumps(kind)))
+            lines = ["  {}: {}".format(json.dumps(pattern),
+                                       json.dumps(" ".join(outputs[kind][
+                                           pattern])))
+                     for pattern in PATTERNS[kind]]
+            outf.write(",\n".join(lines) + "\n")
+            outf.write(" }" + (",\n" if i < len(PATTERNS) - 1 else "\n"))
+        outf.write("}\n")
+
+
+if __name__ == "__main__":
+    write(dict((kind, dict((pattern, 
+                            call_tregex(pattern, PARSE_DIR).split())
+                           for pattern in patterns))
+               for kind, patterns in PATTERNS.items()),
+          source="tregex.sh")
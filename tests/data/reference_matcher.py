@@ -0,0 +1,244 @@
+"""
+Reference matcher for the patterns of the native conformance tests (see
+tests/test_native.py), used to write expected_matches.json where
+tregex.sh is not available
+
+Each pattern is spelled out as a predicate on a single node, evaluated
+by walking the tree, independently of the native engine's indexes. Node
+numbers follow Tregex: nodes and leaves numbered from 1 in preorder,
+trees numbered from 1 across the files of sample/parses in sorted order.
+Run with:
+
+    python tests/data/reference_matcher.py
+
+Once tregex.sh is available, record_tregex.py overwrites the output with
+that of Tregex itself.
+"""
+
+import re
+import sys
+from glob import glob
+from os.path import abspath, dirname, join
+
+sys.path.insert(0, dirname(abspath(__file__)))
+
+from record_tregex import PARSE_DIR, PATTERNS, write
+
+
+class Node(object):
+
+    def __init__(self, label, parent, node_n):
+        self.label = label
+        self.parent = parent
+        self.node_n = node_n
+        self.children = []
+
+
+def read_tree(line):
+    """
+    Nodes of a bracketed tree in preorder, with the leftmost and rightmost
+    leaf positions (left, right) they span
+    """
+    nodes = []
+    path = []
+    is_open = False
+    for token in re.findall(r"\(|\)|[^\s()]+", line):
+        if token == "(":
+            is_open = True
+        elif token == ")":
+            path.pop()
+        else:
+            parent = path[-1] if path else None
+            node = Node(token, parent, len(nodes) + 1)
+            nodes.append(node)
+            if parent:
+                parent.children.append(node)
+            if is_open:
+                path.append(node)
+            is_open = False
+    leaf_n = 0
+    for node in nodes:
+        if not node.children:
+            node.left = node.right = leaf_n
+            leaf_n += 1
+    for node in reversed(nodes):
+        if node.children:
+            node.left = node.children[0].left
+            node.right = node.children[-1].right
+    return nodes
+
+
+def descendants(node):
+    for child in node.children:
+        yield child
+        yield from descendants(child)
+
+
+def ancestors(node):
+    parent = node.parent
+    while parent:
+        yield parent
+        parent = parent.parent
+
+
+def sisters(node):
+    if node.parent is None:
+        return []
+    return [sister for sister in node.parent.children if sister is not node]
+
+
+def label(*labels):
+    return lambda node: node.label in labels
+
+
+def regex(expr):
+    return lambda node: re.search(expr, node.label) is not None
+
+
+def basic_category(category):
+    # @NP: label up to the first - or =, unless it starts with -
+    def test(node):
+        if node.label.startswith("-"):
+            return node.label == category
+        return re.split(r"[-=]", node.label)[0] == category
+    return test
+
+
+def all_of(*tests):
+    return lambda node: all(test(node) for test in tests)
+
+
+def any_of(*tests):
+    return lambda node: any(test(node) for test in tests)
+
+
+def negated(test):
+    return lambda node: not test(node)
+
+
+def parent_of(test):
+    return lambda node: any(test(child) for child in node.children)
+
+
+def child_of(test):
+    return lambda node: node.parent is not None and test(node.parent)
+
+
+def dominates(test):
+    return lambda node: any(test(desc) for desc in descendants(node))
+
+
+def dominated_by(test):
+    return lambda node: any(test(anc) for anc in ancestors(node))
+
+
+def sister_of(test):
+    return lambda node: any(test(sister) for sister in sisters(node))
+
+
+def precedes(test, tree):
+    return lambda node: any(test(other) and node.right < other.left
+                            for other in tree)
+
+
+def follows(test, tree):
+    return lambda node: any(test(other) and other.right < node.left
+                            for other in tree)
+
+
+def immediately_precedes(test, tree):
+    return lambda node: any(test(other) and node.right + 1 == other.left
+                            for other in tree)
+
+
+def first_child(test):
+    return lambda node: bool(node.children) and test(node.children[0])
+
+
+def last_child(test):
+    return lambda node: bool(node.children) and test(node.children[-1])
+
+
+def only_child(test):
+    return lambda node: len(node.children) == 1 and test(node.children[0])
+
+
+def left_sister_of(test):
+    # $+: the immediately following sister matches
+    def check(node):
+        if node.parent is None:
+            return False
+        children = node.parent.children
+        i = children.index(node)
+        return i + 1 < len(children) and test(children[i + 1])
+    return check
+
+
+def predicates(tree):
+    """
+    Node predicates of all patterns in PATTERNS over the nodes of tree
+    """
+    return {
+        "NP": label("NP"),
+        "NN|NNS": label("NN", "NNS"),
+        "/^VB/": regex("^VB"),
+        "NP < NN": all_of(label("NP"), parent_of(label("NN"))),
+        "NP !< DT": all_of(label("NP"), negated(parent_of(label("DT")))),
+        "VP << NN": all_of(label("VP"), dominates(label("NN"))),
+        "NN > NP": all_of(label("NN"), child_of(label("NP"))),
+        "NN >> VP": all_of(label("NN"), dominated_by(label("VP"))),
+        "JJ $ NN": all_of(label("JJ"), sister_of(label("NN"))),
+        "DT .. NN": all_of(label("DT"), precedes(label("NN"), tree)),
+        "NN ,, DT": all_of(label("NN"), follows(label("DT"), tree)),
+        "NP < (NN $ JJ)": all_of(label("NP"), parent_of(
+            all_of(label("NN"), sister_of(label("JJ"))))),
+        "NP [< NN | < NNS]": all_of(label("NP"), any_of(
+            parent_of(label("NN")), parent_of(label("NNS")))),
+        "S < (NP < PRP) < VP": all_of(label("S"), parent_of(
+            all_of(label("NP"), parent_of(label("PRP")))),
+            parent_of(label("VP"))),
+        "__ < /^[0-9]/": parent_of(regex("^[0-9]")),
+        "NP=np < DT": all_of(label("NP"), parent_of(label("DT"))),
+        "!NP < NN": all_of(negated(label("NP")), parent_of(label("NN"))),
+        "NP ?< DT": label("NP"),
+        "(NP < NN) > VP": all_of(label("NP"), parent_of(label("NN")),
+                                 child_of(label("VP"))),
+        "PP < IN << (NP < NNS)": all_of(label("PP"), parent_of(label("IN")),
+                                        dominates(all_of(label("NP"),
+                                            parent_of(label("NNS"))))),
+        "NP <1 DT": all_of(label("NP"), first_child(label("DT"))),
+        "NP <- NNS": all_of(label("NP"), last_child(label("NNS"))),
+        "NP <: PRP": all_of(label("NP"), only_child(label("PRP"))),
+        "DT . JJ": all_of(label("DT"), immediately_precedes(label("JJ"),
+                                                            tree)),
+        "NP $+ VP": all_of(label("NP"), left_sister_of(label("VP"))),
+        "@NP < NN": all_of(basic_category("NP"), parent_of(label("NN"))),
+    }
+
+
+def get_outputs(parse_dir=PARSE_DIR):
+    """
+    "tree:node" pairs of all patterns in PATTERNS, as tregex.sh -x would
+    print them
+    """
+    outputs = dict((kind, dict((pattern, []) for pattern in patterns))
+                   for kind, patterns in PATTERNS.items())
+    tree_n = 0
+    for fname in sorted(glob(join(parse_dir, "*"))):
+        with open(fname, encoding="utf-8") as inf:
+            for line in inf:
+                if not line.strip():
+                    continue
+                tree_n += 1
+                tree = read_tree(line)
+                tests = predicates(tree)
+                for kind, patterns in PATTERNS.items():
+                    for pattern in patterns:
+                        outputs[kind][pattern].extend(
+                            "{}:{}".format(tree_n, node.node_n)
+                            for node in tree if tests[pattern](node))
+    return outputs
+
+
+if __name__ == "__main__":
+    write(get_outputs(), source="reference_matcher.py")
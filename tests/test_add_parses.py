@@ -0,0 +1,88 @@
+import glob
+import shutil
+from os.path import basename, dirname, join
+
+import pytest
+
+import tredev
+from tredev import Tredev
+from tredev.annots import Annotations
+
+# (tree_n, node_n, label, value) of annotations made before adding files
+ANNOTATIONS = [(1, 6, "a", Annotations.positive),
+               (3, 12, "b", Annotations.negative),
+               (20, 3, "a", Annotations.ignore),
+               (40, 2, "b", Annotations.positive)]
+
+
+@pytest.fixture(params=["tregex", "native"])
+def grown(request, parse_dir, tmp_path, tregex_stub, monkeypatch, quiet):
+    # session on all sample files but the first two, which are added later
+    # and sort before all others
+    monkeypatch.setenv("PATH", dirname(tregex_stub), prepend=":")
+    fnames = sorted(glob.glob(join(parse_dir, "*")))
+    corpus = tmp_path / "parses"
+    corpus.mkdir()
+    for fname in fnames[2:]:
+        shutil.copy(fname, str(corpus))
+    session = Tredev.from_parses(str(corpus), ["a", "b"],
+                                 backend=request.param)
+    session.enable_cache(str(tmp_path / "session"))
+    session.add("np", "NP", "a")
+    session.add("nn", "NN", "b")
+    for tree_n, node_n, label, value in ANNOTATIONS:
+        session.annots.set_value(session.nodes.get_node_id(tree_n, node_n),
+                                 label, value)
+    before = dict(
+        node_ids=[session.nodes.get_node_id(tree_n, node_n)
+                  for tree_n, node_n, label, value in ANNOTATIONS],
+        trees=[session.nodes.get_subtree(session.nodes.get_node_id(
+            tree_n, 1)) for tree_n, node_n, label, value in ANNOTATIONS],
+        n_trees=session.files.total_trees(),
+        n_nodes=len(session.nodes))
+    for fname in fnames[:2]:
+        shutil.copy(fname, str(corpus))
+    return session, before, fnames[:2]
+
+
+def test_stable_node_ids(grown):
+    session, before, new_fnames = grown
+    session.add_parses(rescore=False)
+    # new trees are numbered after existing ones
+    assert session.files.loc[[basename(fname) for fname in new_fnames],
+                             "first_tree"].min() == before["n_trees"] + 1
+    assert session.nodes.index[:before["n_nodes"]].tolist() == list(
+        range(1, before["n_nodes"] + 1))
+    for (tree_n, node_n, label, value), node_id, tree in zip(
+            ANNOTATIONS, before["node_ids"], before["trees"]):
+        assert session.nodes.get_node_id(tree_n, node_n) == node_id
+        assert session.nodes.get_subtree(
+            session.nodes.get_node_id(tree_n, 1)) == tree
+        # annotations stay with their nodes
+        assert session.annots.get_value(node_id, label) == value
+    assert len(session.annots) == len(session.nodes)
+
+
+def test_cached_matches_extended(grown, monkeypatch):
+    session, before, new_fnames = grown
+    calls = []
+    get_matches = tredev.get_matches
+
+    def record(pattern, file_path, **kwargs):
+        calls.append(file_path)
+        return get_matches(pattern, file_path, **kwargs)
+
+    monkeypatch.setattr(tredev, "get_matches", record)
+    misses = session.cache_misses
+    session.add_parses()
+    # no pattern is matched again against the full corpus
+    assert session.cache_misses == misses
+    assert session.parse_dir not in calls
+    for pattern in "NP", "NN":
+        cached = session.cache.get(pattern)
+        assert sorted(cached) == sorted(session._find_matches(pattern))
+        assert max(tree_n for tree_n, node_n in cached) > before["n_trees"]
+    scores = session.scores.copy()
+    session.cache = None
+    session.rescore()
+    assert scores.loc[session.scores.index].equals(session.scores)
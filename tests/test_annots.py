@@ -0,0 +1,110 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from tredev.annots import Annotations, SparseAnnotations
+
+LABELS = ["a", "b", "c"]
+INDEX = pd.Index(np.arange(1, 21), name="node_id")
+
+
+def changes(seed=0, n=200):
+    rng = np.random.RandomState(seed)
+    values = [Annotations.positive, Annotations.negative, Annotations.unknown,
+              Annotations.ignore]
+    return [(int(rng.choice(INDEX)), LABELS[rng.randint(len(LABELS))],
+             values[rng.randint(len(values))]) for i in range(n)]
+
+
+@pytest.fixture
+def pair():
+    # dense and sparse annotations after the same changes
+    dense = Annotations.from_index(INDEX, LABELS)
+    sparse = SparseAnnotations.from_index(INDEX, LABELS)
+    for annots in dense, sparse:
+        for node_id, label, value in changes():
+            annots.set_value(node_id, label, value)
+    return dense, sparse
+
+
+def test_same_as_dense(pair):
+    dense, sparse = pair
+    for label in LABELS:
+        assert (sparse.dense(label) == dense[label].values).all()
+        assert sparse[label].equals(dense[label].astype(np.int8))
+        for node_id in INDEX[:5]:
+            assert sparse.get_value(node_id, label) == dense.get_value(
+                node_id, label)
+    assert sparse.n_annotated() == int((dense.values != 0).sum())
+    assert sparse.to_frame().equals(dense)
+    node_ids, label_codes, values = sparse.arrays()
+    order = np.lexsort((node_ids, label_codes))
+    dense_arrays = dense.arrays()
+    dense_order = np.lexsort((dense_arrays[0], dense_arrays[1]))
+    for array, dense_array in zip((node_ids, label_codes, values),
+                                  dense_arrays):
+        assert (array[order] == dense_array[dense_order]).all()
+
+
+def test_positive_excludes_others():
+    annots = SparseAnnotations.from_index(INDEX, LABELS)
+    annots.set_positive(3, "b")
+    assert [annots.get_value(3, label) for label in LABELS] == [-1, 1, -1]
+    annots.set_unknown(3, "a")
+    assert annots.is_unknown(3, "a") and annots.is_positive(3, "b")
+    assert annots.n_annotated() == 2
+
+
+def test_unknown_cells_not_stored():
+    annots = SparseAnnotations.from_index(INDEX, LABELS)
+    annots.set_negative(4, "a")
+    annots.set_ignore(5, "a")
+    annots.set_unknown(4, "a")
+    assert annots.cells["a"] == {5: Annotations.ignore}
+
+
+def test_invalid_cells():
+    annots = SparseAnnotations.from_index(INDEX, LABELS)
+    with pytest.raises(KeyError):
+        annots.set_negative(99, "a")
+    with pytest.raises(KeyError):
+        annots.get_value(1, "z")
+
+
+def test_round_trips(pair, tmp_path):
+    dense, sparse = pair
+    from_frame = SparseAnnotations.from_frame(dense)
+    from_arrays = SparseAnnotations.from_arrays(INDEX, LABELS,
+                                                *sparse.arrays())
+    path = str(tmp_path / "annots.pkl")
+    sparse.listener = print
+    sparse.to_pickle(path)
+    with open(path, "rb") as inf:
+        unpickled = pickle.load(inf)
+    assert unpickled.listener is None and unpickled.journal is None
+    for annots in from_frame, from_arrays, unpickled:
+        assert annots.cells == sparse.cells
+        assert (annots.index == sparse.index).all()
+
+
+def test_append_index(pair):
+    dense, sparse = pair
+    appended = sparse.append_index(pd.Index([21, 22]))
+    assert len(appended) == len(INDEX) + 2
+    assert appended.index.name == "node_id"
+    assert appended.cells == sparse.cells
+    assert appended.get_value(22, "a") == Annotations.unknown
+    appended.set_positive(22, "a")
+    assert appended.is_positive(22, "a")
+
+
+def test_listener():
+    annots = SparseAnnotations.from_index(INDEX, LABELS)
+    notified = []
+    annots.listener = lambda *args: notified.append(args)
+    annots.set_negative(1, "a")
+    annots.set_negative(1, "a")
+    annots.set_positive(1, "c")
+    assert notified == [(1, "a", 0, -1), (1, "b", 0, -1), (1, "c", 0, 1)]
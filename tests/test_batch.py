@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from tredev import Tredev
+from tredev.scores import Scores
+from tredev.tregex import get_batch_matches, get_matches
+
+LABELS = ["a", "b"]
+# "np_b" repeats the pattern of "np" for another label
+PATTERNS = {"np": ("NP", "a"), "nn": ("NN", "a"), "np_b": ("NP", "b"),
+            "vbz": ("VBZ", "b")}
+
+
+class BatchWorker(object):
+    """
+    Stand-in for TregexWorker answering from the stub tregex.sh, which
+    records the batches it is asked
+    """
+
+    def __init__(self, parse_dir, exec_path):
+        self.parse_dir = parse_dir
+        self.exec_path = exec_path
+        self.batches = []
+        self.calls = []
+
+    def _output(self, pattern):
+        return "\n".join("{}:{}".format(tree_n, node_n)
+                         for tree_n, node_n in get_matches(
+                             pattern, self.parse_dir,
+                             exec_path=self.exec_path))
+
+    def call(self, pattern):
+        self.calls.append(pattern)
+        return self._output(pattern)
+
+    def call_batch(self, patterns):
+        self.batches.append(list(patterns))
+        return [self._output(pattern) for pattern in patterns]
+
+
+@pytest.fixture
+def worker(parse_dir, tregex_stub):
+    return BatchWorker(parse_dir, tregex_stub)
+
+
+def test_get_batch_matches(worker, tregex_stub, parse_dir):
+    patterns = ["NP", "VBZ", "NP", "NONE"]
+    matches = get_batch_matches(patterns, worker)
+    assert worker.batches == [patterns]
+    assert matches == [get_matches(pattern, parse_dir, exec_path=tregex_stub)
+                       for pattern in patterns]
+    assert matches[0] == matches[2] and matches[3] == []
+
+
+def test_score_batch(parse_dir, worker, tregex_stub, quiet):
+    session = Tredev.from_parses(parse_dir, LABELS)
+    session.worker = worker
+    node_ids = session.annots.index.values
+    for node_id in node_ids[::3].tolist():
+        session.annots.set_positive(node_id, LABELS[node_id % 2])
+    for node_id in node_ids[1::4].tolist():
+        session.annots.set_negative(node_id, "a")
+    for name, (pattern, label) in PATTERNS.items():
+        session.add(name, pattern, label, score=False)
+
+    session.rescore()
+    # distinct patterns are matched in a single batch
+    assert len(worker.batches) == 1 and worker.calls == []
+    assert sorted(worker.batches[0]) == ["NN", "NP", "VBZ"]
+    # and their matches go to every pattern with their text
+    for name, (pattern, label) in PATTERNS.items():
+        matches = get_matches(pattern, parse_dir, exec_path=tregex_stub)
+        expected = Scores().score_pat(session.annots[label],
+                                      session.nodes.get_node_ids(matches))
+        assert np.allclose(session.scores.loc[name].values.astype(float),
+                           expected, equal_nan=True)
+    assert not session.scores.loc["np"].equals(session.scores.loc["np_b"])
+
+    matches = session.match_patterns(dict(
+        (name, pattern) for name, (pattern, label) in PATTERNS.items()))
+    assert len(worker.batches) == 2
+    assert matches["np"] == matches["np_b"]
+    assert matches["vbz"] == get_matches("VBZ", parse_dir,
+                                         exec_path=tregex_stub)
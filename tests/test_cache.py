@@ -0,0 +1,47 @@
+import os
+
+from tredev.cache import MatchCache
+
+MATCHES = [(1, 2), (3, 4)]
+
+
+def test_get_put(tmp_path, parse_dir):
+    cache = MatchCache(str(tmp_path / "cache"), parse_dir)
+    assert cache.get("NP") is None
+    cache.put("NP", MATCHES)
+    assert cache.get("NP") == MATCHES
+    cache.put("VP", [])
+    assert cache.get("VP") == []
+    assert (cache.hits, cache.misses) == (2, 1)
+    # entries persist across sessions
+    assert MatchCache(cache.cache_dir, parse_dir).get("NP") == MATCHES
+
+
+def test_backend_in_key(tmp_path, parse_dir):
+    cache_dir = str(tmp_path / "cache")
+    MatchCache(cache_dir, parse_dir, backend="tregex").put("NP", MATCHES)
+    native = MatchCache(cache_dir, parse_dir, backend="native")
+    assert native.get("NP") is None
+    native.put("NP", MATCHES[:1])
+    assert MatchCache(cache_dir, parse_dir).get("NP") == MATCHES
+
+
+def test_changed_parses(tmp_path):
+    parse_dir = tmp_path / "parses"
+    parse_dir.mkdir()
+    (parse_dir / "a.parse").write_text("(ROOT (NP (NN a)))\n")
+    cache = MatchCache(str(tmp_path / "cache"), str(parse_dir))
+    cache.put("NP", MATCHES)
+    (parse_dir / "b.parse").write_text("(ROOT (NP (NN b)))\n")
+    cache.update_fingerprint()
+    assert cache.get("NP") is None
+
+
+def test_evict(tmp_path, parse_dir):
+    cache = MatchCache(str(tmp_path / "cache"), parse_dir)
+    cache.put("NP", MATCHES)
+    cache.max_bytes = cache.nbytes() + 1
+    cache.put("VP", MATCHES)
+    # least recently used entry goes first
+    assert len(cache) == 1 and cache.get("NP") is None
+    assert len(os.listdir(cache.cache_dir)) == 1
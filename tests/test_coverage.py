@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+
+from tredev.annots import Annotations
+from tredev.coverage import Coverage, popcount, to_bitset
+from tredev.scores import Scores
+
+# 130 nodes, so bitsets span several words: 1-10 positive, 11-20
+# negative, 21 ignored, others unknown
+NODE_IDS = np.arange(1, 131)
+TRUE_VALUES = pd.Series(
+    np.where(NODE_IDS <= 10, Annotations.positive,
+             np.where(NODE_IDS <= 20, Annotations.negative,
+                      np.where(NODE_IDS == 21, Annotations.ignore,
+                               Annotations.unknown))),
+    index=NODE_IDS)
+
+MATCHES = {
+    # positives 1-6, negatives 11-12
+    "wide": [1, 2, 3, 4, 5, 6, 11, 12],
+    # positives 5-8, far unknown node
+    "mid": [5, 6, 7, 8, 100],
+    # positive 9 only, plus a repeated match
+    "narrow": [9, 9, 129],
+    # subset of wide
+    "dup": [1, 2, 11],
+    # nothing positive
+    "noise": [13, 14, 15, 21],
+}
+
+
+def coverage(names=None):
+    names = list(MATCHES) if names is None else names
+    return Coverage(names, [MATCHES[name] for name in names], TRUE_VALUES)
+
+
+def test_bitsets():
+    bits = to_bitset(np.array([0, 63, 64, 129]), 130)
+    assert bits.dtype == np.uint64 and len(bits) == 3
+    assert popcount(bits) == 4
+    cov = coverage()
+    assert popcount(cov.bits).tolist() == [8, 5, 2, 3, 4]
+
+
+def test_scores_match_scores():
+    cov = coverage()
+    expected = Scores.stats_from_counts(
+        np.bincount(TRUE_VALUES.values - Annotations.ignore, minlength=4),
+        [np.bincount(TRUE_VALUES.loc[sorted(set(MATCHES[name]))].values -
+                     Annotations.ignore, minlength=4)
+         for name in cov.names],
+        len(TRUE_VALUES))
+    assert np.allclose(cov.scores(cov.bits), expected, equal_nan=True)
+
+
+def test_unique():
+    cov = coverage()
+    unique = cov.unique()
+    node_ids = [NODE_IDS[np.flatnonzero(np.unpackbits(
+        row.view(np.uint8), bitorder="little")[:len(NODE_IDS)])].tolist()
+        for row in unique]
+    assert dict(zip(cov.names, node_ids)) == {
+        "wide": [3, 4, 12],
+        "mid": [7, 8, 100],
+        "narrow": [9, 129],
+        "dup": [],
+        "noise": [13, 14, 15, 21],
+    }
+    table = cov.table()
+    assert table.loc["dup", "#unique"] == 0
+    assert table["#unique_pos"].to_dict() == {
+        "wide": 2, "mid": 2, "narrow": 1, "dup": 0, "noise": 0}
+
+
+def test_unique_single_pattern():
+    cov = coverage(["mid"])
+    assert (cov.unique() == cov.bits).all()
+
+
+def test_union_intersection_overlap():
+    cov = coverage()
+    assert popcount(cov.union()) == 17
+    assert popcount(cov.intersection()) == 0
+    assert popcount(cov.intersection(["wide", "dup"])) == 3
+    overlap = cov.overlap()
+    assert overlap.loc["wide", "mid"] == overlap.loc["mid", "wide"] == 2
+    assert (np.diag(overlap) == popcount(cov.bits)).all()
+
+
+def test_greedy():
+    cov = coverage()
+    greedy = cov.greedy(recall=90.0)
+    # most new true positives first; dup and noise add none
+    assert greedy.index.tolist() == ["wide", "mid", "narrow"]
+    assert greedy["recall"].tolist() == [60.0, 80.0, 90.0]
+    assert greedy["#true_pos"].tolist() == [6, 8, 9]
+    assert cov.greedy(recall=50.0).index.tolist() == ["wide"]
+    # unreachable recall stops when no pattern adds true positives
+    assert len(cov.greedy(recall=100.0)) == 3
+
+
+def test_greedy_ties():
+    # same true positives: fewest new false positives first
+    names = ["costly", "cheap"]
+    cov = Coverage(names, [[1, 2, 11, 12], [1, 2, 13]], TRUE_VALUES)
+    assert cov.greedy(recall=20.0).index.tolist() == ["cheap"]
+
+
+def test_no_patterns():
+    cov = Coverage([], [], TRUE_VALUES)
+    assert len(cov.greedy()) == 0
+    assert len(cov.unique()) == 0
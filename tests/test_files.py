@@ -0,0 +1,51 @@
+import glob
+import shutil
+from os.path import basename, join
+
+import numpy as np
+
+import tredev
+from tredev import Tredev
+from tredev.files import Files
+from tredev.nodes import Nodes
+
+
+def test_read_trees(parse_dir):
+    nodes = Nodes.from_parses(parse_dir)
+    files = Files.from_parse_dir(parse_dir)
+    tree_ns = [12, 1, 3, 12, files.total_trees()]
+    assert files.read_trees(parse_dir, tree_ns) == [
+        nodes.get_subtree(nodes.get_node_id(tree_n, 1))
+        for tree_n in tree_ns]
+
+
+def test_read_trees_registration_order(tmp_path, parse_dir):
+    # registered tree numbers differ from sorted file order
+    fnames = sorted(glob.glob(join(parse_dir, "*")))[:3]
+    for fname in fnames:
+        shutil.copy(fname, str(tmp_path))
+    files = Files()
+    fnames = [join(str(tmp_path), basename(fname))
+              for fname in reversed(fnames)]
+    files.add_files(fnames, [Files.count_trees(fname) for fname in fnames])
+    lines = [line.strip() for fname in fnames
+             for line in open(fname, encoding="utf-8")]
+    tree_ns = np.arange(1, len(lines) + 1)[::-1]
+    assert files.read_trees(str(tmp_path), tree_ns) == lines[::-1]
+
+
+def test_candidate_matches(parse_dir, monkeypatch):
+    session = Tredev.from_parses(parse_dir, ["a"])
+    files = Files.from_parse_dir(parse_dir)
+    candidates = np.array([2, 5, 9])
+    corpus = []
+
+    def get_matches(pattern, file_path, **kwargs):
+        with open(join(file_path, "trees.txt"), encoding="utf-8") as inf:
+            corpus.extend(inf.read().splitlines())
+        return [(2, 1), (3, 4)]
+
+    monkeypatch.setattr(tredev, "get_matches", get_matches)
+    assert session._find_candidate_matches("NP", candidates) == [(5, 1),
+                                                                  (9, 4)]
+    assert corpus == files.read_trees(parse_dir, candidates)
@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from tredev import Tredev
+from tredev.annots import Annotations
+
+LABELS = ["a", "b", "c"]
+
+
+@pytest.fixture
+def session(parse_dir, quiet):
+    return Tredev.from_parses(parse_dir, LABELS, backend="native",
+                              compact=True)
+
+
+def annotate_randomly(tredev, n=300, seed=0):
+    rng = np.random.RandomState(seed)
+    annots = tredev.annots
+    setters = [annots.set_positive, annots.set_negative, annots.set_unknown,
+               annots.set_ignore]
+    for i in range(n):
+        setters[rng.randint(4)](int(rng.choice(annots.index)),
+                                LABELS[rng.randint(3)])
+
+
+def rows(*rows):
+    return pd.DataFrame(list(rows),
+                        columns=["tree_n", "node_n", "label", "value"])
+
+
+@pytest.mark.parametrize("fname,file_relative",
+                         [("annots.tsv", False), ("annots.csv", True)])
+def test_round_trip(session, parse_dir, tmp_path, fname, file_relative):
+    annotate_randomly(session)
+    path = str(tmp_path / fname)
+    exported = session.export_annots(path, file_relative=file_relative)
+    assert ("file" in exported.columns) == file_relative
+
+    other = Tredev.from_parses(parse_dir, LABELS, backend="native",
+                               compact=True)
+    assert not len(other.import_annots(path))
+    for label in LABELS:
+        assert (other.annots.dense(label) ==
+                session.annots.dense(label)).all()
+
+
+def test_export_labels(session):
+    session.annots.set_positive(5, "b")
+    exported = session.export_annots(labels=["b"])
+    assert exported[["tree_n", "node_n", "label", "value"]].values.tolist() \
+        == [[1, 5, "b", "True"]]
+
+
+def test_conflicts(session, capsys):
+    session.annots.set_negative(session.nodes.get_node_id(2, 1), "a")
+    conflicts = session.import_annots(rows(
+        (1, 1, "a", "True"),
+        (1, 1, "b", "True"),
+        (999, 1, "a", "True"),
+        (1, 99999, "a", "True"),
+        (1, 2, "zz", "True"),
+        (1, 3, "a", "maybe"),
+        (1, 4, "a", "False"),
+        (1, 4, "a", "Ignore"),
+        (2, 1, "a", "True"),
+        (1, 5, "c", "1"),
+    ), overwrite=False)
+    assert capsys.readouterr().out.splitlines()[:2] == [
+        "# imported 1 annotations, changing 3 cells",
+        "* 9 conflicting rows, 0 of them imported:"]
+    assert conflicts["conflict"].to_dict() == {
+        0: "several positive labels",
+        1: "several positive labels",
+        2: "unknown node",
+        3: "unknown node",
+        4: "unknown label",
+        5: "invalid value",
+        6: "different values for the same cell",
+        7: "different values for the same cell",
+        8: "changes known value",
+    }
+    get_value = session.annots.get_value
+    node_id = session.nodes.get_node_id
+    # nodes of conflicting rows are left unchanged
+    for tree_n, node_n in (1, 1), (1, 4):
+        assert all(get_value(node_id(tree_n, node_n), label) ==
+                   Annotations.unknown for label in LABELS)
+    assert get_value(node_id(2, 1), "a") == Annotations.negative
+    # a positive value sets the other labels negative
+    assert [get_value(node_id(1, 5), label) for label in LABELS] == [-1, -1, 1]
+
+
+def test_overwrite(session, capsys):
+    node_id = session.nodes.get_node_id(2, 1)
+    session.annots.set_negative(node_id, "a")
+    conflicts = session.import_annots(rows((2, 1, "a", "True"),
+                                           (2, 1, "b", "Unknown"),
+                                           (1, 3, "c", "False")))
+    # all rows of the node are reported, but applied
+    assert conflicts["conflict"].tolist() == ["changes known value"] * 2
+    assert capsys.readouterr().out.splitlines()[:2] == [
+        "# imported 3 annotations, changing 3 cells",
+        "* 2 conflicting rows, 2 of them imported:"]
+    assert [session.annots.get_value(node_id, label)
+            for label in LABELS] == [1, 0, -1]
+
+
+def test_file_relative_unknown_file(session):
+    conflicts = session.import_annots(pd.DataFrame(dict(
+        file=["missing.parse"], tree_n=[1], node_n=[1], label=["a"],
+        value=["True"])))
+    assert conflicts["conflict"].tolist() == ["unknown node"]
+    assert session.annots.n_annotated() == 0
@@ -0,0 +1,55 @@
+import numpy as np
+
+from tredev import Tredev
+from tredev.annots import SparseAnnotations
+from tredev.journal import Journal
+
+
+def test_replay_restores_changes(tmp_path):
+    path = str(tmp_path / "j")
+    annots = SparseAnnotations(np.arange(1, 11), ["a", "b"])
+    annots.journal = Journal(path, annots.columns)
+    annots.set_positive(3, "a")
+    annots.set_ignore(4, "b")
+    annots.set_unknown(3, "b")
+    annots.journal.close()
+    fresh = SparseAnnotations(np.arange(1, 11), ["a", "b"])
+    assert Journal(path, fresh.columns).replay(fresh) == 3
+    for label in "ab":
+        assert (fresh.dense(label) == annots.dense(label)).all()
+
+
+def test_torn_tail_is_dropped_before_appending(tmp_path):
+    path = str(tmp_path / "j")
+    journal = Journal(path, ["a"])
+    journal.record(1, "a", 1)
+    journal.record(2, "a", -1)
+    journal.close()
+    with open(path, "ab") as outf:
+        # partial record of a crash
+        outf.write(b"\x07" * 5)
+    journal = Journal(path, ["a"])
+    assert len(journal) == 2
+    journal.record(3, "a", -2)
+    journal.close()
+    labels, records = Journal.read(path)
+    assert records.tolist() == [(1, 0, 1), (2, 0, -1), (3, 0, -2)]
+
+
+def test_session_survives_torn_tail(tmp_path, parse_dir):
+    prefix = str(tmp_path / "s")
+    td = Tredev.from_parses(parse_dir, ["a", "b"], backend="native",
+                            compact=True)
+    td.save(prefix)
+    td.annots.set_positive(5, "a")
+    td.journal.close()
+    with open(prefix + "_annots.journal", "ab") as outf:
+        outf.write(b"\xff" * 5)
+    td = Tredev.load(prefix, parse_dir, backend="native")
+    td.annots.set_negative(7, "b")
+    td.journal.close()
+    td = Tredev.load(prefix, parse_dir, backend="native")
+    td.journal.close()
+    assert td.annots.is_positive(5, "a")
+    assert td.annots.is_negative(5, "b")
+    assert td.annots.is_negative(7, "b")
@@ -0,0 +1,87 @@
+"""
+Conformance of the native engine with the expected tregex.sh -x outputs
+in data/expected_matches.json
+
+The "source" entry of the file tells where they come from:
+data/reference_matcher.py, a node-by-node matcher independent of the
+native engine, until data/record_tregex.py re-records them from Tregex.
+"""
+
+import json
+import sys
+from os.path import abspath, dirname, join
+
+import pytest
+
+import tredev
+from tredev import Tredev, native
+from tredev.nodes import Nodes, CompactNodes
+from tredev.tregex import parse_matches
+
+DATA_DIR = join(dirname(abspath(__file__)), "data")
+
+with open(join(DATA_DIR, "expected_matches.json"), encoding="utf-8") as inf:
+    EXPECTED = json.load(inf)
+
+
+def expected(kind, pattern):
+    return list(parse_matches(EXPECTED[kind][pattern].split()))
+
+
+@pytest.fixture(scope="module", params=[Nodes, CompactNodes])
+def index(request):
+    parse_dir = join(dirname(dirname(abspath(__file__))), "sample",
+                     "parses")
+    return native.TreeIndex(request.param.from_parses(parse_dir))
+
+
+@pytest.mark.parametrize("pattern", sorted(EXPECTED["supported"]))
+def test_matches(index, pattern):
+    assert native.get_matches(pattern, index) == expected("supported",
+                                                          pattern)
+
+
+def test_batch_matches(index):
+    patterns = sorted(EXPECTED["supported"]) + sorted(EXPECTED["unsupported"])
+    matches = native.get_batch_matches(patterns, index)
+    assert sorted(matches) == sorted(EXPECTED["supported"])
+    for pattern, found in matches.items():
+        assert found == expected("supported", pattern)
+
+
+@pytest.mark.parametrize("pattern", sorted(EXPECTED["unsupported"]))
+def test_unsupported(index, pattern):
+    with pytest.raises(native.UnsupportedPattern):
+        native.get_matches(pattern, index)
+
+
+@pytest.mark.parametrize("pattern", sorted(EXPECTED["unsupported"]))
+def test_fallback(parse_dir, monkeypatch, pattern):
+    calls = []
+
+    def get_matches(pattern, file_path, **kwargs):
+        calls.append(pattern)
+        return expected("unsupported", pattern)
+
+    monkeypatch.setattr(tredev, "get_matches", get_matches)
+    session = Tredev.from_parses(parse_dir, ["a"], backend="native")
+    session.prefilter = False
+    assert session._find_matches(pattern) == expected("unsupported",
+                                                      pattern)
+    assert calls == [pattern]
+
+
+@pytest.mark.skipif(EXPECTED["source"] != "reference_matcher.py",
+                    reason="recorded from tregex.sh")
+def test_reference_outputs(parse_dir):
+    # the expected outputs are those the reference matcher writes
+    sys.path.insert(0, DATA_DIR)
+    try:
+        from reference_matcher import get_outputs
+    finally:
+        sys.path.remove(DATA_DIR)
+    outputs = get_outputs(parse_dir)
+    for kind in "supported", "unsupported":
+        assert dict((pattern, " ".join(pairs))
+                    for pattern, pairs in outputs[kind].items()) == \
+            EXPECTED[kind]
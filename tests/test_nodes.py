@@ -0,0 +1,153 @@
+from os.path import abspath, dirname, join
+
+import pytest
+
+from tredev import Tredev
+from tredev.nodes import Nodes, CompactNodes, read_files, tree_spans
+
+PARSE_DIR = join(dirname(dirname(abspath(__file__))), "sample", "parses")
+
+
+@pytest.fixture(scope="module")
+def nodes():
+    return Nodes.from_parses(PARSE_DIR)
+
+
+@pytest.fixture(scope="module", params=["compact", "to_nodes", "from_nodes"])
+def other(request, nodes):
+    # other node stores, which should behave like nodes
+    if request.param == "compact":
+        return CompactNodes.from_parses(PARSE_DIR)
+    if request.param == "to_nodes":
+        return CompactNodes.from_parses(PARSE_DIR).to_nodes()
+    return CompactNodes.from_nodes(nodes)
+
+
+def all_pairs(nodes):
+    # (tree_n, node_n) of all nodes
+    tree_ns, node_ns = nodes.get_tree_nodes(nodes.index.values)
+    return list(zip(tree_ns.tolist(), node_ns.tolist()))
+
+
+def node_fields(nodes, node_id):
+    node = nodes.get_node(node_id)
+    return node.label, int(node.parent), list(node.children)
+
+
+def test_id_lookups(nodes, other):
+    assert (other.tree_offsets == nodes.tree_offsets).all()
+    assert (other.index == nodes.index).all()
+    pairs = all_pairs(nodes)
+    assert pairs[:3] == [(1, 1), (1, 2), (1, 3)]
+    assert (other.get_node_ids(pairs) == nodes.index.values).all()
+    assert [other.get_node_id(tree_n, node_n)
+            for tree_n, node_n in pairs[::17]] == \
+        nodes.index.values[::17].tolist()
+    tree_ns, node_ns = other.get_tree_nodes(nodes.index.values)
+    assert list(zip(tree_ns.tolist(), node_ns.tolist())) == pairs
+    assert len(other.get_node_ids([])) == 0
+
+
+def test_tree_lookups(nodes, other):
+    # the calls Tredev makes on node stores
+    node_ids = nodes.index.values
+    for node_id in node_ids[::7].tolist():
+        assert other.get_root_node_id(node_id) == \
+            nodes.get_root_node_id(node_id)
+        assert other.get_substring(node_id) == nodes.get_substring(node_id)
+        assert other.get_sentence(node_id) == nodes.get_sentence(node_id)
+        assert other.get_context(node_id) == nodes.get_context(node_id)
+        assert node_fields(other, node_id) == node_fields(nodes, node_id)
+    # trees are slow to print from Nodes
+    for node_id in node_ids[::401].tolist():
+        assert other.get_subtree(node_id) == nodes.get_subtree(node_id)
+        assert other.get_full_tree(node_id, indent=2) == \
+            nodes.get_full_tree(node_id, indent=2)
+    assert len(other) == len(nodes)
+
+
+def test_loaded_session(parse_dir, tmp_path):
+    # sessions saved with compact nodes are loaded as CompactNodes
+    session = Tredev.from_parses(parse_dir, ["a"])
+    prefix = str(tmp_path / "session")
+    session.save(prefix)
+    session.journal.close()
+    loaded = Tredev.load(prefix, parse_dir)
+    try:
+        assert isinstance(loaded.nodes, CompactNodes)
+        pairs = all_pairs(session.nodes)
+        assert (loaded.nodes.get_node_ids(pairs) ==
+                session.nodes.get_node_ids(pairs)).all()
+        for node_id in session.nodes.index.values[::11].tolist():
+            assert loaded.nodes.get_sentence(node_id) == \
+                session.nodes.get_sentence(node_id)
+    finally:
+        loaded.journal.close()
+
+
+TREES = ["(ROOT (S (NP (DT the) (NN cat)) (VP (VBZ sleeps))))",
+         "(ROOT (NP (-LRB- -LRB-) (NN dog) (-RRB- -RRB-)))"]
+
+
+@pytest.fixture(params=[Nodes, CompactNodes])
+def small(request, tmp_path):
+    (tmp_path / "a.parse").write_text(TREES[0] + "\n")
+    (tmp_path / "b.parse").write_text(TREES[1] + "\n")
+    return request.param.from_parses(str(tmp_path))
+
+
+def test_tree_spans():
+    # positions of parents of the nodes of both trees in preorder
+    parent = [-1, 0, 1, 2, 3, 2, 5, 1, 7, 8,
+              -1, 10, 11, 12, 11, 14, 11, 16]
+    root, last, start, end = tree_spans(parent)
+    assert root.tolist() == [0] * 10 + [10] * 8
+    assert last.tolist() == [9, 9, 6, 4, 4, 6, 6, 9, 9, 9,
+                             17, 17, 13, 13, 15, 15, 17, 17]
+    assert list(zip(start.tolist(), end.tolist()))[:10] == [
+        (0, 3), (0, 3), (0, 2), (0, 1), (0, 1), (1, 2), (1, 2), (2, 3),
+        (2, 3), (2, 3)]
+    assert (start[10], end[10]) == (3, 6)
+    assert (start[15], end[15]) == (4, 5)
+
+
+def test_spans(small):
+    nodes = small.to_nodes() if isinstance(small, CompactNodes) else small
+    assert nodes["root"].tolist() == [1] * 10 + [11] * 8
+    assert nodes.loc[3, ["start", "end"]].tolist() == [0, 2]
+    assert nodes.loc[11, ["start", "end"]].tolist() == [3, 6]
+    assert small.tokens.tolist() == ["the", "cat", "sleeps", "(", "dog",
+                                     ")"]
+    # recomputed spans of nodes saved without them
+    stripped = Nodes(nodes.drop(columns=Nodes.span_fields))
+    stripped.tree_offsets = nodes.tree_offsets
+    assert not stripped.has_spans()
+    stripped.add_spans()
+    assert stripped[Nodes.span_fields].equals(nodes[Nodes.span_fields])
+
+
+def test_context(small):
+    get_id = small.get_node_id
+    # contexts stop at sentence boundaries
+    assert small.get_context(get_id(1, 5)) == ("", "the", "cat sleeps")
+    assert small.get_context(get_id(1, 10)) == ("the cat", "sleeps", "")
+    assert small.get_context(get_id(1, 3)) == ("", "the cat", "sleeps")
+    assert small.get_context(get_id(1, 1)) == ("", "the cat sleeps", "")
+    assert small.get_context(get_id(2, 3)) == ("", "(", "dog )")
+    assert small.get_context(get_id(2, 6)) == ("(", "dog", ")")
+    assert small.get_context(get_id(2, 8)) == ("( dog", ")", "")
+    assert small.get_sentence(get_id(2, 6)) == "( dog )"
+    assert small.get_substring(get_id(1, 8)) == "sleeps"
+
+
+def test_context_appended(small, tmp_path):
+    # spans of appended trees continue the token offsets
+    (tmp_path / "c.parse").write_text(TREES[0] + "\n")
+    label_codes, label_vocab, parent, tree_sizes, file_sizes = read_files(
+        [str(tmp_path / "c.parse")])
+    nodes = small.append_arrays(label_codes, label_vocab, parent,
+                                tree_sizes, 3)
+    assert nodes.get_context(nodes.get_node_id(3, 7)) == ("the", "cat",
+                                                          "sleeps")
+    assert nodes.get_context(nodes.get_node_id(2, 8)) == ("( dog", ")", "")
+    assert len(nodes.tokens) == 9
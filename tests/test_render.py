@@ -0,0 +1,145 @@
+import threading
+from collections import Counter
+
+import pytest
+
+from tredev import Tredev
+from tredev.nodes import CompactNodes
+from tredev.render import LRUCache, MatchRenderer
+
+
+class CountingNodes(object):
+    """
+    Nodes counting how often each node is rendered, optionally holding
+    rendering of node blocked until gate is set
+    """
+
+    def __init__(self, nodes, blocked=None):
+        self.nodes = nodes
+        self.rendered = Counter()
+        self.blocked = blocked
+        self.gate = threading.Event()
+        self.started = threading.Event()
+
+    def __getattr__(self, name):
+        return getattr(self.nodes, name)
+
+    def get_context(self, node_id):
+        if node_id == self.blocked:
+            self.started.set()
+            self.gate.wait(5)
+        self.rendered[node_id] += 1
+        return self.nodes.get_context(node_id)
+
+
+@pytest.fixture
+def nodes(parse_dir):
+    return CountingNodes(CompactNodes.from_parses(parse_dir))
+
+
+def wait_rendered(renderer):
+    # wait until background rendering is done
+    renderer._executor.shutdown(wait=True)
+    renderer._executor = None
+
+
+def test_lru_cache():
+    cache = LRUCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    # reading a makes b the least recently used item
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert "b" not in cache and cache.get("b", 0) == 0
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    # so does overwriting a
+    cache.put("c", 4)
+    cache.put("a", 5)
+    cache.put("d", 6)
+    assert "c" not in cache and len(cache) == 2
+    assert (cache.get("a"), cache.get("d")) == (5, 6)
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_view_cache(nodes):
+    renderer = MatchRenderer(nodes, max_size=2)
+    node_ids = [10, 20, 30]
+    view = renderer.view(10)
+    assert view.context == nodes.nodes.get_context(10)
+    assert renderer.subtree(10) == nodes.get_subtree(10, indent=2)
+    assert renderer.full_tree(10) == nodes.get_full_tree(10, indent=2)
+    # cache hits
+    assert renderer.view(10) is view and nodes.rendered[10] == 1
+    renderer.view(20)
+    renderer.view(10)
+    # 20 is evicted as least recently used, 10 is kept
+    renderer.view(30)
+    assert 20 not in renderer.views and 10 in renderer.views
+    renderer.view(10)
+    renderer.view(20)
+    assert [nodes.rendered[node_id] for node_id in node_ids] == [1, 2, 1]
+
+
+def test_prefetch(nodes):
+    renderer = MatchRenderer(nodes)
+    renderer.prefetch([5, 6, 7])
+    wait_rendered(renderer)
+    assert all(node_id in renderer.views for node_id in (5, 6, 7))
+    # rendered nodes are not rendered again
+    renderer.prefetch([5, 8])
+    wait_rendered(renderer)
+    renderer.view(6)
+    assert [nodes.rendered[node_id] for node_id in (5, 6, 7, 8)] == [1] * 4
+
+
+def test_view_waits_for_prefetch(parse_dir):
+    nodes = CountingNodes(CompactNodes.from_parses(parse_dir), blocked=5)
+    renderer = MatchRenderer(nodes)
+    renderer.prefetch([5, 6])
+    assert nodes.started.wait(5)
+    views = []
+    thread = threading.Thread(target=lambda: views.append(renderer.view(5)))
+    thread.start()
+    thread.join(0.1)
+    # view waits for the background rendering instead of rendering again
+    assert thread.is_alive() and not views
+    nodes.gate.set()
+    thread.join(5)
+    assert views == [renderer.views.get(5)] and nodes.rendered[5] == 1
+    wait_rendered(renderer)
+
+
+def test_cancel(parse_dir):
+    nodes = CountingNodes(CompactNodes.from_parses(parse_dir), blocked=5)
+    renderer = MatchRenderer(nodes)
+    renderer.prefetch([5, 6, 7])
+    assert nodes.started.wait(5)
+    renderer.cancel()
+    nodes.gate.set()
+    wait_rendered(renderer)
+    # the node being rendered is kept, waiting ones are dropped
+    assert 5 in renderer.views
+    assert 6 not in renderer.views and 7 not in renderer.views
+    assert renderer.context(6) == nodes.nodes.get_context(6)
+
+
+def test_prefetch_window(parse_dir, monkeypatch, capsys):
+    session = Tredev.from_parses(parse_dir, ["a"], compact=True)
+    session.prefetch = 3
+    renderer = session._get_renderer()
+    prefetched = []
+    monkeypatch.setattr(renderer, "prefetch", prefetched.append)
+    matches = [(tree_n, 1) for tree_n in range(1, 11)]
+    node_id = session._show_match(matches, 5, "a")
+    assert node_id == session.nodes.get_node_id(6, 1)
+    # the next prefetch matches, then the previous one
+    assert prefetched == [session.nodes.get_node_ids(
+        matches[6:9] + matches[4:5]).tolist()]
+    session._show_match(matches, 9, "a")
+    assert prefetched[-1] == session.nodes.get_node_ids(
+        matches[8:9]).tolist()
+    session._show_match(matches, 0, "a")
+    assert prefetched[-1] == session.nodes.get_node_ids(
+        matches[1:4]).tolist()
+    assert "==> " in capsys.readouterr().out
@@ -0,0 +1,118 @@
+import numpy as np
+import pytest
+
+from tredev import Tredev, native
+from tredev.revisions import Revisions
+
+
+@pytest.fixture
+def tredev(parse_dir, quiet):
+    tredev = Tredev.from_parses(parse_dir, ["a", "b"], backend="native")
+    tredev.add("np", "NP < NN", "a", comment="nouns")
+    return tredev
+
+
+def node_ids(tredev, pattern):
+    return set(tredev.nodes.get_node_ids(native.get_matches(
+        pattern, tredev._get_index())).tolist())
+
+
+def test_revise(tredev, capsys):
+    tredev.revise("np", "NP < NNS")
+    assert "# revision 2 of np" in capsys.readouterr().out
+    revisions = tredev.revisions
+    assert revisions.latest("np") == 2
+    assert revisions.get_row("np", 1)["pattern"] == "NP < NN"
+    assert revisions.get_row("np")["pattern"] == "NP < NNS"
+    assert revisions.get_row("np")["comment"] == "nouns"
+    assert tredev.patterns.at["np", "pattern"] == "NP < NNS"
+    # both revisions keep their match sets
+    for revision, pattern in (1, "NP < NN"), (2, "NP < NNS"):
+        ids, n_nodes = revisions.get_matches("np", revision)
+        assert set(ids.tolist()) == node_ids(tredev, pattern)
+        assert n_nodes == len(tredev.nodes)
+        assert ids.dtype == np.int32
+    assert tredev.scores.at["np", "#pred_pos"] == len(
+        node_ids(tredev, "NP < NNS"))
+
+    tredev.revise("np", "NP < NNS")
+    assert "* pattern unchanged" in capsys.readouterr().out
+    tredev.revise("vp", "VP")
+    assert '*** unknown name "vp" ***' in capsys.readouterr().out
+    assert revisions.latest("np") == 2
+
+
+def test_diff(tredev, capsys):
+    old = node_ids(tredev, "NP < NN")
+    new = node_ids(tredev, "NP < NNS")
+    both = sorted(old & new)
+    gained = sorted(new - old)
+    lost = sorted(old - new)
+    assert both and gained and lost
+    tredev.annots.set_positive(gained[0], "a")
+    tredev.annots.set_negative(lost[0], "a")
+    tredev.annots.set_positive(both[0], "a")
+    tredev.revise("np", "NP < NNS", score=False)
+    capsys.readouterr()
+
+    diff = tredev.diff("np")
+    out = capsys.readouterr().out
+    assert "# np revision 1 -> 2: {} gained, {} lost".format(
+        len(gained), len(lost)) in out
+    assert diff.index[diff["change"] == "gained"].tolist() == gained
+    assert diff.index[diff["change"] == "lost"].tolist() == lost
+    # matches of both revisions are no change
+    assert both[0] not in diff.index
+    assert diff.at[gained[0], "value"] == "True"
+    assert diff.at[lost[0], "value"] == "False"
+    assert (diff.loc[gained[1:], "value"] == "Unknown").all()
+    tree_n, node_n = tredev.nodes.get_tree_nodes([gained[0]])
+    assert diff.loc[gained[0], ["tree_n", "node_n"]].tolist() == [
+        tree_n[0], node_n[0]]
+
+    # reversed comparison, and between any two revisions
+    reverse = tredev.diff("np", 2, 1)
+    assert reverse.index[reverse["change"] == "gained"].tolist() == lost
+    tredev.revise("np", "NP < NN")
+    assert len(tredev.diff("np", 1, 3)) == 0
+    assert tredev.diff("np", 1, 4) is None
+    assert "no revision 4" in capsys.readouterr().out
+
+
+def test_diff_added_trees(tredev, capsys):
+    # revisions matched against fewer nodes are compared on those only
+    tredev.revise("np", "NP < NNS")
+    ids, n_nodes = tredev.revisions.get_matches("np", 1)
+    n_old = int(ids[len(ids) // 2])
+    tredev.revisions.set_matches("np", 1, ids[ids <= n_old], n_old)
+    capsys.readouterr()
+    diff = tredev.diff("np")
+    assert "among the first {} nodes".format(n_old) in \
+        capsys.readouterr().out
+    assert diff.index.max() <= n_old
+    old = node_ids(tredev, "NP < NN")
+    new = node_ids(tredev, "NP < NNS")
+    assert sorted(diff.index) == sorted(
+        node_id for node_id in old ^ new if node_id <= n_old)
+
+
+def test_record():
+    revisions = Revisions()
+    revisions.record("p", "NP", "a", [5, 3, 3], 10)
+    assert revisions.latest("p") == 1
+    # same pattern: matches of the latest revision are replaced
+    revisions.record("p", "NP", "a", [4], 10)
+    assert revisions.latest("p") == 1
+    assert revisions.get_matches("p")[0].tolist() == [4]
+    revisions.record("p", "VP", "a", [7, 1], 12)
+    assert revisions.latest("p") == 2
+    assert revisions.get_matches("p", -1)[0].tolist() == [1, 7]
+    assert revisions.get_matches("p", -2)[0].tolist() == [4]
+    assert revisions.get_row("p")["n_matches"] == 2
+    gained, lost = Revisions.diff_ids(revisions.get_matches("p", 1)[0],
+                                      revisions.get_matches("p", 2)[0])
+    assert (gained.tolist(), lost.tolist()) == ([1, 7], [4])
+    revisions.drop_pattern("p")
+    assert revisions.latest("p") == 0 and not revisions.matches
+    with pytest.raises(KeyError):
+        revisions.get_row("p")
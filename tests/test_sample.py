@@ -0,0 +1,124 @@
+import glob
+from os.path import dirname, join
+
+import numpy as np
+import pytest
+
+from tredev import Tredev
+from tredev.files import Files
+from tredev.sample import Sample, Estimates, wilson_interval
+from tredev.scores import Scores
+
+
+@pytest.fixture
+def files(parse_dir):
+    return Files.from_parse_dir(parse_dir)
+
+
+def test_draw_stratified(files):
+    sample = Sample.draw(files, fraction=0.2, seed=3)
+    assert (np.diff(sample.trees) > 0).all()
+    # the same fraction of every file, at least one tree
+    for first_tree, n_trees in files[["first_tree", "n_trees"]].values:
+        in_file = ((sample.trees >= first_tree) &
+                   (sample.trees < first_tree + n_trees)).sum()
+        assert in_file == max(1, int(round(0.2 * n_trees)))
+    # reproducible
+    assert (Sample.draw(files, fraction=0.2, seed=3).trees ==
+            sample.trees).all()
+    assert not (Sample.draw(files, fraction=0.2, seed=4).trees ==
+                sample.trees).all()
+
+
+def test_draw_unstratified(files):
+    sample = Sample.draw(files, fraction=0.25, seed=1, stratified=False)
+    assert len(sample) == round(0.25 * files.total_trees())
+    assert sample.n_total == files.total_trees()
+    assert sample.trees.min() >= 1
+    assert sample.trees.max() <= files.total_trees()
+    assert len(Sample.draw(files, fraction=1.0, stratified=False)) == \
+        files.total_trees()
+
+
+def test_node_ids(parse_dir, files):
+    session = Tredev.from_parses(parse_dir, ["a"])
+    sample = Sample([5, 2, 40, 2], files.total_trees())
+    assert sample.trees.tolist() == [2, 5, 40]
+    tree_ns, node_ns = session.nodes.get_tree_nodes(
+        sample.node_ids(session.nodes))
+    assert (np.unique(tree_ns) == sample.trees).all()
+    assert len(tree_ns) == sum((session.nodes.get_tree_nodes(
+        session.nodes.index.values)[0] == tree_n).sum()
+        for tree_n in sample.trees)
+
+
+def test_corpus_dir(parse_dir, files):
+    sample = Sample([12, 1, 79], files.total_trees())
+    with open(join(sample.corpus_dir(files, parse_dir), "trees.txt"),
+              encoding="utf-8") as inf:
+        trees = inf.read().splitlines()
+    fnames = sorted(glob.glob(join(parse_dir, "*")))
+    lines = [line.strip() for fname in fnames
+             for line in open(fname, encoding="utf-8")]
+    assert trees == [lines[0], lines[11], lines[78]]
+
+
+def test_wilson_interval():
+    low, high = wilson_interval(5, 10)
+    assert round(float(low), 2) == 23.66 and round(float(high), 2) == 76.34
+    low, high = wilson_interval(0, 10)
+    assert abs(low) < 1e-9 and round(float(high), 2) == 27.75
+    low, high = wilson_interval(np.array([10, 100]), np.array([10, 100]))
+    assert np.allclose(high, 100) and low[0] < low[1] < 100
+    assert np.isnan(wilson_interval(0, 0)).all()
+
+
+def test_estimates():
+    scores = dict(zip(Scores.stats, np.zeros(len(Scores.stats))))
+    scores.update({"#true_pos": 5, "#false_pos": 5, "#false_neg": 0})
+    estimates = Estimates()
+    estimates.add_estimate("p", 7, [scores[stat] for stat in Scores.stats])
+    row = estimates.loc["p"]
+    assert row["sample_trees"] == 7
+    assert round(row["precision_low"], 2) == 23.66
+    assert round(row["recall_high"], 2) == 100
+    assert estimates.formatted().loc["p", "precision_ci"] == \
+        "[23.7, 76.3]"
+
+
+@pytest.mark.parametrize("backend,prefilter", [("tregex", False),
+                                               ("tregex", True),
+                                               ("native", False),
+                                               ("native", True)])
+def test_sample_matches(parse_dir, tregex_stub, monkeypatch, backend,
+                        prefilter):
+    monkeypatch.setenv("PATH", dirname(tregex_stub), prepend=":")
+    session = Tredev.from_parses(parse_dir, ["a"], backend=backend)
+    session.prefilter = prefilter
+    session.set_sample(fraction=0.3, seed=2)
+    sample = session.sample
+    for pattern in "NP", "VBZ", "NONE":
+        expected = [(tree_n, node_n) for tree_n, node_n
+                    in session._find_matches(pattern)
+                    if tree_n in sample.trees]
+        assert session._find_sample_matches(pattern) == expected
+        assert sample.matches[pattern] == expected
+
+
+def test_estimate_whole_corpus(parse_dir, tregex_stub, monkeypatch):
+    # a sample of all trees gives the exact scores
+    monkeypatch.setenv("PATH", dirname(tregex_stub), prepend=":")
+    session = Tredev.from_parses(parse_dir, ["a"])
+    node_ids = session.nodes.index.values
+    for node_id in node_ids[::5]:
+        session.annots.set_positive(int(node_id), "a")
+    for node_id in node_ids[1::5]:
+        session.annots.set_negative(int(node_id), "a")
+    session.set_sample(fraction=1.0)
+    session.add("np", "NP", "a")
+    exact = session.scores.loc["np"].copy()
+    session.add("np_est", "NP", "a", estimate=True)
+    assert np.allclose(session.scores.loc["np_est"].values.astype(float),
+                       exact.values.astype(float), equal_nan=True)
+    assert session.estimates.loc["np_est", "sample_trees"] == \
+        session.files.total_trees()
@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from tredev.annots import Annotations
+from tredev.scores import Scores
+
+POS, NEG, UNK, IGN = (Annotations.positive, Annotations.negative,
+                      Annotations.unknown, Annotations.ignore)
+
+# nodes 1-4 positive, 5-7 negative, 8-10 unknown, 11-12 ignored
+TRUE_VALUES = pd.Series([POS] * 4 + [NEG] * 3 + [UNK] * 3 + [IGN] * 2,
+                        index=pd.Index(np.arange(1, 13), name="node_id"))
+
+
+def per_node_scores(true_values, node_ids):
+    # scoring node by node, as before vectorization
+    is_pos = true_values == POS
+    is_neg = true_values == NEG
+    is_unk = true_values == UNK
+    is_ign = true_values == IGN
+    is_match = pd.Series(False, index=true_values.index)
+    for node_id in node_ids:
+        if node_id in is_match.index:
+            is_match.loc[node_id] = True
+    true_pos = sum(is_pos & is_match)
+    false_pos = sum(is_neg & is_match)
+    false_neg = sum(is_pos & ~is_match)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        prec = np.float64(true_pos) / (true_pos + false_pos) * 100
+        rec = np.float64(true_pos) / (true_pos + false_neg) * 100
+        f = 2 * ((prec * rec) / (prec + rec))
+    return (prec, rec, f, sum(is_match), sum(~is_match),
+            sum(is_pos), sum(is_neg), sum(is_unk), sum(is_ign),
+            true_pos, false_pos, sum(is_neg & ~is_match), false_neg,
+            sum(is_unk & is_match), sum(is_unk & ~is_match))
+
+
+def test_known_scores():
+    # duplicate match of node 2 counts once
+    scores = dict(zip(Scores.stats, Scores().score_pat(
+        TRUE_VALUES, np.array([1, 2, 5, 8, 9, 11, 2]))))
+    assert scores == pytest.approx({
+        "precision": 200 / 3, "recall": 50.0, "f_score": 400 / 7,
+        "#pred_pos": 6, "#pred_neg": 6,
+        "#gold_pos": 4, "#gold_neg": 3, "#gold_unk": 3, "#gold_ign": 2,
+        "#true_pos": 2, "#false_pos": 1, "#true_neg": 2, "#false_neg": 2,
+        "#unk_pos": 2, "#unk_neg": 1})
+
+
+def test_undefined_scores():
+    # no matches: precision undefined; no positives: recall undefined
+    scores = Scores().score_pat(TRUE_VALUES, np.array([], dtype=np.int64))
+    assert np.isnan(scores[0]) and scores[1] == 0
+    scores = Scores().score_pat(TRUE_VALUES.iloc[4:], np.array([5, 8]))
+    assert scores[0] == 0 and np.isnan(scores[1]) and np.isnan(scores[2])
+
+
+def test_same_as_per_node():
+    rng = np.random.RandomState(0)
+    true_values = pd.Series(rng.choice([POS, NEG, UNK, IGN], 500),
+                            index=pd.Index(np.arange(1, 501) * 3))
+    # matches with duplicates and ids of unknown nodes
+    node_id_lists = [rng.choice(np.arange(1, 1600), size)
+                     for size in (0, 1, 10, 200, 1000)]
+    names = ["p{}".format(i) for i in range(len(node_id_lists))]
+    scores = Scores()
+    rows = scores.score_pats(true_values, node_id_lists, names)
+    for name, row, node_ids in zip(names, rows, node_id_lists):
+        expected = per_node_scores(true_values, node_ids)
+        assert np.allclose(row, expected, equal_nan=True)
+        assert np.allclose(scores.loc[name].values.astype(float), expected,
+                           equal_nan=True)
+        assert np.allclose(Scores().score_pat(true_values, node_ids),
+                           expected, equal_nan=True)
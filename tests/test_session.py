@@ -0,0 +1,226 @@
+import glob
+import shutil
+from os.path import getmtime, join
+
+import pandas as pd
+import pytest
+
+from tredev import Tredev, session
+from tredev.annots import Annotations, SparseAnnotations
+from tredev.nodes import Nodes, CompactNodes, LEGACY_NODE_OFFSET
+
+LABELS = ["a", "b"]
+
+
+@pytest.fixture
+def long_parse_dir(tmp_path, parse_dir):
+    # a few sample files and a tree with more than LEGACY_NODE_OFFSET
+    # nodes, followed by a small tree whose legacy ids collide with it
+    parses = tmp_path / "parses"
+    parses.mkdir()
+    for fname in sorted(glob.glob(join(parse_dir, "*")))[:3]:
+        shutil.copy(fname, str(parses))
+    words = " ".join("(NP (NN w{}))".format(i) for i in range(600))
+    (parses / "zz_long.txt").write_text(
+        "(ROOT (S {}))\n(ROOT (S (NP (NN tail))))\n".format(words))
+    return str(parses)
+
+
+def legacy_session(tredev, path_prefix, annots):
+    """
+    Save nodes of tredev with legacy node ids, and annots, given as
+    {node_id: {label: value}} with consecutive node ids
+    """
+    nodes = tredev.nodes
+    tree_n, node_n = nodes.get_tree_nodes(nodes.index.values)
+    legacy_ids = tree_n * LEGACY_NODE_OFFSET + node_n
+    convert = dict(zip(nodes.index.values.tolist(), legacy_ids.tolist()))
+    convert[0] = 0
+    legacy = Nodes(dict(node_id=legacy_ids,
+                        label=nodes["label"].values,
+                        parent=[convert[parent]
+                                for parent in nodes["parent"].values],
+                        children=[[convert[child] for child in children]
+                                  for children in nodes["children"]]),
+                   columns=Nodes.fields)
+    legacy.set_index("node_id", inplace=True)
+    legacy.to_pickle(path_prefix + "_nodes.pkl")
+    if annots is None:
+        dense = Annotations.from_index(legacy.index, LABELS)
+        dense.to_pickle(path_prefix + "_annots.pkl")
+    else:
+        sparse = SparseAnnotations(pd.Index(legacy_ids), LABELS)
+        for node_id, values in annots.items():
+            for label, value in values.items():
+                sparse.set_value(convert[node_id], label, value)
+        sparse.to_pickle(path_prefix + "_annots.pkl")
+    tredev.patterns.to_pickle(path_prefix + "_patterns.pkl")
+    tredev.scores.to_pickle(path_prefix + "_scores.pkl")
+    return legacy_ids
+
+
+def test_migrate_long_tree(tmp_path, long_parse_dir, quiet, capsys):
+    ref = Tredev.from_parses(long_parse_dir, LABELS, backend="native")
+    long_tree = len(ref.nodes.tree_offsets) - 1
+    first = int(ref.nodes.tree_offsets[long_tree - 1]) + 1
+    annots = {first + 1100: {"a": 1, "b": -1},
+              ref.nodes.index[5]: {"b": -1}}
+    prefix = str(tmp_path / "legacy")
+    legacy_session(ref, prefix, annots)
+
+    tredev = Tredev.load(prefix, long_parse_dir, backend="native")
+    tredev.journal.close()
+    assert "dropped" not in capsys.readouterr().out
+    assert (tredev.nodes.tree_offsets == ref.nodes.tree_offsets).all()
+    assert (tredev.nodes.index == ref.nodes.index).all()
+    assert tredev.annots.n_annotated() == 3
+    for node_id, values in annots.items():
+        for label, value in values.items():
+            assert tredev.annots.get_value(node_id, label) == value
+
+
+def test_migrate_ambiguous_ids(tmp_path, long_parse_dir, quiet, capsys):
+    ref = Tredev.from_parses(long_parse_dir, LABELS, backend="native")
+    n_trees = len(ref.nodes.tree_offsets)
+    # node 1001 of the long tree shares its legacy id with node 1 of the
+    # last tree
+    shared = int(ref.nodes.tree_offsets[n_trees - 2]) + 1001
+    prefix = str(tmp_path / "legacy")
+    legacy_ids = legacy_session(ref, prefix, {shared: {"a": 1}})
+    assert pd.Index(legacy_ids).has_duplicates
+
+    tredev = Tredev.load(prefix, long_parse_dir, backend="native")
+    tredev.journal.close()
+    assert "*** dropped" in capsys.readouterr().out
+    assert tredev.annots.n_annotated() == 0
+
+
+def test_migrate_dense_by_position(tmp_path, long_parse_dir):
+    ref = Tredev.from_parses(long_parse_dir, LABELS, backend="native")
+    n_trees = len(ref.nodes.tree_offsets)
+    shared = int(ref.nodes.tree_offsets[n_trees - 2]) + 1001
+    prefix = str(tmp_path / "legacy")
+    legacy_session(ref, prefix, None)
+    legacy = pd.read_pickle(prefix + "_nodes.pkl")
+    dense = pd.read_pickle(prefix + "_annots.pkl")
+    dense.iloc[shared - 1, 0] = Annotations.positive
+
+    nodes, annots = session.migrate(legacy, dense, long_parse_dir)
+    assert (nodes.tree_offsets == ref.nodes.tree_offsets).all()
+    assert annots.get_value(shared, "a") == Annotations.positive
+    assert annots.n_annotated() == 1
+
+
+def test_migrate_changed_parses(tmp_path, long_parse_dir):
+    ref = Tredev.from_parses(long_parse_dir, LABELS, backend="native")
+    prefix = str(tmp_path / "legacy")
+    legacy_session(ref, prefix, {})
+    with open(join(long_parse_dir, "zz_long.txt"), "a") as outf:
+        outf.write("(ROOT (S (NP (NN more))))\n")
+    with pytest.raises(ValueError):
+        session.migrate(pd.read_pickle(prefix + "_nodes.pkl"),
+                        pd.read_pickle(prefix + "_annots.pkl"),
+                        long_parse_dir)
+
+
+def annotations(annots):
+    return dict((label, annots.dense(label).tolist()) for label in LABELS)
+
+
+def edit(tredev, seed):
+    # a few changes of every kind, on nodes spread over the corpus
+    node_ids = tredev.annots.index.values[seed::97][:20].tolist()
+    for i, node_id in enumerate(node_ids):
+        [tredev.annots.set_positive, tredev.annots.set_negative,
+         tredev.annots.set_ignore, tredev.annots.set_unknown][i % 4](
+            node_id, LABELS[i % 2])
+
+
+def test_columnar_round_trip(tmp_path, parse_dir, capsys):
+    prefix = str(tmp_path / "session")
+    tredev = Tredev.from_parses(parse_dir, LABELS, backend="native")
+    tredev.add("np", "NP", "a")
+    edit(tredev, 0)
+    tredev.save(prefix)
+    assert session.is_columnar(prefix)
+    annots_mtime = getmtime(join(prefix + "_annots", "labels.npy"))
+    # later changes only go to the journal
+    edit(tredev, 1)
+    tredev.save(prefix)
+    assert len(tredev.journal) > 0
+    assert getmtime(join(prefix + "_annots",
+                                 "labels.npy")) == annots_mtime
+    # unsaved changes are journaled too
+    edit(tredev, 2)
+    tredev.journal.close()
+    capsys.readouterr()
+
+    loaded = Tredev.load(prefix, parse_dir, backend="native")
+    try:
+        assert "# replayed" in capsys.readouterr().out
+        assert isinstance(loaded.nodes, CompactNodes)
+        assert (loaded.nodes.index == tredev.nodes.index).all()
+        assert (loaded.nodes.tree_offsets == tredev.nodes.tree_offsets).all()
+        assert annotations(loaded.annots) == annotations(tredev.annots)
+        assert loaded.patterns.equals(tredev.patterns)
+        # compacting rewrites annotations and empties the journal
+        loaded.compact_every = 1
+        edit(loaded, 3)
+        loaded.save(prefix)
+        assert len(loaded.journal) == 0
+    finally:
+        loaded.journal.close()
+    reloaded = Tredev.load(prefix, parse_dir, backend="native")
+    reloaded.journal.close()
+    assert annotations(reloaded.annots) == annotations(loaded.annots)
+
+
+def test_pickle_to_columnar(tmp_path, parse_dir):
+    prefix = str(tmp_path / "session")
+    tredev = Tredev.from_parses(parse_dir, LABELS, backend="native")
+    edit(tredev, 0)
+    tredev.save(prefix, columnar=False)
+    tredev.journal.close()
+    assert not session.is_columnar(prefix)
+
+    loaded = Tredev.load(prefix, parse_dir, backend="native")
+    assert isinstance(loaded.nodes, Nodes)
+    edit(loaded, 1)
+    loaded.save(prefix)
+    loaded.journal.close()
+    assert session.is_columnar(prefix)
+
+    columnar = Tredev.load(prefix, parse_dir, backend="native")
+    columnar.journal.close()
+    assert isinstance(columnar.nodes, CompactNodes)
+    assert (columnar.nodes.index == tredev.nodes.index).all()
+    assert annotations(columnar.annots) == annotations(loaded.annots)
+
+
+def test_legacy_to_columnar(tmp_path, parse_dir, capsys):
+    # legacy pickles, migrated on load, saved in columnar format and
+    # edited through the journal
+    ref = Tredev.from_parses(parse_dir, LABELS, backend="native")
+    node_ids = ref.nodes.index.values
+    annots = {int(node_ids[3]): {"a": Annotations.positive,
+                                 "b": Annotations.negative},
+              int(node_ids[-1]): {"b": Annotations.ignore}}
+    prefix = str(tmp_path / "legacy")
+    legacy_ids = legacy_session(ref, prefix, annots)
+    assert legacy_ids[0] == LEGACY_NODE_OFFSET + 1
+
+    migrated = Tredev.load(prefix, parse_dir, backend="native")
+    assert "# converted session" in capsys.readouterr().out
+    migrated.save(prefix)
+    edit(migrated, 0)
+    migrated.journal.close()
+
+    loaded = Tredev.load(prefix, parse_dir, backend="native")
+    loaded.journal.close()
+    assert isinstance(loaded.nodes, CompactNodes)
+    assert (loaded.nodes.index == ref.nodes.index).all()
+    assert (loaded.nodes.tree_offsets == ref.nodes.tree_offsets).all()
+    assert annotations(loaded.annots) == annotations(migrated.annots)
+    for node_id, values in annots.items():
+        for label, value in values.items():
+            assert loaded.annots.get_value(node_id, label) == value
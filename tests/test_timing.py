@@ -0,0 +1,56 @@
+import pytest
+
+from tredev import timing
+
+
+@pytest.fixture
+def enabled():
+    timing.enable()
+    timing.reset()
+    yield
+    timing.disable()
+    timing.reset()
+
+
+def test_output_bytes(enabled):
+    @timing.timed("test.output", nbytes=timing.text_nbytes)
+    def output():
+        return "1:2\nnaïve\n"
+
+    records = []
+
+    def hook(*args):
+        records.append(args)
+
+    timing.add_hook(hook)
+    try:
+        output()
+        output()
+    finally:
+        timing.remove_hook(hook)
+    stats = timing.get_stats()
+    assert stats.loc["test.output", "calls"] == 2
+    assert stats.loc["test.output", "bytes"] == 2 * 11
+    assert [nbytes for stage, secs, nbytes in records] == [11, 11]
+
+
+def test_disabled():
+    @timing.timed("test.disabled", nbytes=timing.text_nbytes)
+    def output():
+        return "1:2\n"
+
+    timing.disable()
+    output()
+    assert "test.disabled" not in timing.get_stats().index
+
+
+def test_toggled_in_stage(enabled):
+    # blocks are recorded according to timing on entering them
+    timing.disable()
+    with timing.stage("test.enabled_inside"):
+        timing.enable()
+    with timing.stage("test.disabled_inside"):
+        timing.disable()
+    stats = timing.get_stats()
+    assert "test.enabled_inside" not in stats.index
+    assert stats.loc["test.disabled_inside", "calls"] == 1
@@ -0,0 +1,116 @@
+import threading
+
+import numpy as np
+import pytest
+
+from tredev import Tredev
+
+LABELS = ["a", "b"]
+PATTERNS = {"np": ("NP", "a"), "np_nn": ("NP < NN", "a"),
+            "pp": ("PP", "b"), "nn": ("NN", "b")}
+
+
+@pytest.fixture
+def tredev(parse_dir):
+    tredev = Tredev.from_parses(parse_dir, LABELS, backend="native")
+    for name, (pattern, label) in PATTERNS.items():
+        tredev.add(name, pattern, label)
+    return tredev
+
+
+def rescored(tredev):
+    live = tredev.scores.copy()
+    tredev.rescore()
+    return live.loc[tredev.scores.index], tredev.scores
+
+
+def random_changes(tredev, n, seed=0):
+    rng = np.random.RandomState(seed)
+    annots = tredev.annots
+    setters = [annots.set_positive, annots.set_negative, annots.set_unknown,
+               annots.set_ignore]
+    node_ids = annots.index.values
+    for i in range(n):
+        setters[rng.randint(4)](int(rng.choice(node_ids)),
+                                LABELS[rng.randint(2)])
+
+
+def test_live_scores(tredev):
+    random_changes(tredev, 300)
+    live, scores = rescored(tredev)
+    assert np.allclose(live.values.astype(float), scores.values.astype(float),
+                       equal_nan=True)
+
+
+def test_bulk_changes(tredev):
+    random_changes(tredev, 50)
+    node_ids = tredev.annots.index.values[::7]
+    # positive values change other labels of their nodes too
+    n_changed, conflicts = tredev.annots.set_values(
+        node_ids, ["a"] * len(node_ids), [1] * len(node_ids))
+    assert n_changed
+    live, scores = rescored(tredev)
+    assert np.allclose(live.values.astype(float), scores.values.astype(float),
+                       equal_nan=True)
+
+
+def test_deferred_tracking(tredev, tmp_path):
+    prefix = str(tmp_path / "session")
+    tredev.enable_cache(prefix)
+    tredev.rescore()
+    tredev.save(prefix)
+    tredev.journal.close()
+
+    loaded = Tredev.load(prefix, tredev.parse_dir, backend="native")
+    try:
+        assert not any(name in loaded.tracker for name in PATTERNS)
+        # first change of a label starts tracking its patterns only
+        loaded.annots.set_negative(int(loaded.annots.index[10]), "a")
+        assert "np" in loaded.tracker and "np_nn" in loaded.tracker
+        assert "pp" not in loaded.tracker
+        loaded.report(label="b")
+        assert "pp" in loaded.tracker and "nn" in loaded.tracker
+        random_changes(loaded, 100, seed=1)
+        live, scores = rescored(loaded)
+        assert np.allclose(live.values.astype(float),
+                           scores.values.astype(float), equal_nan=True)
+    finally:
+        loaded.journal.close()
+
+
+def test_rescore_threads(tredev):
+    tredev.add("np_again", "NP", "b")
+    random_changes(tredev, 100)
+    tredev.rescore(n_jobs=2)
+    threaded = tredev.scores.copy()
+    tredev.rescore()
+    assert np.allclose(threaded.loc[tredev.scores.index].values.astype(float),
+                       tredev.scores.values.astype(float), equal_nan=True)
+
+
+
+def test_scoring_during_change(tredev):
+    # patterns scored by another thread while a cell changes are scored
+    # after the change is counted, not in between
+    node_ids = [tredev.nodes.get_node_ids(tredev._get_matches(pattern))
+                for pattern in ("NP", "NP < NN")]
+    record = tredev.annots._record
+    threads = []
+
+    def record_and_score(*args):
+        record(*args)
+        thread = threading.Thread(target=tredev._track,
+                                  args=("a", ["np", "np_nn"], node_ids))
+        thread.start()
+        thread.join(0.1)
+        threads.append(thread)
+
+    tredev.annots._record = record_and_score
+    for node_id in node_ids[1][:5].tolist():
+        tredev.annots.set_negative(node_id, "a")
+        tredev.annots.set_positive(node_id, "a")
+    for thread in threads:
+        thread.join()
+    live, scores = rescored(tredev)
+    assert np.allclose(live.values.astype(float), scores.values.astype(float),
+                       equal_nan=True)
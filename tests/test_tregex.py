@@ -0,0 +1,111 @@
+import glob
+from os.path import basename, join
+from subprocess import CalledProcessError
+
+import pytest
+
+from tredev import Tredev
+from tredev.tregex import (get_matches, get_sharded_matches, shard_files,
+                           MatchStream)
+
+
+@pytest.mark.parametrize("n_shards", [2, 3, 7, 100])
+def test_sharded_matches(parse_dir, tregex_stub, n_shards):
+    # same matches in the same order as a single tregex.sh process
+    for pattern, n_matches in ("NP", 773), ("VBZ", 41), ("NONE", 0):
+        matches = get_matches(pattern, parse_dir, exec_path=tregex_stub)
+        assert len(matches) == n_matches
+        assert get_matches(pattern, parse_dir, exec_path=tregex_stub,
+                           n_shards=n_shards) == matches
+
+
+def test_sharded_tree_counts(parse_dir, tregex_stub):
+    # counts missing from tree_counts are counted
+    fnames = sorted(glob.glob(join(parse_dir, "*")))
+    tree_counts = {basename(fnames[0]): 8}
+    assert get_sharded_matches("NN", parse_dir, 4, tregex_stub,
+                               tree_counts) == \
+        get_matches("NN", parse_dir, exec_path=tregex_stub)
+
+
+@pytest.mark.parametrize("counts", [[5, 5, 5, 5], [1, 10, 0, 2, 0, 0],
+                                    [0, 0, 0], [0, 3, 0], [9]])
+@pytest.mark.parametrize("n_shards", [1, 2, 3, 5])
+def test_shard_files(counts, n_shards):
+    fnames = ["f{}".format(i) for i in range(len(counts))]
+    shards = shard_files(fnames, counts, n_shards)
+    assert 1 <= len(shards) <= n_shards
+    # consecutive runs covering all files, numbered from tree 1
+    assert [fname for names, first_tree in shards
+            for fname in names] == fnames
+    first_tree = 1
+    for names, shard_first_tree in shards:
+        assert names and shard_first_tree == first_tree
+        first_tree += sum(counts[fnames.index(name)] for name in names)
+
+
+def test_shard_balance():
+    shards = shard_files(list("abcdefgh"), [10] * 8, 4)
+    assert [names for names, first_tree in shards] == [
+        ["a", "b"], ["c", "d"], ["e", "f"], ["g", "h"]]
+    assert [first_tree for names, first_tree in shards] == [1, 21, 41, 61]
+
+
+def test_stream(parse_dir, tregex_stub):
+    matches = get_matches("NP", parse_dir, exec_path=tregex_stub)
+    stream = MatchStream("NP", parse_dir, exec_path=tregex_stub)
+    # matches arrive in Tregex order
+    assert list(stream) == matches
+    assert stream.done and stream.result() == matches
+    assert stream.proc.returncode == 0 and stream.proc.stdout.closed
+    assert not stream.error and not stream.cancelled
+
+
+def test_stream_map_matches(parse_dir, tregex_stub):
+    stream = MatchStream("VBZ", parse_dir, exec_path=tregex_stub,
+                         map_matches=lambda new: [(tree_n + 100, node_n)
+                                                  for tree_n, node_n in new])
+    assert stream.result() == [(tree_n + 100, node_n) for tree_n, node_n
+                               in get_matches("VBZ", parse_dir,
+                                              exec_path=tregex_stub)]
+
+
+def test_stream_from_list():
+    stream = MatchStream.from_list([(1, 2), (3, 4)])
+    assert stream.done and stream.proc is None
+    assert list(stream) == stream.result() == [(1, 2), (3, 4)]
+    # nothing to cancel
+    stream.cancel()
+    assert not stream.cancelled
+
+
+def test_stream_cancel(parse_dir, tregex_stub):
+    stream = MatchStream("HANG", parse_dir, exec_path=tregex_stub)
+    assert stream.wait(0) and not stream.done
+    stream.cancel()
+    # matches read so far are kept, without an error
+    assert stream.result() == [(1, 1)]
+    assert stream.done and stream.cancelled and stream.error is None
+    # the process group is killed and reaped
+    assert stream.proc.returncode is not None and stream.proc.stdout.closed
+
+
+def test_stream_error(parse_dir, tregex_stub):
+    stream = MatchStream("FAIL", parse_dir, exec_path=tregex_stub)
+    with pytest.raises(CalledProcessError):
+        stream.result()
+    assert stream.matches == [(1, 1)]
+    with pytest.raises(CalledProcessError):
+        list(stream)
+
+
+def test_stream_missing_exec(parse_dir, tmp_path):
+    with pytest.raises(FileNotFoundError):
+        MatchStream("NP", parse_dir, exec_path=str(tmp_path / "missing"))
+
+
+def test_annotate_missing_tregex(parse_dir, tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv("PATH", str(tmp_path))
+    session = Tredev.from_parses(parse_dir, ["a"])
+    session.annotate("NP", "a")
+    assert capsys.readouterr().out.startswith("*** tregex failed: ")
@@ -0,0 +1,116 @@
+import os
+import stat
+import sys
+
+import pytest
+
+from tredev.worker import TregexWorker, TregexWorkerError
+
+# stub worker speaking the line protocol of tredev.worker; its file_path
+# argument is a directory for its state
+STUB = """#!{python}
+import os
+import sys
+from os.path import exists, getsize, join
+
+state = sys.argv[-1]
+answers = {{"NP": ["1:2", "3:4"], "VP": ["2:1"], "NONE": []}}
+
+with open(join(state, "starts"), "a") as outf:
+    outf.write("x")
+
+while True:
+    line = sys.stdin.readline()
+    if not line:
+        break
+    line = line.rstrip("\\n")
+    if line.startswith("#BATCH "):
+        patterns = [sys.stdin.readline().rstrip("\\n")
+                    for i in range(int(line[len("#BATCH "):]))]
+    else:
+        patterns = [line]
+    for pattern in patterns:
+        if pattern.startswith("DIE"):
+            # die after part of the answer, as often as requested
+            deaths = join(state, "deaths")
+            if (getsize(deaths) if exists(deaths) else 0) < int(pattern[3:]):
+                with open(deaths, "a") as outf:
+                    outf.write("x")
+                print("9:9", flush=True)
+                sys.exit(1)
+            lines = ["5:5"]
+        else:
+            lines = answers.get(pattern, ["ERROR unknown pattern"])
+        for match in lines:
+            print(match)
+        print()
+    sys.stdout.flush()
+"""
+
+
+@pytest.fixture
+def worker(tmp_path):
+    exec_path = tmp_path / "stub_worker.py"
+    exec_path.write_text(STUB.format(python=sys.executable))
+    exec_path.chmod(exec_path.stat().st_mode | stat.S_IEXEC)
+    with TregexWorker(str(tmp_path), exec_path=str(exec_path),
+                      max_restarts=2) as worker:
+        yield worker
+
+
+def n_starts(worker):
+    return os.path.getsize(os.path.join(worker.file_path, "starts"))
+
+
+def test_call(worker):
+    assert worker.call("NP").split() == ["1:2", "3:4"]
+    assert worker.call("NONE") == ""
+    assert worker.call("VP").split() == ["2:1"]
+    assert n_starts(worker) == 1
+
+
+def test_error(worker):
+    with pytest.raises(TregexWorkerError, match="unknown pattern"):
+        worker.call("XP")
+    # the worker stays in sync after an error
+    assert worker.call("NP").split() == ["1:2", "3:4"]
+    assert n_starts(worker) == 1
+
+
+def test_newline(worker):
+    with pytest.raises(ValueError):
+        worker.call("NP\nVP")
+
+
+def test_restart(worker):
+    # partial answers of the dead worker are discarded
+    assert worker.call("DIE2").split() == ["5:5"]
+    assert n_starts(worker) == 3
+    assert worker.call("NP").split() == ["1:2", "3:4"]
+    # restarts are counted in a row only
+    assert worker.call("DIE4").split() == ["5:5"]
+
+
+def test_too_many_restarts(worker):
+    with pytest.raises(TregexWorkerError, match="crashed"):
+        worker.call("DIE9")
+
+
+def test_batch(worker):
+    assert worker.call_batch(["NP", "NONE", "VP"]) == ["1:2\n3:4", "", "2:1"]
+    assert worker.call_batch([]) == []
+    assert worker.call("VP") == "2:1"
+    assert n_starts(worker) == 1
+
+
+def test_batch_error(worker):
+    with pytest.raises(TregexWorkerError, match="XP"):
+        worker.call_batch(["NP", "XP", "VP"])
+    # all answers of the batch were read
+    assert worker.call("NP") == "1:2\n3:4"
+
+
+def test_batch_restart(worker):
+    assert worker.call_batch(["NP", "DIE1", "VP"]) == ["1:2\n3:4", "5:5",
+                                                      "2:1"]
+    assert n_starts(worker) == 2